@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import date
+from app.core.database import get_db
+from app.services.analytics_service import analytics_service
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
+
+DIMENSION = Query("work_type", pattern="^(work_type|working_hours)$")
+
+@router.get("/cohorts")
+def get_cohort_stress(
+    dimension: str = DIMENSION,
+    game_name: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """Compare stress across cohorts (by work type or working-hours bucket)"""
+    groups = analytics_service.summarize(db, dimension, "cohort", game_name=game_name,
+                                         start_date=start_date, end_date=end_date)
+    return {"dimension": dimension, "cohorts": groups}
+
+@router.get("/games")
+def get_game_stress(
+    dimension: str = DIMENSION,
+    cohort: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """Compare stress across games, optionally within one cohort"""
+    groups = analytics_service.summarize(db, dimension, "game_name", cohort=cohort,
+                                         start_date=start_date, end_date=end_date)
+    return {"dimension": dimension, "cohort": cohort, "games": groups}
+
+@router.get("/daily")
+def get_daily_stress(
+    dimension: str = DIMENSION,
+    cohort: Optional[str] = None,
+    game_name: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """Daily stress series, optionally for one cohort and/or game"""
+    groups = analytics_service.summarize(db, dimension, "day", cohort=cohort, game_name=game_name,
+                                         start_date=start_date, end_date=end_date)
+    return {"dimension": dimension, "cohort": cohort, "game_name": game_name, "days": groups}
@@ -2,11 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token
+from concurrent.futures import TimeoutError as HashTimeoutError
+from app.core.security import create_access_token
+from app.core.password_hasher import password_hasher, HashingOverloaded
+from app.core.auth import Principal, get_current_principal, principal_cache
 from app import models, schemas
 
 router = APIRouter(prefix="/api/v1/auth", tags=["auth"])
 
+def _auth_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=schemas.Token)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Register a new user with detailed profile"""
@@ -19,7 +29,10 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = password_hasher.hash(user.password)
+    except (HashingOverloaded, HashTimeoutError):
+        raise _auth_busy()
     db_user = models.User(
         email=user.email,
         password_hash=hashed_password,
@@ -46,12 +59,24 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     """Login user"""
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+    valid, new_hash = False, None
+    if db_user:
+        try:
+            valid, new_hash = password_hasher.verify_and_update(user.password, db_user.password_hash)
+        except (HashingOverloaded, HashTimeoutError):
+            raise _auth_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Stored hash uses an outdated bcrypt cost; replace it while we have the password
+    if new_hash:
+        db_user.password_hash = new_hash
+        db.commit()
+        db.refresh(db_user)
+    
     access_token = create_access_token(data={"sub": user.email, "user_id": db_user.id})
     
     return {
@@ -61,20 +86,27 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.get("/me", response_model=schemas.UserResponse)
-def get_current_user(token: str, db: Session = Depends(get_db)):
+def get_current_user(principal: Principal = Depends(get_current_principal)):
     """Get current user profile"""
-    from app.core.security import decode_access_token
-    
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
-        )
-    
-    user_id = payload.get("user_id")
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    return principal
+
+@router.put("/me", response_model=schemas.UserResponse)
+def update_current_user(
+    profile: schemas.UserUpdate,
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Update the current user's profile"""
+    db_user = db.query(models.User).filter(models.User.id == principal.id).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    for field, value in profile.model_dump(exclude_unset=True).items():
+        setattr(db_user, field, value)
+    db.commit()
+    db.refresh(db_user)
+    
+    # Cached principals for this user are now stale
+    principal_cache.invalidate_user(db_user.id)
+    
     return db_user
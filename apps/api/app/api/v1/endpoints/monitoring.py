@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.services.feature_monitor import feature_monitor
+
+router = APIRouter(prefix="/api/v1/monitoring", tags=["monitoring"])
+
+@router.get("/drift")
+def get_input_drift(hours: int = Query(1, ge=1, le=168), db: Session = Depends(get_db)):
+    """Live model input distributions, merged across workers, against the training data"""
+    # Include this worker's frames since its last background flush
+    feature_monitor.flush()
+    return feature_monitor.drift_report(db, hours)
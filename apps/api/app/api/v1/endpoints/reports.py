@@ -1,53 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-from app.core.database import get_db
+from app.core.database import SessionLocal, get_db
+from app.core import http_cache
+from app.core.auth import Principal, get_current_principal
 from app import models, schemas
 from app.services.report_service import report_service
+from app.services.recommendation_catalog import recommendation_catalog
+from app.services.pdf_job_service import pdf_job_service, PdfQueueFull
+from app.services.stats_service import stats_service
+import asyncio
 import json
 
 router = APIRouter(prefix="/api/v1/reports", tags=["reports"])
 
 @router.post("/generate/{session_id}", response_model=schemas.StressReportResponse)
 def generate_report(session_id: int, db: Session = Depends(get_db)):
-    """Generate AI-powered stress report for a session"""
+    """Generate AI-powered stress report for a session, reusing it while the games are unchanged"""
     # Get session data
     session = db.query(models.GameSession).filter(models.GameSession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    # Summarize game data in SQL rather than loading every row
+    game_count, last_game_id, stress_sum = db.query(
+        func.count(models.GameData.id),
+        func.max(models.GameData.id),
+        func.sum(models.GameData.avg_stress)
+    ).filter(models.GameData.session_id == session_id).one()
+    if not game_count:
+        raise HTTPException(status_code=400, detail="No game data found for this session")
+    
+    fingerprint = report_service.input_fingerprint(
+        session.baseline_stress, game_count, last_game_id, stress_sum
+    )
+    report = db.query(models.StressReport).filter(
+        models.StressReport.session_id == session_id
+    ).first()
+    if report and report.input_fingerprint == fingerprint:
+        return report
+    
     # Get user data
     user = db.query(models.User).filter(models.User.id == session.user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get game data
-    games = db.query(models.GameData).filter(models.GameData.session_id == session_id).all()
-    if not games:
-        raise HTTPException(status_code=400, detail="No game data found for this session")
-    
     # Calculate overall stress
-    overall_stress = sum(g.avg_stress for g in games) / len(games)
-    
-    # Determine stress level
-    if overall_stress < 30:
-        stress_level = "Low"
-    elif overall_stress < 70:
-        stress_level = "Medium"
-    else:
-        stress_level = "High"
-    
-    # Determine trend (compare with baseline if available)
-    if session.baseline_stress:
-        if overall_stress > session.baseline_stress + 10:
-            stress_trend = "Increasing"
-        elif overall_stress < session.baseline_stress - 10:
-            stress_trend = "Decreasing"
-        else:
-            stress_trend = "Stable"
-    else:
-        stress_trend = "Stable"
+    overall_stress = stress_sum / game_count
+    stress_level = report_service.stress_level_for(overall_stress)
+    stress_trend = report_service.stress_trend_for(overall_stress, session.baseline_stress)
     
     # Prepare data for report generation
     user_data = {
@@ -59,55 +64,117 @@ def generate_report(session_id: int, db: Session = Depends(get_db)):
         'health_info': user.health_info
     }
     
-    session_data = {
-        'session_id': session.id,
-        'games_played': session.games_played,
-        'started_at': session.started_at,
-        'completed_at': session.completed_at
-    }
-    
-    stress_analysis = {
-        'overall_stress': overall_stress,
-        'stress_level': stress_level,
-        'stress_trend': stress_trend
-    }
-    
-    # Generate recommendations
-    recommendations = report_service.generate_recommendations(
-        user_data, session_data, stress_analysis
-    )
+    # Recommendations are shared catalog entries; the report only stores their ids
+    entry_ids = recommendation_catalog.entry_ids(db, overall_stress, user_data, stress_trend)
     
-    # Save report to database
-    report = models.StressReport(
-        user_id=user.id,
-        session_id=session_id,
-        overall_stress=overall_stress,
-        stress_level=stress_level,
-        stress_trend=stress_trend,
-        recommendations=json.dumps(recommendations),
-        activities=recommendations['activities'],
-        workouts=recommendations['workouts'],
-        meditation=recommendations['meditation'],
-        food_control=recommendations['food_control'],
-        medical_checkup=recommendations['medical_checkup']
-    )
-    db.add(report)
-    db.commit()
+    # Save report to database, regenerating in place if the games changed
+    previous_level = report.stress_level if report is not None else None
+    if report is None:
+        report = models.StressReport(user_id=user.id, session_id=session_id)
+        db.add(report)
+    report.overall_stress = overall_stress
+    report.stress_level = stress_level
+    report.stress_trend = stress_trend
+    report.input_fingerprint = fingerprint
+    report.activities_id = entry_ids['activities']
+    report.workouts_id = entry_ids['workouts']
+    report.meditation_id = entry_ids['meditation']
+    report.food_control_id = entry_ids['food_control']
+    report.medical_checkup_id = entry_ids['medical_checkup']
+    report.legacy_recommendations = None
+    report.legacy_activities = None
+    report.legacy_workouts = None
+    report.legacy_meditation = None
+    report.legacy_food_control = None
+    report.legacy_medical_checkup = None
+    stats_service.record_report(db, user.id, session_id, overall_stress, stress_level, previous_level)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request for the same session won the insert
+        db.rollback()
+        report = db.query(models.StressReport).filter(
+            models.StressReport.session_id == session_id
+        ).first()
+        return report
     db.refresh(report)
     
     return report
 
+@router.get("/export/zip")
+def export_reports_zip(
+    user_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal)
+):
+    """
+    Download every matching report as PDFs in one streamed ZIP archive.
+    Users can only export their own reports; other users and all-user date ranges need an admin.
+    """
+    if not principal.is_admin:
+        if user_id is None and (start_date is not None or end_date is not None):
+            raise HTTPException(status_code=403, detail="Exporting every user's reports requires an admin")
+        if user_id is not None and user_id != principal.id:
+            raise HTTPException(status_code=403, detail="Not allowed to export other users' reports")
+        user_id = principal.id
+    if user_id is None and start_date is None and end_date is None:
+        raise HTTPException(status_code=400, detail="Filter by user_id and/or a date range")
+    
+    def build_query(query_db: Session):
+        query = query_db.query(models.StressReport, models.User, models.GameSession).join(
+            models.User, models.User.id == models.StressReport.user_id
+        ).join(
+            models.GameSession, models.GameSession.id == models.StressReport.session_id
+        )
+        if user_id is not None:
+            query = query.filter(models.StressReport.user_id == user_id)
+        if start_date is not None:
+            query = query.filter(models.StressReport.created_at >= start_date)
+        if end_date is not None:
+            query = query.filter(models.StressReport.created_at <= end_date)
+        return query.order_by(models.StressReport.id)
+    
+    if not build_query(db).first():
+        raise HTTPException(status_code=404, detail="No reports found")
+    
+    def iter_pdfs():
+        # The request's session is closed before streaming starts, so use our own
+        stream_db = SessionLocal()
+        try:
+            rows = build_query(stream_db).yield_per(50)
+            items = (
+                (f"stress_report_{r.id}_{r.created_at:%Y-%m-%d}.pdf", *_pdf_inputs(r, u, s))
+                for r, u, s in rows
+            )
+            yield from pdf_job_service.render_many(items)
+        finally:
+            stream_db.close()
+    
+    filename = f"stress_reports_{user_id}.zip" if user_id is not None else "stress_reports.zip"
+    return StreamingResponse(
+        report_service.stream_zip(iter_pdfs()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @router.get("/{report_id}", response_model=schemas.StressReportResponse)
-def get_report(report_id: int, db: Session = Depends(get_db)):
+def get_report(report_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific report"""
     report = db.query(models.StressReport).filter(models.StressReport.id == report_id).first()
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
+    validators = http_cache.report_validators(report)
+    cached = http_cache.not_modified(request, validators)
+    if cached is not None:
+        return cached
+    http_cache.apply(response, validators)
     
     return report
 
 @router.get("/session/{session_id}/report", response_model=schemas.StressReportResponse)
-def get_report_by_session(session_id: int, db: Session = Depends(get_db)):
+def get_report_by_session(session_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get report for a specific session"""
     report = db.query(models.StressReport).filter(
         models.StressReport.session_id == session_id
@@ -115,20 +182,22 @@ def get_report_by_session(session_id: int, db: Session = Depends(get_db)):
     
     if not report:
         raise HTTPException(status_code=404, detail="Report not found for this session")
+    validators = http_cache.report_validators(report)
+    cached = http_cache.not_modified(request, validators)
+    if cached is not None:
+        return cached
+    http_cache.apply(response, validators)
     
     return report
 
-@router.get("/{report_id}/pdf")
-def download_pdf_report(report_id: int, db: Session = Depends(get_db)):
-    """Download report as PDF"""
-    report = db.query(models.StressReport).filter(models.StressReport.id == report_id).first()
-    if not report:
-        raise HTTPException(status_code=404, detail="Report not found")
-    
-    # Get user and session data
+def _build_pdf_inputs(report: models.StressReport, db: Session):
+    """Collect the user, session and recommendation dicts the PDF renderer needs"""
     user = db.query(models.User).filter(models.User.id == report.user_id).first()
     session = db.query(models.GameSession).filter(models.GameSession.id == report.session_id).first()
     
+    return _pdf_inputs(report, user, session)
+
+def _pdf_inputs(report: models.StressReport, user: models.User, session: models.GameSession):
     user_data = {
         'name': user.name,
         'email': user.email,
@@ -153,9 +222,16 @@ def download_pdf_report(report_id: int, db: Session = Depends(get_db)):
         'medical_checkup': report.medical_checkup
     }
     
-    # Generate PDF
-    pdf_bytes = report_service.generate_pdf_report(user_data, session_data, recommendations)
-    
+    return user_data, session_data, recommendations
+
+def _pdf_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="PDF rendering is busy, please retry shortly",
+        headers={"Retry-After": "5"}
+    )
+
+def _pdf_response(pdf_bytes: bytes, report_id: int) -> Response:
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
@@ -164,20 +240,89 @@ def download_pdf_report(report_id: int, db: Session = Depends(get_db)):
         }
     )
 
-@router.get("/user/{user_id}/reports")
-def get_user_reports(user_id: int, db: Session = Depends(get_db)):
+@router.get("/{report_id}/pdf")
+def download_pdf_report(report_id: int, request: Request, db: Session = Depends(get_db)):
+    """Download report as PDF"""
+    report = db.query(models.StressReport).filter(models.StressReport.id == report_id).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    # Skip rendering entirely when the client already has this version
+    validators = http_cache.report_validators(report)
+    cached = http_cache.not_modified(request, validators)
+    if cached is not None:
+        return cached
+    
+    user_data, session_data, recommendations = _build_pdf_inputs(report, db)
+    
+    # Render in the PDF worker pool so ReportLab doesn't hold this process's GIL
+    try:
+        pdf_bytes = pdf_job_service.render(report_id, user_data, session_data, recommendations)
+    except (PdfQueueFull, TimeoutError):
+        raise _pdf_busy()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"PDF rendering failed: {e}")
+    
+    response = _pdf_response(pdf_bytes, report_id)
+    http_cache.apply(response, validators)
+    return response
+
+@router.post("/{report_id}/pdf/jobs", status_code=202)
+def enqueue_pdf_report(report_id: int, db: Session = Depends(get_db)):
+    """Queue a PDF render and return a job id to poll"""
+    report = db.query(models.StressReport).filter(models.StressReport.id == report_id).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    user_data, session_data, recommendations = _build_pdf_inputs(report, db)
+    try:
+        job = pdf_job_service.submit(report_id, user_data, session_data, recommendations)
+    except PdfQueueFull:
+        raise _pdf_busy()
+    
+    return job.to_dict()
+
+@router.get("/pdf-jobs/{job_id}")
+async def get_pdf_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """Get PDF job status, optionally waiting up to `wait` seconds for it to finish"""
+    job = pdf_job_service.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if wait and not job.done.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.done)), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+    
+    return job.to_dict()
+
+@router.get("/pdf-jobs/{job_id}/result")
+def get_pdf_job_result(job_id: str):
+    """Download the PDF produced by a finished job"""
+    job = pdf_job_service.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"PDF rendering failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    
+    return _pdf_response(job.result, job.report_id)
+
+@router.get("/user/{user_id}/reports", response_model=schemas.UserReportsResponse)
+def get_user_reports(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get all reports for a user"""
+    # Adding or regenerating a report bumps the user's stats row
+    stats = db.get(models.UserStressStats, user_id)
+    if stats is not None:
+        validators = http_cache.user_validators(stats, "reports")
+        cached = http_cache.not_modified(request, validators)
+        if cached is not None:
+            return cached
+        http_cache.apply(response, validators)
+    
     reports = db.query(models.StressReport).filter(
         models.StressReport.user_id == user_id
     ).order_by(models.StressReport.created_at.desc()).all()
     
-    return {"reports": [
-        {
-            "id": r.id,
-            "session_id": r.session_id,
-            "overall_stress": r.overall_stress,
-            "stress_level": r.stress_level,
-            "created_at": r.created_at
-        }
-        for r in reports
-    ]}
+    return {"reports": reports}
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from app.core.database import get_db
+from app.core.auth import Principal, get_current_principal
+from app.core import http_cache, payloads
+from app.core.responses import FastJSONResponse, RawJSON
 from app import models, schemas
 from app.services.inference_service import inference_service
-import json
+from app.services.stats_service import stats_service
+from app.services.export_service import export_service, MEDIA_TYPES
+from app.services.analytics_service import analytics_service
+from app.services.percentile_service import percentile_service
 
 router = APIRouter(prefix="/api/v1/stress", tags=["stress"])
 
@@ -15,18 +23,20 @@ def start_session(
     db: Session = Depends(get_db)
 ):
     """Start a new game session"""
-    # Reset inference buffer for new session
-    inference_service.reset_buffer()
-    
     session = models.GameSession(
         user_id=session_data.user_id,
         baseline_stress=session_data.baseline_stress,
         started_at=datetime.utcnow()
     )
     db.add(session)
+    # The user's history now lists this session
+    stats_service.touch(db, session_data.user_id)
     db.commit()
     db.refresh(session)
     
+    # Start the new session with an empty inference window
+    inference_service.reset_session(session.id)
+    
     return {"session_id": session.id, "started_at": session.started_at}
 
 @router.post("/session/{session_id}/game")
@@ -53,12 +63,26 @@ def save_game_data(
         min_stress=game_data.min_stress
     )
     db.add(game)
+    played_at = datetime.utcnow()
+    stats_service.record_game(db, session.user_id, game_data.avg_stress, played_at)
+    user = db.get(models.User, session.user_id)
+    if user is not None:
+        analytics_service.record_game(
+            db, user, game_data.game_name, game_data.avg_stress, game_data.score, game_data.duration, played_at
+        )
+    percentile_service.record_game(db, game_data.game_name, game_data.avg_stress)
     
     # Update session
     session.games_played += 1
     db.commit()
     
-    return {"message": "Game data saved", "games_played": session.games_played}
+    return {
+        "message": "Game data saved",
+        "games_played": session.games_played,
+        "stress_percentile": percentile_service.percentile(
+            db, game_data.game_name, game_data.avg_stress, session.user_id
+        )
+    }
 
 @router.post("/session/{session_id}/complete")
 def complete_session(session_id: int, db: Session = Depends(get_db)):
@@ -72,16 +96,25 @@ def complete_session(session_id: int, db: Session = Depends(get_db)):
     
     return {"message": "Session completed", "session_id": session_id}
 
-@router.get("/session/{session_id}/data")
-def get_session_data(session_id: int, db: Session = Depends(get_db)):
+@router.get("/session/{session_id}/data", response_model=schemas.SessionDataResponse)
+def get_session_data(session_id: int, request: Request, db: Session = Depends(get_db)):
     """Get all data for a session"""
     session = db.query(models.GameSession).filter(models.GameSession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    validators = http_cache.session_validators(session, percentile_service.version(db, session_id))
+    cached = http_cache.not_modified(request, validators)
+    if cached is not None:
+        return cached
     
     games = db.query(models.GameData).filter(models.GameData.session_id == session_id).all()
+    percentiles = percentile_service.percentiles(
+        db, [(g.game_name, g.avg_stress) for g in games], session.user_id
+    )
     
-    return {
+    # Returned directly so the stored stress_scores arrays are spliced in
+    # rather than decoded, validated and re-encoded
+    return FastJSONResponse({
         "session": {
             "id": session.id,
             "started_at": session.started_at,
@@ -98,43 +131,125 @@ def get_session_data(session_id: int, db: Session = Depends(get_db)):
                 "avg_stress": g.avg_stress,
                 "max_stress": g.max_stress,
                 "min_stress": g.min_stress,
-                "stress_scores": json.loads(g.stress_scores) if g.stress_scores else []
+                # % of other players' games of this name with higher stress
+                "stress_percentile": percentile,
+                "stress_scores": RawJSON(payloads.scores_json(g.stress_scores))
             }
-            for g in games
+            for g, percentile in zip(games, percentiles)
         ]
-    }
+    }, headers=validators.headers())
 
-@router.get("/user/{user_id}/history")
-def get_user_stress_history(user_id: int, db: Session = Depends(get_db)):
+@router.get("/user/{user_id}/history", response_model=List[schemas.SessionHistoryItem])
+def get_user_stress_history(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get stress history for a user"""
-    sessions = db.query(models.GameSession).filter(
+    # Any change to the history bumps the user's stats row
+    stats = db.get(models.UserStressStats, user_id)
+    if stats is not None:
+        validators = http_cache.user_validators(stats, "history")
+        cached = http_cache.not_modified(request, validators)
+        if cached is not None:
+            return cached
+        http_cache.apply(response, validators)
+    
+    avg_stress = db.query(
+        models.GameData.session_id,
+        func.avg(models.GameData.avg_stress).label("avg_stress")
+    ).group_by(models.GameData.session_id).subquery()
+    sessions = db.query(models.GameSession, avg_stress.c.avg_stress).outerjoin(
+        avg_stress, avg_stress.c.session_id == models.GameSession.id
+    ).filter(
         models.GameSession.user_id == user_id
     ).order_by(models.GameSession.started_at.desc()).limit(10).all()
     
-    result = []
-    for session in sessions:
-        games = db.query(models.GameData).filter(models.GameData.session_id == session.id).all()
-        avg_stress = sum(g.avg_stress for g in games) / len(games) if games else 0
-        
-        result.append({
+    return [
+        {
             "id": session.id,
             "created_at": session.started_at,
             "games_count": session.games_played,
-            "avg_stress": avg_stress
-        })
+            "avg_stress": session_avg or 0
+        }
+        for session, session_avg in sessions
+    ]
+
+@router.get("/user/{user_id}/summary")
+def get_user_stress_summary(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """Get a user's long-run stress summary from their maintained statistics"""
+    stats = db.get(models.UserStressStats, user_id)
+    if stats is not None:
+        # The current streak also depends on today's date
+        validators = http_cache.user_validators(stats, f"summary-{datetime.utcnow().date()}")
+        cached = http_cache.not_modified(request, validators)
+        if cached is not None:
+            return cached
+        http_cache.apply(response, validators)
+    
+    summary = stats_service.get_summary(db, user_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    return result
+    return summary
 
-@router.get("/session/{session_id}")
-def get_session_details(session_id: int, db: Session = Depends(get_db)):
+@router.get("/export")
+def export_stress_data(
+    user_id: Optional[List[int]] = Query(None),
+    work_type: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    principal: Principal = Depends(get_current_principal)
+):
+    """
+    Stream every game (with per-frame stress scores) for one or more users, or
+    a cohort by work type, as NDJSON (a line per game) or CSV (a row per frame).
+    Users can only export their own data; other users and cohorts need an admin.
+    """
+    if not principal.is_admin:
+        if user_id is None and work_type is not None:
+            raise HTTPException(status_code=403, detail="Cohort exports require an admin")
+        if user_id and set(user_id) != {principal.id}:
+            raise HTTPException(status_code=403, detail="Not allowed to export other users' data")
+        user_id = [principal.id]
+    if not user_id and work_type is None:
+        raise HTTPException(status_code=400, detail="Filter by user_id and/or work_type")
+    
+    query = export_service.game_query()
+    if user_id:
+        query = query.where(models.GameSession.user_id.in_(user_id))
+    if work_type is not None:
+        query = query.join(models.User, models.User.id == models.GameSession.user_id).where(
+            models.User.work_type == work_type
+        )
+    if start_date is not None:
+        query = query.where(models.GameSession.started_at >= start_date)
+    if end_date is not None:
+        query = query.where(models.GameSession.started_at <= end_date)
+    
+    filename = f"stress_export.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_service.stream(query, format, compress=gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@router.get("/session/{session_id}", response_model=schemas.SessionDetailsResponse)
+def get_session_details(session_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get detailed session information including all games"""
     session = db.query(models.GameSession).filter(models.GameSession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    validators = http_cache.session_validators(session, percentile_service.version(db, session_id))
+    cached = http_cache.not_modified(request, validators)
+    if cached is not None:
+        return cached
+    http_cache.apply(response, validators)
     
     games = db.query(models.GameData).filter(
         models.GameData.session_id == session_id
     ).order_by(models.GameData.game_number).all()
+    percentiles = percentile_service.percentiles(
+        db, [(g.game_name, g.avg_stress) for g in games], session.user_id
+    )
     
     return {
         "id": session.id,
@@ -151,9 +266,10 @@ def get_session_details(session_id: int, db: Session = Depends(get_db)):
                 "duration": g.duration,
                 "avg_stress": g.avg_stress,
                 "max_stress": g.max_stress,
-                "min_stress": g.min_stress
+                "min_stress": g.min_stress,
+                "stress_percentile": percentile
             }
-            for g in games
+            for g, percentile in zip(games, percentiles)
         ]
     }
 
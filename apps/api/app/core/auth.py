@@ -0,0 +1,139 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.core.security import decode_access_token
+
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+# Comma-separated emails of users allowed to read other users' data (e.g. cohort exports)
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+
+class Principal:
+    """Slim, cacheable view of the authenticated user"""
+    __slots__ = ("id", "email", "name", "work_type", "working_hours", "mobile_usage")
+    
+    def __init__(self, id: int, email: str, name: str, work_type: Optional[str],
+                 working_hours: Optional[float], mobile_usage: Optional[float]):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.work_type = work_type
+        self.working_hours = working_hours
+        self.mobile_usage = mobile_usage
+    
+    @property
+    def is_admin(self) -> bool:
+        return bool(self.email) and self.email.lower() in ADMIN_EMAILS
+    
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(user.id, user.email, user.name, user.work_type, user.working_hours, user.mobile_usage)
+
+
+class PrincipalCache:
+    """Bounded LRU of verified tokens, keyed by token hash, with per-entry expiry"""
+    
+    def __init__(self, ttl_seconds: int = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token hash -> (expires_at, principal)
+        self._by_user = {}  # user id -> token hashes, for invalidation
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    def get(self, token: str) -> Optional[Principal]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+    
+    def put(self, token: str, principal: Principal, token_expires_at: Optional[float] = None):
+        key = self._key(token)
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires_at, principal)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def invalidate_user(self, user_id: int):
+        """Forget every cached token for a user, e.g. after a profile change"""
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+    
+    def _remove(self, key: str):
+        """Caller holds the lock"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[1].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[1].id]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+# Global instance
+principal_cache = PrincipalCache()
+
+
+def get_current_principal(
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """Resolve the caller from a bearer token (header or ?token=), skipping the DB on cache hits"""
+    from app import models
+    
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    
+    payload = decode_access_token(token)
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    
+    user_id = payload.get("user_id")
+    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    principal = Principal.from_user(db_user)
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
@@ -0,0 +1,134 @@
+"""
+Negotiated response compression.
+
+CompressionMiddleware picks the best encoding the client accepts (brotli when
+the 'brotli' package is installed, else gzip) and compresses response bodies
+of at least COMPRESS_MIN_BYTES. Streaming responses are compressed chunk by
+chunk. Bodies that are already encoded, and formats that don't shrink (PDFs,
+ZIPs, images), pass through untouched.
+"""
+import os
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli quality 4 compresses better than gzip -6 at similar speed
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+INCOMPRESSIBLE_TYPES = ("application/pdf", "application/zip", "application/gzip", "image/", "audio/", "video/")
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The preferred supported encoding in an Accept-Encoding header, or None"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    
+    best, best_weight = None, 0.0
+    # Supported encodings are listed in order of preference, which breaks ties
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+    
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the client's preferred encoding"""
+    
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next((value.decode("latin-1") for name, value in scope["headers"]
+                       if name == b"accept-encoding"), "")
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        compressor = None
+        passthrough = False
+        
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = b"content-encoding" in headers or content_type.startswith(INCOMPRESSIBLE_TYPES)
+                if passthrough:
+                    await send(message)
+                else:
+                    # Held until the first body chunk shows how big the body is
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start_message)
+                    start_message = None
+                    passthrough = True
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = [(name, value) for name, value in start_message.get("headers", [])
+                           if name.lower() != b"content-length"]
+                vary = next((value for name, value in headers if name.lower() == b"vary"), None)
+                headers = [(name, value) for name, value in headers if name.lower() != b"vary"]
+                headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send(dict(start_message, headers=headers))
+                    start_message = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(dict(start_message, headers=headers))
+                start_message = None
+            
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+        
+        await self.app(scope, receive, send_wrapper)
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -17,3 +18,50 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def init_db():
+    """Create tables, then add columns and indexes that older databases are missing"""
+    from app import models  # noqa: F401 - registers the tables on Base
+    
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite" and not inspect(conn).get_table_names():
+            # New databases let app.jobs.compact_game_data return freed pages to the
+            # filesystem; the setting only takes before the first table is created
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        Base.metadata.create_all(bind=conn)
+        conn.commit()
+    
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    
+    if "ix_stress_reports_session_id" not in {i['name'] for i in inspector.get_indexes("stress_reports")}:
+        _dedupe_stress_reports()
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except SQLAlchemyError as e:
+                # Unique indexes back idempotency guarantees; never run without them
+                raise RuntimeError(f"Could not create index {index.name}: {e}") from e
+
+def _dedupe_stress_reports():
+    """
+    Older databases inserted a new report on every generate. Keep the newest
+    report per session so the unique session index can be created, and drop
+    the affected users' stats rows so they are rebuilt from what remains.
+    """
+    with engine.begin() as conn:
+        duplicates = "SELECT id FROM stress_reports WHERE id NOT IN (SELECT MAX(id) FROM stress_reports GROUP BY session_id)"
+        removed = conn.execute(text(
+            f"DELETE FROM user_stress_stats WHERE user_id IN (SELECT user_id FROM stress_reports WHERE id IN ({duplicates}))"
+        )).rowcount
+        deleted = conn.execute(text(f"DELETE FROM stress_reports WHERE id IN ({duplicates})")).rowcount
+    if deleted:
+        print(f"Removed {deleted} duplicate stress reports; {removed} users' stats will be rebuilt")
@@ -0,0 +1,101 @@
+"""
+HTTP conditional requests for session, history and report reads.
+
+Each cacheable resource has validators computed from a single row: the
+session's or report's updated_at, or the user's stats row (bumped whenever a
+game, report or session is added). Session reads also embed per-game stress
+percentiles, so their ETag adds a version of the games' histograms. Endpoints
+look these up first and return 304 from not_modified() before running their
+real queries.
+
+ETags are weak because CompressionMiddleware may encode the body differently
+for different clients; the content is the same.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, NamedTuple, Optional
+from fastapi import Request, Response
+from app import models
+
+# Cache-Control per resource. Everything is per-user, so nothing goes in shared caches.
+# Live sessions and user history change with every game, and even completed sessions
+# carry percentiles that move with other players' games, so clients always revalidate.
+CACHE_CONTROL = {
+    "session_active": "private, no-cache",
+    "session_completed": "private, no-cache",
+    "report": "private, max-age=3600",
+    "user": "private, no-cache"
+}
+
+class CacheValidators(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+    cache_control: str
+    
+    def headers(self) -> Dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = _http_date(self.last_modified)
+        return headers
+
+def _http_date(value: datetime) -> str:
+    # Stored timestamps are naive UTC
+    return format_datetime(value.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+
+def _version(value: Optional[datetime]) -> str:
+    return f"{value.timestamp():.6f}" if value is not None else "0"
+
+def session_validators(session: models.GameSession, percentiles_version: str = "") -> CacheValidators:
+    """percentiles_version: PercentileService.version() of the session's games"""
+    modified = session.updated_at or session.completed_at or session.started_at
+    # games_played keeps rows from before updated_at existed changing with each game
+    etag = f'W/"session-{session.id}-{session.games_played or 0}-{_version(modified)}-{percentiles_version}"'
+    state = "session_completed" if session.completed_at is not None else "session_active"
+    return CacheValidators(etag, modified, CACHE_CONTROL[state])
+
+def report_validators(report: models.StressReport) -> CacheValidators:
+    modified = report.updated_at or report.created_at
+    etag = f'W/"report-{report.id}-{(report.input_fingerprint or "")[:16]}-{_version(modified)}"'
+    return CacheValidators(etag, modified, CACHE_CONTROL["report"])
+
+def user_validators(stats: models.UserStressStats, resource: str) -> CacheValidators:
+    etag = f'W/"{resource}-{stats.user_id}-{_version(stats.updated_at)}"'
+    return CacheValidators(etag, stats.updated_at, CACHE_CONTROL["user"])
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" match
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def not_modified(request: Request, validators: CacheValidators) -> Optional[Response]:
+    """A 304 response if the client's cached copy is current, else None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, validators.etag)
+    else:
+        # If-Modified-Since is only consulted without If-None-Match (RFC 9110 13.2.2)
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or validators.last_modified is None:
+            return None
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        fresh = validators.last_modified.replace(microsecond=0) <= since
+    if not fresh:
+        return None
+    return Response(status_code=304, headers=validators.headers())
+
+def apply(response: Response, validators: CacheValidators):
+    """Attach the validators and Cache-Control to a full response"""
+    response.headers.update(validators.headers())
@@ -0,0 +1,302 @@
+"""
+Minimal Prometheus-style metrics.
+
+Every metric keeps one cell per thread, so recording a value never takes a
+lock; cells are only summed when /metrics is scraped.
+"""
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class _Child:
+    """One labelled series, sharded per thread"""
+    
+    def __init__(self, cell_size: int):
+        self._cell_size = cell_size
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+    
+    def _cell(self) -> List[float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0.0] * self._cell_size
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+    
+    def _totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells)
+        totals = [0.0] * self._cell_size
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class _CounterChild(_Child):
+    def __init__(self):
+        super().__init__(1)
+    
+    def inc(self, amount: float = 1.0):
+        self._cell()[0] += amount
+
+
+class _HistogramChild(_Child):
+    def __init__(self, buckets: Tuple[float, ...]):
+        # One slot per bucket, one for +Inf, then the running sum
+        super().__init__(len(buckets) + 2)
+        self._buckets = buckets
+    
+    def observe(self, value: float):
+        cell = self._cell()
+        cell[bisect_left(self._buckets, value)] += 1
+        cell[-1] += value
+    
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+    
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class _Metric:
+    kind = None
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+        REGISTRY.append(self)
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+    
+    def _label_text(self, values: Tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+    
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_fmt(child._totals()[0])}"]
+
+
+class Gauge(_Metric):
+    """Gauge backed by per-thread deltas, or by a callback evaluated at scrape time"""
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self._function = None
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self._default.inc(-amount)
+    
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+    
+    def _render_child(self, values, child):
+        value = self._function() if self._function is not None else child._totals()[0]
+        return [f"{self.name}{self._label_text(values)} {_fmt(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        self._default.observe(value)
+    
+    def time(self):
+        return self._default.time()
+    
+    def _render_child(self, values, child):
+        totals = child._totals()
+        lines = []
+        cumulative = 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), totals[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _fmt(bound)
+            labels = self._label_text(values, 'le="%s"' % le)
+            lines.append(f"{self.name}_bucket{labels} {_fmt(cumulative)}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_fmt(totals[-1])}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {_fmt(cumulative)}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = []
+
+def render_metrics() -> str:
+    """Prometheus text exposition format (0.0.4) for every registered metric"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"]
+)
+
+# Database
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time by statement type",
+    ["statement"], buckets=FAST_BUCKETS + (0.25, 0.5, 1.0)
+)
+
+# Inference
+inference_duration = Histogram(
+    "inference_duration_seconds", "Time for a single stress prediction",
+    ["path"], buckets=FAST_BUCKETS
+)
+inference_batch_duration = Histogram(
+    "inference_batch_duration_seconds", "Time to score a batch of queued WebSocket frames",
+    buckets=FAST_BUCKETS
+)
+inference_batch_size = Histogram(
+    "inference_batch_size", "Frames scored per WebSocket batch",
+    buckets=(1, 2, 4, 8, 16, 32)
+)
+
+# WebSockets
+ws_active_connections = Gauge("ws_active_connections", "Open /ws/analysis connections")
+ws_frames = Counter(
+    "ws_frames_total", "WebSocket frames received by outcome; rate() gives frames per second",
+    ["outcome"]
+)
+ws_rejections = Counter("ws_rejections_total", "WebSocket connections refused or closed by admission control", ["code"])
+
+# Input drift
+input_drift_alerts = Gauge("input_drift_alerts", "Model input features currently alerting for drift from the training data")
+
+# PDF rendering
+pdf_render_duration = Histogram(
+    "pdf_render_duration_seconds", "ReportLab render time per PDF, measured in the worker",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+pdf_jobs = Counter("pdf_jobs_total", "Finished PDF renders by outcome", ["outcome"])
+
+# Password hashing
+hash_queue_duration = Histogram(
+    "password_hash_queue_seconds", "Time bcrypt requests waited for a hashing worker"
+)
+hash_duration = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time in the hashing worker", ["operation"]
+)
+hash_shed = Counter("password_hash_shed_total", "Auth requests rejected because the hashing pool was full")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status = [500]
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.labels(
+                scope["method"], route.path if route is not None else "unmatched", str(status[0])
+            ).observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Time every SQL statement executed through the engine"""
+    from sqlalchemy import event
+    from app.core.timing import record_phase
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement else "OTHER"
+        db_query_duration.labels(verb).observe(elapsed)
+        record_phase("db", elapsed)
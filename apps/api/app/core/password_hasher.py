@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+from app.core.metrics import hash_queue_duration, hash_duration, hash_shed
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+# Hash requests allowed in flight (running + queued); beyond this we shed load
+HASH_MAX_IN_FLIGHT = int(os.getenv("HASH_MAX_IN_FLIGHT", str(HASH_WORKERS * 4)))
+HASH_TIMEOUT_SECONDS = float(os.getenv("HASH_TIMEOUT_SECONDS", "10"))
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing pool is saturated and the request was shed"""
+
+
+def _run(operation: str, submitted_at: float, *args):
+    """Pool worker entry point; reports how long the call waited in the queue"""
+    from app.core.security import get_password_hash, verify_and_update_password
+    
+    started = time.time()
+    if operation == "hash":
+        result = get_password_hash(*args)
+    else:
+        result = verify_and_update_password(*args)
+    return result, started - submitted_at, time.time() - started
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool so auth load can't starve the API threads"""
+    
+    def __init__(self, max_workers: int = HASH_WORKERS, max_in_flight: int = HASH_MAX_IN_FLIGHT):
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._stats = {
+            "completed": 0,
+            "shed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "queue_seconds_total": 0.0,
+            "queue_seconds_max": 0.0,
+            "hash_seconds_total": 0.0,
+            "hash_seconds_max": 0.0
+        }
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+    
+    def hash(self, password: str) -> str:
+        return self._call("hash", password)
+    
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash); new_hash is set when the stored hash should be replaced"""
+        return self._call("verify", password, hashed_password)
+    
+    def _call(self, operation: str, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["shed"] += 1
+            hash_shed.inc()
+            raise HashingOverloaded()
+        
+        with self._lock:
+            self._stats["in_flight"] += 1
+        try:
+            try:
+                future = self._get_executor().submit(_run, operation, time.time(), *args)
+            except BrokenProcessPool:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                future = self._get_executor().submit(_run, operation, time.time(), *args)
+        except Exception:
+            self._record_failure()
+            self._release()
+            raise
+        # The slot is held until the call really finishes, not just until we stop waiting,
+        # so timed-out work still counts against max_in_flight while it occupies the pool
+        future.add_done_callback(self._release)
+        try:
+            result, queue_seconds, hash_seconds = future.result(timeout=HASH_TIMEOUT_SECONDS)
+        except Exception:
+            # Drops the call if it is still queued; one already running finishes on its own
+            future.cancel()
+            self._record_failure()
+            raise
+        
+        hash_queue_duration.observe(queue_seconds)
+        hash_duration.labels(operation).observe(hash_seconds)
+        with self._lock:
+            stats = self._stats
+            stats["completed"] += 1
+            stats["queue_seconds_total"] += queue_seconds
+            stats["queue_seconds_max"] = max(stats["queue_seconds_max"], queue_seconds)
+            stats["hash_seconds_total"] += hash_seconds
+            stats["hash_seconds_max"] = max(stats["hash_seconds_max"], hash_seconds)
+        return result
+    
+    def _release(self, future=None):
+        with self._lock:
+            self._stats["in_flight"] -= 1
+        self._slots.release()
+    
+    def _record_failure(self):
+        with self._lock:
+            self._stats["failed"] += 1
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, max_in_flight=self.max_in_flight, workers=self.max_workers)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+password_hasher = PasswordHasher()
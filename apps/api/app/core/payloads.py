@@ -0,0 +1,125 @@
+"""
+Storage format of GameData.face_data and GameData.stress_scores.
+
+New games store plain JSON. The compaction job (app.jobs.compact_game_data)
+rewrites old ones as "<codec>:<base64 of the compressed JSON>", and may first
+replace the per-frame data with a downsampled rollup:
+  face_data     {"downsampled": N, "frames": [mean of each N frames, ...]}
+  stress_scores {"downsampled": N, "scores": [mean of each N scores, ...]}
+Plain JSON always starts with "[" or "{", so the tag is unambiguous. Readers go
+through load_frames / load_scores and never see the difference.
+"""
+import base64
+import json
+import math
+import re
+import zlib
+from typing import Dict, List, Optional
+
+CODECS = ("zlib", "zstd")
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 19
+
+# A JSON array of numbers/nulls, strict JSON only (no NaN/Infinity), checked without parsing
+_NUMBER = r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?"
+_ITEM = rf"\s*(?:{_NUMBER}|null)\s*"
+_SCORES_ARRAY = re.compile(rf"\[(?:{_ITEM}(?:,{_ITEM})*|\s*)\]")
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd-compressed game data requires the 'zstandard' package")
+    return zstandard
+
+def codec_of(value: Optional[str]) -> Optional[str]:
+    """The codec a stored payload was compressed with, or None for plain JSON"""
+    if value:
+        tag, sep, _ = value[:8].partition(":")
+        if sep and tag in CODECS:
+            return tag
+    return None
+
+def compress(text: str, codec: str = "zlib") -> str:
+    if codec == "zlib":
+        data = zlib.compress(text.encode(), ZLIB_LEVEL)
+    elif codec == "zstd":
+        data = _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(text.encode())
+    else:
+        raise ValueError(f"Unknown codec: {codec}")
+    return f"{codec}:{base64.b64encode(data).decode('ascii')}"
+
+def decompress(value: Optional[str]) -> Optional[str]:
+    """The JSON text of a stored payload, whichever form it is in"""
+    codec = codec_of(value)
+    if codec is None:
+        return value
+    data = base64.b64decode(value[len(codec) + 1:])
+    if codec == "zlib":
+        return zlib.decompress(data).decode()
+    return _zstd().ZstdDecompressor().decompress(data).decode()
+
+def _load(value: Optional[str]):
+    try:
+        text = decompress(value)
+        return json.loads(text) if text else None
+    except (ValueError, zlib.error):
+        return None
+
+def load_scores(value: Optional[str]) -> List[float]:
+    """Per-frame (or downsampled) stress scores from GameData.stress_scores"""
+    data = _load(value)
+    if isinstance(data, dict):
+        data = data.get("scores")
+    return data if isinstance(data, list) else []
+
+def scores_json(value: Optional[str]) -> str:
+    """
+    GameData.stress_scores as JSON array text for RawJSON. Per-frame arrays are
+    returned without parsing when they match a strict array of numbers; anything
+    else (rollups, rows saved before validation) is re-encoded, with non-finite
+    or non-numeric entries as null.
+    """
+    try:
+        text = decompress(value)
+    except (ValueError, zlib.error):
+        return "[]"
+    if text and _SCORES_ARRAY.fullmatch(text):
+        return text
+    scores = [s if isinstance(s, (int, float)) and not isinstance(s, bool) and math.isfinite(s) else None
+              for s in load_scores(value)]
+    return json.dumps(scores, allow_nan=False)
+
+def load_frames(value: Optional[str]) -> List[Dict]:
+    """Per-frame (or downsampled) face metrics from GameData.face_data"""
+    data = _load(value)
+    if isinstance(data, dict):
+        data = data.get("frames")
+    if not isinstance(data, list):
+        return []
+    return [frame for frame in data if isinstance(frame, dict)]
+
+def downsample_scores(value: Optional[str], factor: int) -> Optional[str]:
+    """Stress scores averaged over each `factor` frames, as JSON"""
+    scores = [s for s in load_scores(value) if isinstance(s, (int, float))]
+    if not scores:
+        return value
+    means = [round(sum(chunk) / len(chunk), 2)
+             for chunk in (scores[i:i + factor] for i in range(0, len(scores), factor))]
+    return json.dumps({"downsampled": factor, "scores": means})
+
+def downsample_frames(value: Optional[str], factor: int) -> Optional[str]:
+    """Numeric face metrics averaged over each `factor` frames, as JSON"""
+    frames = load_frames(value)
+    if not frames:
+        return value
+    means = []
+    for i in range(0, len(frames), factor):
+        chunk = frames[i:i + factor]
+        mean = {}
+        for key in chunk[0]:
+            values = [f[key] for f in chunk if isinstance(f.get(key), (int, float)) and not isinstance(f.get(key), bool)]
+            if values:
+                mean[key] = round(sum(values) / len(values), 4)
+        means.append(mean)
+    return json.dumps({"downsampled": factor, "frames": means})
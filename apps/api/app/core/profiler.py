@@ -0,0 +1,97 @@
+"""
+Opt-in sampling profiler producing flamegraph-compatible folded stacks.
+
+Enabled with PROFILER_ENABLED=1. A request is profiled when it sends
+`X-Profile: 1` or is picked by PROFILE_SAMPLE_RATE; the stacks are written to
+PROFILE_DIR as `<timestamp>_<method>_<path>.folded`, one "frame;frame;frame count"
+line per unique stack (feed to flamegraph.pl or speedscope).
+"""
+import os
+import re
+import asyncio
+import sys
+import time
+import random
+import threading
+from collections import Counter
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_HEADER = b"x-profile"
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StackSampler(threading.Thread):
+    """
+    Periodically samples every thread that is executing application code.
+    Other requests in flight at the same time can show up in the output.
+    """
+    
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                in_app = False
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or code.co_filename.startswith(_APP_DIR)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Idle workers and the event loop's select() aren't interesting
+                if in_app:
+                    self.stacks[";".join(reversed(stack))] += 1
+    
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+    
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles opted-in or sampled requests"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            name = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+            path = os.path.join(PROFILE_DIR, f"{time.time():.3f}_{scope['method']}_{name}.folded")
+            # Joining the sampler thread and writing the file both block; keep them off the event loop
+            await asyncio.to_thread(self._finish, sampler, path)
+    
+    @staticmethod
+    def _finish(sampler: "StackSampler", path: str):
+        sampler.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        sampler.write(path)
+    
+    def _wants_profile(self, scope) -> bool:
+        for key, value in scope.get("headers", ()):
+            if key == PROFILE_HEADER:
+                return value not in (b"0", b"false", b"")
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
@@ -0,0 +1,64 @@
+"""
+JSON responses for the API.
+
+FastJSONResponse is the app's default response class. It encodes with orjson
+(several times faster than json.dumps, and native datetimes and NumPy values)
+when the package is installed, and reports its encoding time as the
+Server-Timing serialization phase.
+
+Endpoints that return JSON already stored in the database, such as a game's
+stress_scores array, can wrap it in RawJSON and return a FastJSONResponse
+directly: the stored text is spliced into the body as-is instead of being
+decoded into Python objects and encoded again.
+"""
+import re
+import json
+import time
+import secrets
+from datetime import date, datetime
+from fastapi.responses import JSONResponse
+from app.core.timing import record_phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class RawJSON:
+    """Text that is already a valid JSON value, to splice into a FastJSONResponse"""
+    
+    __slots__ = ("text",)
+    
+    def __init__(self, text: str):
+        self.text = text
+
+class FastJSONResponse(JSONResponse):
+    """orjson-encoded JSONResponse that splices RawJSON values into the body"""
+    
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        fragments = []
+        # Each RawJSON is encoded as a placeholder string, then replaced. The
+        # per-response nonce keeps user-supplied strings from matching one.
+        nonce = secrets.token_hex(8)
+        
+        def default(value):
+            if isinstance(value, RawJSON):
+                fragments.append(value.text.encode())
+                return f"\x00{nonce}:{len(fragments) - 1}\x00"
+            if orjson is None and isinstance(value, (datetime, date)):
+                return value.isoformat()
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+        
+        if orjson is not None:
+            body = orjson.dumps(content, default=default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        else:
+            body = json.dumps(content, default=default, ensure_ascii=False, allow_nan=False,
+                              indent=None, separators=(",", ":")).encode("utf-8")
+        if fragments:
+            # Both encoders escape NUL as \u0000
+            placeholder = re.compile(rb'"\\u0000' + nonce.encode() + rb':(\d+)\\u0000"')
+            body = placeholder.sub(lambda match: fragments[int(match.group(1))], body)
+        record_phase("serialization", time.perf_counter() - started)
+        return body
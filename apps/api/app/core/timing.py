@@ -0,0 +1,55 @@
+"""
+Per-request Server-Timing breakdown.
+
+Instrumented code calls record_phase(); it is a single ContextVar lookup unless
+SERVER_TIMING=1 installs ServerTimingMiddleware, which collects the phases
+and reports them in a Server-Timing response header.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "0") == "1"
+
+# Phases reported in the header, in order
+PHASES = ("db", "inference", "serialization", "render")
+
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing_phases", default=None)
+
+
+def record_phase(name: str, seconds: float):
+    """Add time to a phase of the current request, if Server-Timing is collecting"""
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding `Server-Timing: db;dur=..., ..., total;dur=...`"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        phases = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                entries = [f"{name};dur={phases[name] * 1000:.2f}" for name in PHASES if name in phases]
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.2f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _phases.reset(token)
@@ -0,0 +1 @@
+# Jobs Package
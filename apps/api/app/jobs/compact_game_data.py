@@ -0,0 +1,172 @@
+"""
+Compact the per-frame payloads of old games.
+
+Usage: python -m app.jobs.compact_game_data [--older-than-days 90] [--codec zlib|zstd]
+                                            [--downsample N] [--batch-size 500] [--limit N]
+                                            [--vacuum-pages 2000] [--enable-incremental-vacuum]
+
+GameData.face_data and stress_scores of games completed before the cutoff are
+compressed in place (see app.core.payloads for the format), after optionally
+being replaced by means over every N frames. Games already compacted are
+skipped, so re-running only picks up games that have aged past the cutoff
+since. Batches are committed as they go.
+
+Freed pages are then handed back to the filesystem with incremental vacuum,
+a few thousand pages per step so writers are never blocked for long. That
+needs auto_vacuum=INCREMENTAL, which new databases get from init_db; older
+ones are converted once with --enable-incremental-vacuum (a full VACUUM).
+"""
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from sqlalchemy import or_, select, update
+from app.core.database import SessionLocal, engine, init_db
+from app.core import payloads
+from app import models
+
+COMPACT_AFTER_DAYS = int(os.getenv("COMPACT_AFTER_DAYS", "90"))
+COMPACT_CODEC = os.getenv("COMPACT_CODEC", "zlib")
+
+def _compact(value: Optional[str], codec: str, downsample: int,
+             rollup: Callable[[Optional[str], int], Optional[str]]) -> Optional[str]:
+    if not value:
+        return value
+    if downsample > 1:
+        value = rollup(value, downsample)
+    return payloads.compress(value, codec)
+
+def _database_pages(conn) -> Dict[str, int]:
+    return {
+        'page_size': conn.exec_driver_sql("PRAGMA page_size").scalar(),
+        'page_count': conn.exec_driver_sql("PRAGMA page_count").scalar(),
+        'freelist_count': conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    }
+
+def vacuum(pages_per_step: int = 2000, enable_incremental: bool = False) -> Optional[Dict]:
+    """Return free pages to the filesystem; returns file sizes, or None if not SQLite"""
+    if engine.dialect.name != "sqlite":
+        return None
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        before = _database_pages(conn)
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        if mode != 2 and enable_incremental:
+            # auto_vacuum can only be switched on an existing database by rebuilding it
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        if mode == 2:
+            free = before['freelist_count']
+            while free:
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({pages_per_step})")
+                remaining = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+                if remaining >= free:
+                    break
+                free = remaining
+        after = _database_pages(conn)
+    return {
+        'incremental': mode == 2,
+        'file_bytes_before': before['page_count'] * before['page_size'],
+        'file_bytes_after': after['page_count'] * after['page_size'],
+        'free_bytes': after['freelist_count'] * after['page_size']
+    }
+
+def compact_game_data(older_than_days: int = COMPACT_AFTER_DAYS, codec: str = COMPACT_CODEC,
+                      downsample: int = 0, batch_size: int = 500, limit: Optional[int] = None,
+                      progress: Callable[[Dict], None] = None) -> Dict:
+    """Compact games completed more than older_than_days ago; returns run totals"""
+    if codec not in payloads.CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+    if codec == "zstd":
+        payloads.compress("", codec)  # fail before touching any rows if zstandard is missing
+    
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    tags = [f"{c}:" for c in payloads.CODECS]
+    query = select(
+        models.GameData.id, models.GameData.face_data, models.GameData.stress_scores
+    ).where(
+        models.GameData.completed_at < cutoff,
+        # Compacted games have both payloads tagged (or empty)
+        or_(*[column.isnot(None) & (column != '') & ~or_(*[column.startswith(t) for t in tags])
+              for column in (models.GameData.face_data, models.GameData.stress_scores)])
+    )
+    
+    db = SessionLocal()
+    try:
+        stats = {'compacted': 0, 'bytes_before': 0, 'bytes_after': 0, 'last_game_id': 0, 'elapsed': 0.0}
+        started = time.time()
+        while limit is None or stats['compacted'] < limit:
+            wanted = batch_size if limit is None else min(batch_size, limit - stats['compacted'])
+            rows = db.execute(
+                query.where(models.GameData.id > stats['last_game_id'])
+                .order_by(models.GameData.id)
+                .limit(wanted)
+            ).all()
+            if not rows:
+                break
+            
+            updates = []
+            for row in rows:
+                update_row = {'id': row.id}
+                for field, rollup in (('face_data', payloads.downsample_frames),
+                                      ('stress_scores', payloads.downsample_scores)):
+                    value = getattr(row, field)
+                    if payloads.codec_of(value) is None:
+                        update_row[field] = _compact(value, codec, downsample, rollup)
+                        stats['bytes_before'] += len(value or '')
+                        stats['bytes_after'] += len(update_row[field] or '')
+                updates.append(update_row)
+            db.execute(update(models.GameData), updates)
+            if downsample > 1:
+                # Session data now shows fewer frames; bump its HTTP cache validators
+                db.execute(update(models.GameSession).where(
+                    models.GameSession.id.in_(select(models.GameData.session_id).where(
+                        models.GameData.id.in_([row.id for row in rows])
+                    ))
+                ).values(updated_at=datetime.utcnow()))
+            db.commit()
+            
+            stats['compacted'] += len(rows)
+            stats['last_game_id'] = rows[-1].id
+            stats['elapsed'] = time.time() - started
+            if progress:
+                progress(dict(stats))
+        
+        stats['elapsed'] = time.time() - started
+        return stats
+    finally:
+        db.close()
+
+def _print_progress(stats: Dict):
+    print(f"{stats['compacted']} games compacted, {stats['bytes_before']:,} -> {stats['bytes_after']:,} "
+          f"payload bytes, last id {stats['last_game_id']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress (and optionally downsample) old game payloads")
+    parser.add_argument("--older-than-days", type=int, default=COMPACT_AFTER_DAYS)
+    parser.add_argument("--codec", choices=payloads.CODECS, default=COMPACT_CODEC)
+    parser.add_argument("--downsample", type=int, default=0,
+                        help="Replace per-frame data with means over every N frames (0 = keep every frame)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many games")
+    parser.add_argument("--vacuum-pages", type=int, default=2000,
+                        help="Pages freed per incremental vacuum step (0 = don't vacuum)")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Switch an older database to incremental auto_vacuum (runs a full VACUUM once)")
+    args = parser.parse_args()
+    
+    init_db()
+    result = compact_game_data(args.older_than_days, args.codec, args.downsample,
+                               args.batch_size, args.limit, _print_progress)
+    print(f"Done: {result['compacted']} games compacted in {result['elapsed']:.1f}s, "
+          f"{result['bytes_before'] - result['bytes_after']:,} payload bytes reclaimed")
+    
+    if args.vacuum_pages > 0:
+        sizes = vacuum(args.vacuum_pages, args.enable_incremental_vacuum)
+        if sizes is not None:
+            print(f"Database file: {sizes['file_bytes_before']:,} -> {sizes['file_bytes_after']:,} bytes "
+                  f"({sizes['file_bytes_before'] - sizes['file_bytes_after']:,} reclaimed)")
+            if not sizes['incremental']:
+                print(f"auto_vacuum is off, so {sizes['free_bytes']:,} free bytes stay in the file; "
+                      "run once with --enable-incremental-vacuum to return them")
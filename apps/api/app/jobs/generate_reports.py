@@ -0,0 +1,195 @@
+"""
+Generate reports for every completed session that doesn't have one yet.
+
+Usage: python -m app.jobs.generate_reports [--batch-size 500] [--limit N] [--checkpoint FILE]
+
+Sessions are processed in id order in batches; each batch is one transaction.
+Re-running picks up where the last run stopped, since sessions that already
+have a report are skipped (the checkpoint file also skips sessions without games).
+"""
+import os
+import time
+import argparse
+import numpy as np
+from typing import Callable, Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.core.database import SessionLocal, init_db
+from app import models
+from app.services.report_service import report_service, LOW_STRESS_MAX, HIGH_STRESS_MIN, TREND_MARGIN
+from app.services.recommendation_catalog import recommendation_catalog
+from app.services.stats_service import stats_service
+
+
+def _read_checkpoint(path: Optional[str]) -> int:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    return 0
+
+def _write_checkpoint(path: Optional[str], last_session_id: int):
+    if path:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(last_session_id))
+        os.replace(tmp_path, path)
+
+def _classify(overall: np.ndarray, baseline: np.ndarray):
+    """Vectorized ReportService.stress_level_for / stress_trend_for"""
+    levels = np.where(overall < LOW_STRESS_MAX, "Low",
+                      np.where(overall < HIGH_STRESS_MIN, "Medium", "High"))
+    # Sessions without a baseline (None or 0) are always Stable
+    has_baseline = np.nan_to_num(baseline) != 0
+    trends = np.where(has_baseline & (overall > baseline + TREND_MARGIN), "Increasing",
+                      np.where(has_baseline & (overall < baseline - TREND_MARGIN), "Decreasing", "Stable"))
+    return levels, trends
+
+def _pending_sessions_query(db, after_id: int):
+    return db.query(
+        models.GameSession.id,
+        models.GameSession.user_id,
+        models.GameSession.baseline_stress
+    ).outerjoin(
+        models.StressReport, models.StressReport.session_id == models.GameSession.id
+    ).filter(
+        models.GameSession.completed_at.isnot(None),
+        models.StressReport.id.is_(None),
+        models.GameSession.id > after_id
+    )
+
+def _add_reports(db, rows):
+    # Backfill missing stats rows first so the new reports are counted exactly once
+    for user_id in {row['user_id'] for row in rows}:
+        stats_service.ensure(db, user_id)
+    db.bulk_insert_mappings(models.StressReport, rows)
+    for row in rows:
+        stats_service.record_report(
+            db, row['user_id'], row['session_id'], row['overall_stress'], row['stress_level']
+        )
+
+def _insert_batch(db, rows):
+    """Insert a batch in one transaction, falling back to row by row if the API raced us"""
+    try:
+        _add_reports(db, rows)
+        db.commit()
+        return len(rows)
+    except IntegrityError:
+        db.rollback()
+    created = 0
+    for row in rows:
+        try:
+            _add_reports(db, [row])
+            db.commit()
+            created += 1
+        except IntegrityError:
+            db.rollback()
+    return created
+
+def generate_missing_reports(batch_size: int = 500, limit: Optional[int] = None,
+                             checkpoint: Optional[str] = None,
+                             progress: Callable[[Dict], None] = None) -> Dict:
+    """Create reports for completed sessions without one; returns run totals"""
+    db = SessionLocal()
+    try:
+        recommendation_catalog.ensure_loaded(db)
+        last_id = _read_checkpoint(checkpoint)
+        stats = {
+            'pending': _pending_sessions_query(db, last_id).count(),
+            'scanned': 0,
+            'created': 0,
+            'skipped_no_games': 0,
+            'last_session_id': last_id,
+            'elapsed': 0.0
+        }
+        started = time.time()
+        
+        while limit is None or stats['scanned'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - stats['scanned'])
+            sessions = _pending_sessions_query(db, last_id).order_by(models.GameSession.id).limit(size).all()
+            if not sessions:
+                break
+            session_ids = [s.id for s in sessions]
+            
+            # Set-based loads for the whole batch
+            aggregates = {
+                row.session_id: row for row in db.query(
+                    models.GameData.session_id,
+                    func.count(models.GameData.id).label('game_count'),
+                    func.max(models.GameData.id).label('last_game_id'),
+                    func.sum(models.GameData.avg_stress).label('stress_sum')
+                ).filter(
+                    models.GameData.session_id.in_(session_ids)
+                ).group_by(models.GameData.session_id)
+            }
+            users = {
+                u.id: u for u in db.query(
+                    models.User.id, models.User.work_type, models.User.working_hours, models.User.mobile_usage
+                ).filter(models.User.id.in_({s.user_id for s in sessions}))
+            }
+            
+            ready = [s for s in sessions if s.id in aggregates and s.user_id in users]
+            stats['skipped_no_games'] += len(sessions) - len(ready)
+            
+            if ready:
+                counts = np.array([aggregates[s.id].game_count for s in ready], dtype=float)
+                sums = np.array([aggregates[s.id].stress_sum or 0.0 for s in ready], dtype=float)
+                baselines = np.array([s.baseline_stress if s.baseline_stress is not None else np.nan
+                                      for s in ready], dtype=float)
+                overall = sums / counts
+                levels, trends = _classify(overall, baselines)
+                
+                rows = []
+                for i, s in enumerate(ready):
+                    agg = aggregates[s.id]
+                    user = users[s.user_id]
+                    user_data = {
+                        'work_type': user.work_type,
+                        'working_hours': user.working_hours,
+                        'mobile_usage': user.mobile_usage
+                    }
+                    entry_ids = recommendation_catalog.entry_ids(db, overall[i], user_data, str(trends[i]))
+                    rows.append({
+                        'user_id': s.user_id,
+                        'session_id': s.id,
+                        'overall_stress': float(overall[i]),
+                        'stress_level': str(levels[i]),
+                        'stress_trend': str(trends[i]),
+                        'input_fingerprint': report_service.input_fingerprint(
+                            s.baseline_stress, agg.game_count, agg.last_game_id, agg.stress_sum or 0.0
+                        ),
+                        'activities_id': entry_ids['activities'],
+                        'workouts_id': entry_ids['workouts'],
+                        'meditation_id': entry_ids['meditation'],
+                        'food_control_id': entry_ids['food_control'],
+                        'medical_checkup_id': entry_ids['medical_checkup']
+                    })
+                stats['created'] += _insert_batch(db, rows)
+            
+            last_id = session_ids[-1]
+            _write_checkpoint(checkpoint, last_id)
+            stats['scanned'] += len(sessions)
+            stats['last_session_id'] = last_id
+            stats['elapsed'] = time.time() - started
+            if progress:
+                progress(dict(stats))
+        
+        stats['elapsed'] = time.time() - started
+        return stats
+    finally:
+        db.close()
+
+def _print_progress(stats: Dict):
+    rate = stats['scanned'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    print(f"{stats['scanned']}/{stats['pending']} sessions scanned, {stats['created']} reports created, "
+          f"{stats['skipped_no_games']} without games, last id {stats['last_session_id']} ({rate:.0f} sessions/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate reports for completed sessions without one")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after scanning this many sessions")
+    parser.add_argument("--checkpoint", default=None, help="File recording the last processed session id")
+    args = parser.parse_args()
+    
+    init_db()
+    result = generate_missing_reports(args.batch_size, args.limit, args.checkpoint, _print_progress)
+    print(f"Done: {result['created']} reports created in {result['elapsed']:.1f}s")
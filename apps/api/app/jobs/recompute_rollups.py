@@ -0,0 +1,172 @@
+"""
+Recompute the analytics rollups (stress_rollups) from game_data.
+
+Usage: python -m app.jobs.recompute_rollups [--since YYYY-MM-DD] [--page-size 20000]
+
+Games are read in id-ordered pages and grouped with NumPy (np.unique +
+bincount), so the whole pass never holds more than one page of games. Rollups
+for the recomputed days are then replaced in one transaction, along with the
+per-game percentile histograms (always rebuilt in full). Use it after a
+backfill, a rescore (app.jobs.rescore_games) or profile changes, since
+incremental updates file each game under the user's cohort at the time it was
+played.
+"""
+import time
+import argparse
+import numpy as np
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select
+from app.core.database import SessionLocal, init_db
+from app import models
+from app.services.analytics_service import (
+    BUCKET_COLUMNS, HISTOGRAM_BUCKETS, UNKNOWN_COHORT, WORKING_HOURS_COHORTS
+)
+from app.services.percentile_service import percentile_service
+
+# Per-group statistics, in this order, followed by the histogram buckets
+COUNT, SUM, SQ_SUM, MIN, MAX, SCORE_SUM, DURATION_SUM = range(7)
+STAT_WIDTH = 7 + HISTOGRAM_BUCKETS
+
+Rollups = Dict[Tuple[str, str, str, int], np.ndarray]
+
+def _working_hours_cohorts(hours: np.ndarray) -> np.ndarray:
+    """Vectorized analytics_service.working_hours_cohort"""
+    bounds = np.array([upper for upper, _ in WORKING_HOURS_COHORTS[:-1]])
+    labels = np.array([label for _, label in WORKING_HOURS_COHORTS] + [UNKNOWN_COHORT], dtype=object)
+    index = np.searchsorted(bounds, hours, side='right')
+    index[np.isnan(hours)] = len(labels) - 1
+    return labels[index]
+
+def _accumulate(rollups: Rollups, page) -> int:
+    """Fold a page of games into the rollups; returns the last game id in the page"""
+    today = datetime.utcnow()
+    stress = np.array([row.avg_stress for row in page], dtype=float)
+    valid = ~np.isnan(stress)
+    rows = [row for row, ok in zip(page, valid) if ok]
+    last_id = page[-1].id
+    if not rows:
+        return last_id
+    stress = stress[valid]
+    score = np.nan_to_num(np.array([row.score for row in rows], dtype=float))
+    duration = np.nan_to_num(np.array([row.duration for row in rows], dtype=float))
+    games = np.array([row.game_name for row in rows], dtype=object)
+    days = np.array([(row.completed_at or today).toordinal() for row in rows])
+    buckets = np.clip((stress // 10).astype(int), 0, HISTOGRAM_BUCKETS - 1)
+    cohorts = {
+        "work_type": np.array([row.work_type or UNKNOWN_COHORT for row in rows], dtype=object),
+        "working_hours": _working_hours_cohorts(
+            np.array([row.working_hours for row in rows], dtype=float)
+        ),
+    }
+    
+    _, game_codes = np.unique(games, return_inverse=True)
+    day_values, day_codes = np.unique(days, return_inverse=True)
+    for dimension, cohort in cohorts.items():
+        _, cohort_codes = np.unique(cohort, return_inverse=True)
+        combined = (cohort_codes * (game_codes.max() + 1) + game_codes) * len(day_values) + day_codes
+        keys, group = np.unique(combined, return_inverse=True)
+        size = len(keys)
+        
+        stats = np.zeros((size, STAT_WIDTH))
+        stats[:, COUNT] = np.bincount(group, minlength=size)
+        stats[:, SUM] = np.bincount(group, weights=stress, minlength=size)
+        stats[:, SQ_SUM] = np.bincount(group, weights=stress * stress, minlength=size)
+        stats[:, MIN] = np.inf
+        np.minimum.at(stats[:, MIN], group, stress)
+        stats[:, MAX] = -np.inf
+        np.maximum.at(stats[:, MAX], group, stress)
+        stats[:, SCORE_SUM] = np.bincount(group, weights=score, minlength=size)
+        stats[:, DURATION_SUM] = np.bincount(group, weights=duration, minlength=size)
+        stats[:, 7:] = np.bincount(
+            group * HISTOGRAM_BUCKETS + buckets, minlength=size * HISTOGRAM_BUCKETS
+        ).reshape(size, HISTOGRAM_BUCKETS)
+        
+        # A representative row for each group gives its (cohort, game, day)
+        first = np.empty(size, dtype=int)
+        first[group[::-1]] = np.arange(len(rows))[::-1]
+        for g, i in enumerate(first):
+            key = (dimension, cohort[i], games[i], int(days[i]))
+            existing = rollups.get(key)
+            if existing is None:
+                rollups[key] = stats[g]
+            else:
+                low, high = min(existing[MIN], stats[g, MIN]), max(existing[MAX], stats[g, MAX])
+                existing += stats[g]
+                existing[MIN], existing[MAX] = low, high
+    return last_id
+
+def _scan(db, rollups: Rollups, since: Optional[date], after_id: int, page_size: int) -> Tuple[int, int]:
+    """Accumulate every game after after_id; returns (games read, last id)"""
+    query = select(
+        models.GameData.id, models.GameData.game_name, models.GameData.completed_at,
+        models.GameData.avg_stress, models.GameData.score, models.GameData.duration,
+        models.User.work_type, models.User.working_hours
+    ).join(
+        models.GameSession, models.GameSession.id == models.GameData.session_id
+    ).join(
+        models.User, models.User.id == models.GameSession.user_id
+    )
+    if since is not None:
+        query = query.where(models.GameData.completed_at >= datetime.combine(since, datetime.min.time()))
+    read = 0
+    while True:
+        page = db.execute(
+            query.where(models.GameData.id > after_id).order_by(models.GameData.id).limit(page_size)
+        ).all()
+        if not page:
+            return read, after_id
+        after_id = _accumulate(rollups, page)
+        read += len(page)
+
+def recompute_rollups(since: Optional[date] = None, page_size: int = 20000) -> Dict:
+    """Rebuild rollups for every day (or days from `since`); returns run totals"""
+    db = SessionLocal()
+    try:
+        started = time.time()
+        rollups: Rollups = {}
+        games, last_id = _scan(db, rollups, since, 0, page_size)
+        db.rollback()
+        
+        # Replace in one transaction. Games saved while we were scanning are
+        # picked up after the delete, once our write lock keeps new ones out.
+        delete = db.query(models.StressRollup)
+        if since is not None:
+            delete = delete.filter(models.StressRollup.day >= since)
+        delete.delete(synchronize_session=False)
+        tail, _ = _scan(db, rollups, since, last_id, page_size)
+        
+        rows = []
+        for (dimension, cohort, game_name, day), stats in rollups.items():
+            row = {
+                'dimension': dimension,
+                'cohort': cohort,
+                'game_name': game_name,
+                'day': date.fromordinal(day),
+                'games_count': int(stats[COUNT]),
+                'stress_sum': float(stats[SUM]),
+                'stress_sq_sum': float(stats[SQ_SUM]),
+                'stress_min': float(stats[MIN]),
+                'stress_max': float(stats[MAX]),
+                'score_sum': float(stats[SCORE_SUM]),
+                'duration_sum': float(stats[DURATION_SUM])
+            }
+            row.update({column: int(count) for column, count in zip(BUCKET_COLUMNS, stats[7:])})
+            rows.append(row)
+        db.bulk_insert_mappings(models.StressRollup, rows)
+        percentile_service.rebuild(db)
+        db.commit()
+        return {'games': games + tail, 'rollups': len(rows), 'elapsed': time.time() - started}
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the analytics rollups from game data")
+    parser.add_argument("--since", type=date.fromisoformat, default=None,
+                        help="Only recompute days from this date (YYYY-MM-DD)")
+    parser.add_argument("--page-size", type=int, default=20000)
+    args = parser.parse_args()
+    
+    init_db()
+    result = recompute_rollups(args.since, args.page_size)
+    print(f"Done: {result['rollups']} rollups from {result['games']} games in {result['elapsed']:.1f}s")
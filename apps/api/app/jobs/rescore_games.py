@@ -0,0 +1,241 @@
+"""
+Rescore historical games with the current model.
+
+Usage: python -m app.jobs.rescore_games [--chunk-size 500] [--workers N] [--model PATH]
+                                        [--checkpoint FILE] [--limit N] [--rebuild-stats]
+
+GameData.face_data is streamed in id order with yield_per and handed to a
+process pool chunk by chunk; each worker runs the model over every window in
+its chunk in one vectorized batch. Results are written back in id order, one
+transaction per chunk, and the checkpoint file records the last game written,
+so an interrupted run resumes where it stopped. At most a few chunks are held
+in memory at once.
+
+Frames are scored the way live inference scores them: the heuristic until a
+full window has arrived, then the model over the sliding window. Reports pick
+up the new averages the next time they are requested (their input fingerprint
+changes); --rebuild-stats also recomputes the affected users' stats. Run
+app.jobs.recompute_rollups afterwards to bring the analytics rollups in line.
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from datetime import datetime
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import select, update
+from app.core.database import SessionLocal, init_db
+from app.core import payloads
+from app import models
+from app.ml.model import extract_features, load_model_file
+from app.services.inference_service import heuristic_scores
+from app.services.stats_service import stats_service
+from app.jobs.generate_reports import _read_checkpoint, _write_checkpoint
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'ml', 'stress_model.json')
+SEQ_LEN = 30
+FEATURE_DIM = 6
+# Windows per forward_batch call; bounds worker memory for long games
+MAX_WINDOWS_PER_BATCH = 4096
+
+_worker_model = None
+_worker_seq_len = SEQ_LEN
+
+def _init_worker(model_path: Optional[str]):
+    """Load the model once per worker process"""
+    global _worker_model, _worker_seq_len
+    _worker_model = None
+    _worker_seq_len = SEQ_LEN
+    if model_path and os.path.exists(model_path):
+        _worker_model = load_model_file(model_path)
+        _worker_seq_len = _worker_model.seq_len or SEQ_LEN
+
+def _decode_frames(face_data: Optional[str]) -> np.ndarray:
+    """
+    Per-frame features from GameData.face_data: a JSON list of frame metrics
+    (as sent over /ws/analysis) or an object with a "frames" list, compacted or not
+    """
+    frames = [extract_features(frame) for frame in payloads.load_frames(face_data)]
+    return np.array(frames, dtype=float).reshape(-1, FEATURE_DIM)
+
+def _model_scores(games: List[Tuple[int, np.ndarray]], scores: Dict[int, np.ndarray]):
+    """Overwrite scores from the first full window on with the model, batching windows across games"""
+    seq_len = _worker_seq_len
+    pending = deque(
+        (game_id, sliding_window_view(frames, (seq_len, FEATURE_DIM))[:, 0])
+        for game_id, frames in games if len(frames) >= seq_len
+    )
+    next_frame = {game_id: seq_len - 1 for game_id, _ in pending}
+    while pending:
+        batch, owners, size = [], [], 0
+        while pending and size < MAX_WINDOWS_PER_BATCH:
+            game_id, windows = pending.popleft()
+            take = windows[:MAX_WINDOWS_PER_BATCH - size]
+            if len(take) < len(windows):
+                pending.appendleft((game_id, windows[len(take):]))
+            batch.append(take)
+            owners.append((game_id, len(take)))
+            size += len(take)
+        results = _worker_model.forward_batch(np.concatenate(batch))
+        offset = 0
+        for game_id, count in owners:
+            start = next_frame[game_id]
+            scores[game_id][start:start + count] = results[offset:offset + count]
+            next_frame[game_id] = start + count
+            offset += count
+
+def _score_chunk(rows: List[Tuple[int, Optional[str]]]) -> Tuple[List[Dict], int]:
+    """Rescore a chunk of (game id, face_data); returns the row updates and how many had no frames"""
+    games = [(game_id, _decode_frames(face_data)) for game_id, face_data in rows]
+    games = [(game_id, frames) for game_id, frames in games if len(frames)]
+    scores = {game_id: heuristic_scores(frames) for game_id, frames in games}
+    if _worker_model is not None:
+        _model_scores(games, scores)
+    
+    updates = []
+    for game_id, _ in games:
+        game_scores = scores[game_id]
+        updates.append({
+            'id': game_id,
+            'stress_scores': json.dumps(np.round(game_scores, 2).tolist()),
+            'avg_stress': float(game_scores.mean()),
+            'max_stress': float(game_scores.max()),
+            'min_stress': float(game_scores.min())
+        })
+    return updates, len(rows) - len(games)
+
+def rescore_games(chunk_size: int = 500, workers: Optional[int] = None, model_path: str = MODEL_PATH,
+                  checkpoint: Optional[str] = None, limit: Optional[int] = None,
+                  rebuild_stats: bool = False, progress: Callable[[Dict], None] = None) -> Dict:
+    """Rescore games after the checkpoint; returns run totals. workers=0 scores in-process."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    executor = None
+    if workers > 0:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path,)
+        )
+    else:
+        _init_worker(model_path)
+    
+    def submit(rows):
+        if executor is not None:
+            return executor.submit(_score_chunk, rows)
+        future = Future()
+        future.set_result(_score_chunk(rows))
+        return future
+    
+    db = SessionLocal()
+    try:
+        last_id = _read_checkpoint(checkpoint)
+        stats = {
+            'pending': db.query(models.GameData).filter(models.GameData.id > last_id).count(),
+            'scanned': 0,
+            'rescored': 0,
+            'skipped_no_frames': 0,
+            'last_game_id': last_id,
+            'elapsed': 0.0
+        }
+        if limit is not None:
+            stats['pending'] = min(stats['pending'], limit)
+        started = time.time()
+        
+        # Keep every worker busy with a couple of chunks queued behind it
+        window = max(1, workers) * 2
+        in_flight = deque()
+        read_id = last_id
+        submitted = 0
+        exhausted = False
+        
+        while True:
+            if not exhausted and len(in_flight) < window:
+                wanted = (window - len(in_flight)) * chunk_size
+                if limit is not None:
+                    wanted = min(wanted, limit - submitted)
+                # Read the refill in one streamed query and finish it before writing,
+                # so the read never holds a lock our own writes have to wait for
+                result = db.execute(
+                    select(models.GameData.id, models.GameData.face_data)
+                    .where(models.GameData.id > read_id)
+                    .order_by(models.GameData.id)
+                    .limit(wanted)
+                    .execution_options(yield_per=chunk_size)
+                )
+                received = 0
+                for partition in result.partitions():
+                    rows = [(row.id, row.face_data) for row in partition]
+                    read_id = rows[-1][0]
+                    received += len(rows)
+                    in_flight.append((read_id, len(rows), submit(rows)))
+                submitted += received
+                if received < wanted or (limit is not None and submitted >= limit):
+                    exhausted = True
+            
+            if not in_flight:
+                break
+            
+            chunk_last_id, chunk_rows, future = in_flight.popleft()
+            updates, skipped = future.result()
+            if updates:
+                db.execute(update(models.GameData), updates)
+                # Bump the HTTP cache validators of everything that shows these games
+                now = datetime.utcnow()
+                session_ids = select(models.GameData.session_id).where(
+                    models.GameData.id.in_([u['id'] for u in updates])
+                )
+                user_ids = select(models.GameSession.user_id).where(models.GameSession.id.in_(session_ids))
+                db.execute(update(models.GameSession).where(
+                    models.GameSession.id.in_(session_ids)
+                ).values(updated_at=now))
+                if rebuild_stats:
+                    for user_id in db.execute(user_ids.distinct()).scalars().all():
+                        stats_service.rebuild(db, user_id)
+                else:
+                    db.execute(update(models.UserStressStats).where(
+                        models.UserStressStats.user_id.in_(user_ids)
+                    ).values(updated_at=now))
+            db.commit()
+            _write_checkpoint(checkpoint, chunk_last_id)
+            
+            stats['scanned'] += chunk_rows
+            stats['rescored'] += len(updates)
+            stats['skipped_no_frames'] += skipped
+            stats['last_game_id'] = chunk_last_id
+            stats['elapsed'] = time.time() - started
+            if progress:
+                progress(dict(stats))
+        
+        stats['elapsed'] = time.time() - started
+        return stats
+    finally:
+        db.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def _print_progress(stats: Dict):
+    rate = stats['scanned'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    print(f"{stats['scanned']}/{stats['pending']} games scanned, {stats['rescored']} rescored, "
+          f"{stats['skipped_no_frames']} without frames, last id {stats['last_game_id']} ({rate:.0f} games/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore stored games with the current model")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = score in-process)")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model file to score with (any of app/ml/models/ too)")
+    parser.add_argument("--checkpoint", default=None, help="File recording the last rescored game id")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many games")
+    parser.add_argument("--rebuild-stats", action="store_true", help="Recompute stats for affected users")
+    args = parser.parse_args()
+    
+    init_db()
+    result = rescore_games(args.chunk_size, args.workers, args.model, args.checkpoint,
+                           args.limit, args.rebuild_stats, _print_progress)
+    print(f"Done: {result['rescored']} games rescored in {result['elapsed']:.1f}s")
@@ -1,19 +1,73 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.database import Base, engine
-from app.api.v1.endpoints import auth, stress, reports
-from app.services.inference_service import inference_service
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.database import SessionLocal, engine, init_db
+from app.core.timing import SERVER_TIMING_ENABLED, ServerTimingMiddleware
+from app.core.responses import FastJSONResponse
+from app.core.compression import CompressionMiddleware
+from app.core.profiler import PROFILER_ENABLED, ProfilerMiddleware
+from app.core.metrics import (
+    MetricsMiddleware, instrument_engine, render_metrics,
+    inference_batch_duration, inference_batch_size
+)
+from app import models
+from app.api.v1.endpoints import auth, stress, reports, analytics, monitoring
+from app.services.inference_service import inference_service, MODEL_WARMUP
+from app.services.pdf_job_service import pdf_job_service
+from app.services.session_state import session_store
+from app.services.feature_monitor import feature_monitor
+from app.core.password_hasher import password_hasher
+from app.services.connection_manager import (
+    connection_manager, ConnectionBudget, CLOSE_TRY_AGAIN_LATER
+)
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import logging
+import os
 import json
+import time
+
+logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Schema creation/migration on startup; disable when a deploy step runs it instead
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if INIT_DB_ON_STARTUP:
+        init_db()
+    if MODEL_WARMUP == "eager":
+        await asyncio.to_thread(inference_service.ensure_loaded)
+    elif MODEL_WARMUP == "background":
+        inference_service.warm_up_in_background()
+    yield
+    pdf_job_service.shutdown()
+    password_hasher.shutdown()
+    session_store.close()
+    feature_monitor.close()
 
 app = FastAPI(
     title="AI Stress Detection API",
     description="Real-time stress monitoring through facial expression analysis during gameplay",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# Request latency and SQL timing for /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+
+# Opt-in diagnostics; neither middleware is installed unless enabled
+if SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+if PROFILER_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+# gzip/brotli for clients that accept it
+app.add_middleware(CompressionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +81,13 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(stress.router)
 app.include_router(reports.router)
+app.include_router(analytics.router)
+app.include_router(monitoring.router)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def read_root():
@@ -38,41 +99,114 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "model_loaded": inference_service.use_model}
+    # Not ready until the model has been loaded (or given up on), unless it loads lazily
+    if not inference_service.ready and MODEL_WARMUP != "lazy":
+        return JSONResponse(status_code=503, content={"status": "starting", "model_loaded": False})
+    return {"status": "healthy", "model_loaded": inference_service.use_model,
+            "model": inference_service.model_name if inference_service.use_model else None}
+
+async def _receive_frames(websocket: WebSocket, budget: ConnectionBudget):
+    """Read frames into the connection's bounded queue; None marks the end of input"""
+    try:
+        while True:
+            data = await websocket.receive_json()
+            if not budget.offer(data):
+                break
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket receive error: {e}")
+    # Wake the consumer even if the queue is full of stale frames
+    if budget.queue.full():
+        budget.queue.get_nowait()
+    budget.queue.put_nowait(None)
+
+def _owns_session(client_key: str, session_id: int) -> bool:
+    """Whether the caller's verified token belongs to the game session's user"""
+    if not client_key.startswith("user:"):
+        return False
+    db = SessionLocal()
+    try:
+        owner = db.query(models.GameSession.user_id).filter(models.GameSession.id == session_id).scalar()
+    finally:
+        db.close()
+    return owner is not None and client_key == f"user:{owner}"
 
 @app.websocket("/ws/analysis")
-async def websocket_analysis(websocket: WebSocket):
-    """WebSocket endpoint for real-time stress analysis"""
+async def websocket_analysis(websocket: WebSocket, token: Optional[str] = None, session_id: Optional[int] = None):
+    """
+    WebSocket endpoint for real-time stress analysis. Pass ?session_id= (with the
+    session owner's token) to keep the LSTM window across reconnects, including
+    to other workers.
+    """
     await websocket.accept()
+    
+    client_key = connection_manager.client_key(
+        websocket.client.host if websocket.client else None, token
+    )
+    budget = connection_manager.admit(client_key)
+    if budget is None:
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=connection_manager.rejection_reason(client_key))
+        return
     print("WebSocket connection established")
     
+    receiver = asyncio.create_task(_receive_frames(websocket, budget))
     try:
-        while True:
-            # Receive face data from client
-            data = await websocket.receive_json()
+        window = []
+        if session_id is not None and not await asyncio.to_thread(_owns_session, client_key, session_id):
+            # Only the owner may resume or overwrite a session's window; others score statelessly
+            logger.info("Ignoring session_id %s for %s: not the session owner", session_id, client_key)
+            session_id = None
+        if session_id is not None:
+            window = await asyncio.to_thread(inference_service.load_window, session_id)
+        
+        finished = False
+        while not finished:
+            # Score everything that queued up while we were busy in one batch
+            frames = [await budget.queue.get()]
+            while not budget.queue.empty():
+                frames.append(budget.queue.get_nowait())
+            if frames[-1] is None:
+                frames.pop()
+                finished = True
             
-            # Extract face metrics
-            face_data = {
-                'blink_rate': data.get('blink_rate', 0.0),
-                'eye_openness': data.get('eye_openness', 1.0),
-                'jaw_clench': data.get('jaw_clench', 0.0),
-                'brow_tension': data.get('brow_tension', 0.0),
-                'jitter': data.get('jitter', 0.0),
-                'game_score': data.get('game_score', 0.5)
-            }
-            
-            # Get stress prediction
-            result = inference_service.predict(face_data)
+            started = time.perf_counter()
+            responses = []
+            for data in frames:
+                # Extract face metrics
+                face_data = {
+                    'blink_rate': data.get('blink_rate', 0.0),
+                    'eye_openness': data.get('eye_openness', 1.0),
+                    'jaw_clench': data.get('jaw_clench', 0.0),
+                    'brow_tension': data.get('brow_tension', 0.0),
+                    'jitter': data.get('jitter', 0.0),
+                    'game_score': data.get('game_score', 0.5)
+                }
+                
+                # Get stress prediction
+                result = inference_service.predict(face_data, window)
+                
+                responses.append({
+                    'stress_score': result['stress_score'],
+                    'stress_level': result['stress_level'],
+                    'confidence': result['confidence'],
+                    'timestamp': data.get('timestamp', '')
+                })
+            if frames:
+                inference_batch_duration.observe(time.perf_counter() - started)
+                inference_batch_size.observe(len(frames))
+                if session_id is not None:
+                    inference_service.save_window(session_id, window)
             
             # Send back to client
-            response = {
-                'stress_score': result['stress_score'],
-                'stress_level': result['stress_level'],
-                'confidence': result['confidence'],
-                'timestamp': data.get('timestamp', '')
-            }
-            
-            await websocket.send_json(response)
+            for response in responses:
+                await websocket.send_json(response)
+        
+        if budget.close_code is not None:
+            logger.info("Closing WebSocket for %s: %s", client_key, budget.close_reason)
+            await websocket.close(code=budget.close_code, reason=budget.close_reason)
+        else:
+            print("WebSocket connection closed")
             
     except WebSocketDisconnect:
         print("WebSocket connection closed")
@@ -82,6 +216,9 @@ async def websocket_analysis(websocket: WebSocket):
             await websocket.close()
         except:
             pass
+    finally:
+        receiver.cancel()
+        connection_manager.release(budget)
 
 if __name__ == "__main__":
     import uvicorn
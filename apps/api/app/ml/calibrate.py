@@ -0,0 +1,147 @@
+"""
+Calibrate the stress model family: accuracy vs per-frame latency.
+
+Usage: python -m app.ml.calibrate [--train-samples 2000] [--eval-samples 1000] [--runs 200]
+
+Each candidate keeps its randomly initialised recurrent weights and gets its
+readout fitted on synthetic windows (see StressModel.fit_readout). It is then
+scored on a held-out synthetic set and timed the way InferenceService serves
+it: one forward() over a full window per frame. The models are saved to
+app/ml/models/<name>.json and the results to calibration_report.json, which
+InferenceService reads to pick a model for INFERENCE_LATENCY_BUDGET_MS.
+"""
+import os
+import json
+import time
+import argparse
+import platform
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.ml.model import StressLSTM, StressGRU, EMALinearModel, StressModel, load_model_file
+from app.ml.train import generate_synthetic_data
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(ML_DIR, "models")
+REPORT_PATH = os.path.join(ML_DIR, "calibration_report.json")
+DEFAULT_MODEL_PATH = os.path.join(ML_DIR, "stress_model.json")
+SEQ_LEN = 30
+FEATURE_DIM = 6
+
+# name -> (class, constructor arguments)
+CANDIDATES = {
+    "lstm32": (StressLSTM, {"hidden_dim": 32, "init_scale": 0.5}),
+    "lstm16": (StressLSTM, {"hidden_dim": 16, "init_scale": 0.5}),
+    "lstm8": (StressLSTM, {"hidden_dim": 8, "init_scale": 0.5}),
+    "gru16": (StressGRU, {"hidden_dim": 16, "init_scale": 0.5}),
+    "gru8": (StressGRU, {"hidden_dim": 8, "init_scale": 0.5}),
+    "ema_linear": (EMALinearModel, {"decay": 0.9})
+}
+
+def model_path(name: str) -> str:
+    """File of a calibrated model; "default" is the stress_model.json served without a budget"""
+    if name == "default":
+        return DEFAULT_MODEL_PATH
+    return os.path.join(MODELS_DIR, f"{name}.json")
+
+def load_report(path: str = REPORT_PATH) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def frame_latency_ms(model: StressModel, seq_len: int = SEQ_LEN, runs: int = 200) -> float:
+    """Median time of one forward() over a full window, as served per frame"""
+    window = np.random.uniform(0, 1, (seq_len, model.input_dim)).tolist()
+    model.forward(window)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model.forward(window)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000)
+
+def _batch_us_per_window(model: StressModel, X: np.ndarray, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.forward_batch(X)
+        best = min(best, time.perf_counter() - started)
+    return best / len(X) * 1e6
+
+def accuracy_metrics(scores: np.ndarray, y: np.ndarray) -> Dict:
+    """MAE/RMSE on the 0-100 scale and Low/Medium/High agreement; y is true stress in 0-1"""
+    truth = y * 100
+    errors = scores - truth
+    return {
+        'mae': round(float(np.mean(np.abs(errors))), 2),
+        'rmse': round(float(np.sqrt(np.mean(errors ** 2))), 2),
+        # Same Low/Medium/High cut points as InferenceService.predict
+        'level_accuracy': round(float(np.mean(np.digitize(scores, [30, 70]) == np.digitize(truth, [30, 70]))), 3)
+    }
+
+def _row(name: str, model: StressModel, X_eval: np.ndarray, y_eval: np.ndarray, runs: int) -> Dict:
+    row = {
+        'name': name,
+        'model_type': model.model_type,
+        'hidden_dim': model.hidden_dim,
+        'parameters': model.parameter_count(),
+        'file': os.path.relpath(model_path(name), ML_DIR)
+    }
+    row.update(accuracy_metrics(model.forward_batch(X_eval), y_eval))
+    row['frame_latency_ms'] = round(frame_latency_ms(model, SEQ_LEN, runs), 4)
+    row['batch_us_per_window'] = round(_batch_us_per_window(model, X_eval), 2)
+    return row
+
+def calibrate(train_samples: int = 2000, eval_samples: int = 1000, runs: int = 200,
+              seed: int = 0, names: Optional[List[str]] = None) -> Dict:
+    """Fit, evaluate and save each candidate; returns the report, most accurate first"""
+    np.random.seed(seed)
+    X_train, y_train = generate_synthetic_data(num_samples=train_samples, seq_len=SEQ_LEN)
+    X_eval, y_eval = generate_synthetic_data(num_samples=eval_samples, seq_len=SEQ_LEN)
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    
+    rows = []
+    for name in names or CANDIDATES:
+        cls, kwargs = CANDIDATES[name]
+        model = cls(input_dim=FEATURE_DIM, output_dim=1, **kwargs)
+        model.fit_readout(X_train, y_train)
+        model.save_state_dict(model_path(name))
+        rows.append(_row(name, model, X_eval, y_eval, runs))
+        print(f"{name}: MAE {rows[-1]['mae']}, {rows[-1]['frame_latency_ms']} ms/frame")
+    
+    # The model served when no budget is configured, for comparison
+    if os.path.exists(DEFAULT_MODEL_PATH):
+        rows.append(_row("default", load_model_file(DEFAULT_MODEL_PATH), X_eval, y_eval, runs))
+    
+    rows.sort(key=lambda row: row['mae'])
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'host': {'machine': platform.machine(), 'processor': platform.processor(),
+                 'python': platform.python_version(), 'numpy': np.__version__},
+        'seq_len': SEQ_LEN,
+        'train_samples': train_samples,
+        'eval_samples': eval_samples,
+        'models': rows
+    }
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def print_report(report: Dict):
+    print(f"{'model':<12} {'params':>7} {'MAE':>6} {'RMSE':>6} {'level':>6} {'ms/frame':>9} {'us/window':>10}")
+    for row in report['models']:
+        print(f"{row['name']:<12} {row['parameters']:>7} {row['mae']:>6.2f} {row['rmse']:>6.2f} "
+              f"{row['level_accuracy']:>6.3f} {row['frame_latency_ms']:>9.4f} {row['batch_us_per_window']:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the model family and report accuracy vs latency")
+    parser.add_argument("--train-samples", type=int, default=2000)
+    parser.add_argument("--eval-samples", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=200, help="Timed forward() calls per model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", nargs="*", choices=list(CANDIDATES), help="Only these candidates")
+    args = parser.parse_args()
+    
+    print_report(calibrate(args.train_samples, args.eval_samples, args.runs, args.seed, args.models))
+    print(f"Report written to {REPORT_PATH}")
@@ -2,122 +2,238 @@ import numpy as np
 import json
 from typing import List
 
-class StressLSTM:
+class StressModel:
+    """
+    Interface shared by the stress models: a window of feature vectors
+    (seq_len, input_dim) in, a stress score (0-100) out. Subclasses implement
+    hidden_batch(); the output layer is a sigmoid over a linear readout of it.
+    """
+    
+    model_type = None
+    # Attributes saved to and loaded from the model file
+    params = ()
+    # Window length the model was trained on; None means the serving default
+    seq_len = None
+    
+    def sigmoid(self, x):
+        return 1 / (1 + np.exp(-np.clip(x, -500, 500)))
+    
+    def tanh(self, x):
+        return np.tanh(np.clip(x, -500, 500))
+    
+    def hidden_batch(self, X, lengths=None):
+        """(batch, seq_len, input_dim) -> (batch, features) fed to the readout"""
+        raise NotImplementedError
+    
+    def forward(self, X):
+        """Stress score for one sequence (seq_len, input_dim)"""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return float(self.forward_batch(X[None])[0])
+    
+    def forward_batch(self, X, lengths=None):
+        """
+        Scores for many sequences at once
+        X: (batch, seq_len, input_dim), right-padded if sequences differ in length
+        lengths: optional (batch,) true lengths
+        """
+        h = self.hidden_batch(np.asarray(X, dtype=float), lengths)
+        y = h @ self.Wy.T + self.by[:, 0]
+        return self.sigmoid(y[:, 0]) * 100
+    
+    def fit_readout(self, X, y, ridge=1e-3):
+        """
+        Fit the output layer by ridge regression on logit(y), y in 0-1, keeping
+        the rest of the model fixed
+        """
+        h = self.hidden_batch(np.asarray(X, dtype=float))
+        target = np.log(np.clip(y, 0.01, 0.99) / (1 - np.clip(y, 0.01, 0.99)))
+        design = np.hstack([h, np.ones((len(h), 1))])
+        coef = np.linalg.solve(design.T @ design + ridge * np.eye(design.shape[1]), design.T @ target)
+        self.Wy = coef[:-1].reshape(1, -1)
+        self.by = coef[-1:].reshape(1, 1)
+    
+    def parameter_count(self) -> int:
+        return int(sum(np.size(getattr(self, name)) for name in self.params))
+    
+    def state_dict(self) -> dict:
+        state = {name: np.asarray(getattr(self, name)).tolist() for name in self.params}
+        state.update({
+            'model_type': self.model_type,
+            'input_dim': self.input_dim,
+            'hidden_dim': self.hidden_dim,
+            'output_dim': self.output_dim
+        })
+        if self.seq_len:
+            state['seq_len'] = self.seq_len
+        return state
+    
+    def load_state(self, state: dict):
+        for name in self.params:
+            setattr(self, name, np.array(state[name]))
+        self.input_dim = state['input_dim']
+        self.hidden_dim = state['hidden_dim']
+        self.output_dim = state['output_dim']
+        self.seq_len = state.get('seq_len')
+    
+    def save_state_dict(self, filepath):
+        """Save model weights to JSON file"""
+        with open(filepath, 'w') as f:
+            json.dump(self.state_dict(), f)
+    
+    def load_state_dict(self, filepath):
+        """Load model weights from JSON file"""
+        with open(filepath, 'r') as f:
+            self.load_state(json.load(f))
+
+class StressLSTM(StressModel):
     """
     Simplified LSTM implementation using NumPy for stress prediction.
     Input: Sequence of facial features [blink_rate, eye_openness, jaw_clench, brow_tension, jitter, game_score]
     Output: Stress score (0-100)
     """
     
-    def __init__(self, input_dim=6, hidden_dim=32, output_dim=1):
+    model_type = "lstm"
+    params = ('Wf', 'bf', 'Wi', 'bi', 'Wc', 'bc', 'Wo', 'bo', 'Wy', 'by')
+    
+    def __init__(self, input_dim=6, hidden_dim=32, output_dim=1, init_scale=0.01):
         self.input_dim = input_dim
         self.hidden_dim = hidden_dim
         self.output_dim = output_dim
         
         # Initialize weights randomly
-        self.Wf = np.random.randn(hidden_dim, input_dim + hidden_dim) * 0.01
+        self.Wf = np.random.randn(hidden_dim, input_dim + hidden_dim) * init_scale
         self.bf = np.zeros((hidden_dim, 1))
         
-        self.Wi = np.random.randn(hidden_dim, input_dim + hidden_dim) * 0.01
+        self.Wi = np.random.randn(hidden_dim, input_dim + hidden_dim) * init_scale
         self.bi = np.zeros((hidden_dim, 1))
         
-        self.Wc = np.random.randn(hidden_dim, input_dim + hidden_dim) * 0.01
+        self.Wc = np.random.randn(hidden_dim, input_dim + hidden_dim) * init_scale
         self.bc = np.zeros((hidden_dim, 1))
         
-        self.Wo = np.random.randn(hidden_dim, input_dim + hidden_dim) * 0.01
+        self.Wo = np.random.randn(hidden_dim, input_dim + hidden_dim) * init_scale
         self.bo = np.zeros((hidden_dim, 1))
         
         self.Wy = np.random.randn(output_dim, hidden_dim) * 0.01
         self.by = np.zeros((output_dim, 1))
     
-    def sigmoid(self, x):
-        return 1 / (1 + np.exp(-np.clip(x, -500, 500)))
-    
-    def tanh(self, x):
-        return np.tanh(np.clip(x, -500, 500))
-    
-    def forward(self, X):
+    def hidden_batch(self, X, lengths=None):
         """
-        Forward pass through LSTM
-        X: List of feature vectors (sequence_length, input_dim)
+        Vectorized forward pass over many sequences at once, up to the final
+        hidden state; padded steps leave h and c unchanged. forward_batch()
+        matches forward() on each sequence.
         """
-        X = np.array(X)
-        if len(X.shape) == 1:
-            X = X.reshape(1, -1)
+        X = np.asarray(X, dtype=float)
+        batch, seq_len, _ = X.shape
+        hidden = self.hidden_dim
+        h = np.zeros((batch, hidden))
+        c = np.zeros((batch, hidden))
         
-        seq_len = X.shape[0]
-        h = np.zeros((self.hidden_dim, 1))
-        c = np.zeros((self.hidden_dim, 1))
+        # All four gates in one matmul per step
+        W = np.vstack([self.Wf, self.Wi, self.Wc, self.Wo]).T
+        b = np.vstack([self.bf, self.bi, self.bc, self.bo])[:, 0]
         
         for t in range(seq_len):
-            x_t = X[t].reshape(-1, 1)
-            concat = np.vstack([h, x_t])
-            
-            # Forget gate
-            f_t = self.sigmoid(np.dot(self.Wf, concat) + self.bf)
-            
-            # Input gate
-            i_t = self.sigmoid(np.dot(self.Wi, concat) + self.bi)
+            gates = np.hstack([h, X[:, t, :]]) @ W + b
+            f_t = self.sigmoid(gates[:, :hidden])
+            i_t = self.sigmoid(gates[:, hidden:2 * hidden])
+            c_tilde = self.tanh(gates[:, 2 * hidden:3 * hidden])
+            o_t = self.sigmoid(gates[:, 3 * hidden:])
             
-            # Candidate cell state
-            c_tilde = self.tanh(np.dot(self.Wc, concat) + self.bc)
-            
-            # Cell state
-            c = f_t * c + i_t * c_tilde
-            
-            # Output gate
-            o_t = self.sigmoid(np.dot(self.Wo, concat) + self.bo)
-            
-            # Hidden state
-            h = o_t * self.tanh(c)
+            c_next = f_t * c + i_t * c_tilde
+            h_next = o_t * self.tanh(c_next)
+            if lengths is None:
+                h, c = h_next, c_next
+            else:
+                active = (t < np.asarray(lengths))[:, None]
+                h = np.where(active, h_next, h)
+                c = np.where(active, c_next, c)
+        return h
+
+class StressGRU(StressModel):
+    """GRU variant: two gates instead of three and no cell state, so each step is cheaper"""
+    
+    model_type = "gru"
+    params = ('Wz', 'bz', 'Wr', 'br', 'Wh', 'bh', 'Wy', 'by')
+    
+    def __init__(self, input_dim=6, hidden_dim=16, output_dim=1, init_scale=0.01):
+        self.input_dim = input_dim
+        self.hidden_dim = hidden_dim
+        self.output_dim = output_dim
+        
+        # Update gate, reset gate and candidate state, each over [h, x]
+        self.Wz = np.random.randn(hidden_dim, input_dim + hidden_dim) * init_scale
+        self.bz = np.zeros((hidden_dim, 1))
+        self.Wr = np.random.randn(hidden_dim, input_dim + hidden_dim) * init_scale
+        self.br = np.zeros((hidden_dim, 1))
+        self.Wh = np.random.randn(hidden_dim, input_dim + hidden_dim) * init_scale
+        self.bh = np.zeros((hidden_dim, 1))
         
-        # Output layer
-        y = np.dot(self.Wy, h) + self.by
+        self.Wy = np.random.randn(output_dim, hidden_dim) * 0.01
+        self.by = np.zeros((output_dim, 1))
+    
+    def hidden_batch(self, X, lengths=None):
+        X = np.asarray(X, dtype=float)
+        batch, seq_len, _ = X.shape
+        hidden = self.hidden_dim
+        h = np.zeros((batch, hidden))
         
-        # Scale to 0-100 range
-        stress_score = float(self.sigmoid(y[0, 0]) * 100)
+        # Both gates in one matmul per step
+        W_gates = np.vstack([self.Wz, self.Wr]).T
+        b_gates = np.vstack([self.bz, self.br])[:, 0]
+        W_hh, W_hx = self.Wh[:, :hidden].T, self.Wh[:, hidden:].T
         
-        return stress_score
+        for t in range(seq_len):
+            x_t = X[:, t, :]
+            gates = self.sigmoid(np.hstack([h, x_t]) @ W_gates + b_gates)
+            z_t, r_t = gates[:, :hidden], gates[:, hidden:]
+            h_tilde = self.tanh((r_t * h) @ W_hh + x_t @ W_hx + self.bh[:, 0])
+            h_next = (1 - z_t) * h + z_t * h_tilde
+            if lengths is None:
+                h = h_next
+            else:
+                h = np.where((t < np.asarray(lengths))[:, None], h_next, h)
+        return h
+
+class EMALinearModel(StressModel):
+    """
+    Exponentially weighted average of the window's features (newest frames
+    weigh most) followed by the linear readout. One dot product per frame.
+    """
     
-    def save_state_dict(self, filepath):
-        """Save model weights to JSON file"""
-        state = {
-            'Wf': self.Wf.tolist(),
-            'bf': self.bf.tolist(),
-            'Wi': self.Wi.tolist(),
-            'bi': self.bi.tolist(),
-            'Wc': self.Wc.tolist(),
-            'bc': self.bc.tolist(),
-            'Wo': self.Wo.tolist(),
-            'bo': self.bo.tolist(),
-            'Wy': self.Wy.tolist(),
-            'by': self.by.tolist(),
-            'input_dim': self.input_dim,
-            'hidden_dim': self.hidden_dim,
-            'output_dim': self.output_dim
-        }
-        with open(filepath, 'w') as f:
-            json.dump(state, f)
+    model_type = "ema_linear"
+    params = ('decay', 'Wy', 'by')
     
-    def load_state_dict(self, filepath):
-        """Load model weights from JSON file"""
-        with open(filepath, 'r') as f:
-            state = json.load(f)
-        
-        self.Wf = np.array(state['Wf'])
-        self.bf = np.array(state['bf'])
-        self.Wi = np.array(state['Wi'])
-        self.bi = np.array(state['bi'])
-        self.Wc = np.array(state['Wc'])
-        self.bc = np.array(state['bc'])
-        self.Wo = np.array(state['Wo'])
-        self.bo = np.array(state['bo'])
-        self.Wy = np.array(state['Wy'])
-        self.by = np.array(state['by'])
-        self.input_dim = state['input_dim']
-        self.hidden_dim = state['hidden_dim']
-        self.output_dim = state['output_dim']
+    def __init__(self, input_dim=6, hidden_dim=None, output_dim=1, decay=0.9):
+        self.input_dim = input_dim
+        self.hidden_dim = input_dim
+        self.output_dim = output_dim
+        self.decay = np.array(decay)
+        self.Wy = np.zeros((output_dim, input_dim))
+        self.by = np.zeros((output_dim, 1))
+    
+    def hidden_batch(self, X, lengths=None):
+        X = np.asarray(X, dtype=float)
+        batch, seq_len, _ = X.shape
+        lengths = np.full(batch, seq_len) if lengths is None else np.asarray(lengths)
+        steps = np.arange(seq_len)
+        age = lengths[:, None] - 1 - steps[None, :]
+        weights = np.where(age >= 0, float(self.decay) ** np.maximum(age, 0), 0.0)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum('bt,btf->bf', weights, X)
+
+MODEL_TYPES = {cls.model_type: cls for cls in (StressLSTM, StressGRU, EMALinearModel)}
 
+def load_model_file(filepath) -> StressModel:
+    """Load any model saved with save_state_dict; files without a model_type are LSTMs"""
+    with open(filepath, 'r') as f:
+        state = json.load(f)
+    model = MODEL_TYPES[state.get('model_type') or 'lstm'](
+        input_dim=state['input_dim'], hidden_dim=state['hidden_dim'], output_dim=state['output_dim']
+    )
+    model.load_state(state)
+    return model
 
 def extract_features(face_data: dict) -> List[float]:
     """Extract features from face tracking data"""
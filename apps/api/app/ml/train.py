@@ -1,70 +1,273 @@
-import numpy as np
+"""
+Training for the stress models, on synthetic data.
+
+Usage:
+    python -m app.ml.train [--model-type lstm] [--hidden-dim 32] [--seq-len 30]
+                           [--epochs 200] [--learning-rate 1.0]
+    python -m app.ml.train --sweep [--random N] [--workers N] [--samples 4000]
+                           [--max-mae 5.0] [--output-dir DIR] [--no-export]
+
+The recurrent weights stay at their random initialisation and the readout is
+trained by gradient descent (see train_readout).
+
+A sweep trains every combination in SWEEP_GRID (model type, hidden size,
+window length, learning rate), or N random draws from it, in a process pool.
+The synthetic dataset is generated once and saved as .npy files that every
+worker maps read-only, so no worker regenerates or copies it. Trials are
+scored on a held-out split. Their per-frame inference latency is then timed
+one model at a time in this process, because timings taken while other trials
+run would be skewed. Results go to <output-dir>/leaderboard.json, and the
+fastest trial within --max-mae is copied to stress_model.json.
+"""
 import os
-from app.ml.model import StressLSTM
+import json
+import time
+import glob
+import shutil
+import argparse
+import itertools
+import tempfile
+import multiprocessing
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from app.ml.model import MODEL_TYPES, EMALinearModel, StressModel, load_model_file
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(ML_DIR, "stress_model.json")
+SWEEP_DIR = os.path.join(ML_DIR, "sweep")
+FEATURE_DIM = 6
+INIT_SCALE = 0.5
+VALIDATION_FRACTION = 0.25
+
+# Synthetic face metrics: offset + slope * true stress + gaussian noise, clipped to 0-1
+FEATURE_NAMES = ('blink_rate', 'eye_openness', 'jaw_clench', 'brow_tension', 'jitter', 'game_score')
+FEATURE_OFFSETS = np.array([0.0, 1.0, 0.0, 0.0, 0.0, 1.0])
+FEATURE_SLOPES = np.array([0.8, -0.6, 0.7, 0.5, 0.3, -0.4])
+FEATURE_NOISE = np.array([0.1, 0.1, 0.1, 0.1, 0.05, 0.1])
+
+SWEEP_GRID = {
+    'model_type': ('lstm', 'gru'),
+    'hidden_dim': (8, 16, 32),
+    'seq_len': (15, 30, 45),
+    'learning_rate': (0.1, 0.5, 2.0)
+}
+
+def synthetic_features(true_stress):
+    """
+    One frame of face metrics for a given true stress level (0-1):
+    [blink_rate, eye_openness, jaw_clench, brow_tension, jitter, game_score]
+    """
+    values = FEATURE_OFFSETS + FEATURE_SLOPES * true_stress + np.random.normal(0, FEATURE_NOISE)
+    return list(np.clip(values, 0, 1))
 
 def generate_synthetic_data(num_samples=1000, seq_len=30):
     """Generate synthetic training data for stress prediction"""
-    X = []
-    y = []
-    
-    for _ in range(num_samples):
-        # Generate random stress level
-        true_stress = np.random.uniform(0, 1)
-        
-        sequence = []
-        for _ in range(seq_len):
-            # Features correlate with stress level + noise
-            blink_rate = true_stress * 0.8 + np.random.normal(0, 0.1)
-            eye_openness = 1.0 - true_stress * 0.6 + np.random.normal(0, 0.1)
-            jaw_clench = true_stress * 0.7 + np.random.normal(0, 0.1)
-            brow_tension = true_stress * 0.5 + np.random.normal(0, 0.1)
-            jitter = true_stress * 0.3 + np.random.normal(0, 0.05)
-            game_score = 1.0 - true_stress * 0.4 + np.random.normal(0, 0.1)
-            
-            # Clip values to valid ranges
-            features = [
-                np.clip(blink_rate, 0, 1),
-                np.clip(eye_openness, 0, 1),
-                np.clip(jaw_clench, 0, 1),
-                np.clip(brow_tension, 0, 1),
-                np.clip(jitter, 0, 1),
-                np.clip(game_score, 0, 1)
-            ]
-            sequence.append(features)
-        
-        X.append(sequence)
-        y.append(true_stress)
+    true_stress = np.random.uniform(0, 1, num_samples)
+    noise = np.random.normal(0, 1, (num_samples, seq_len, FEATURE_DIM)) * FEATURE_NOISE
+    X = np.clip(FEATURE_OFFSETS + true_stress[:, None, None] * FEATURE_SLOPES + noise, 0, 1)
+    return X, true_stress
+
+def build_model(model_type: str, hidden_dim: int) -> StressModel:
+    if model_type == EMALinearModel.model_type:
+        return EMALinearModel(input_dim=FEATURE_DIM)
+    return MODEL_TYPES[model_type](input_dim=FEATURE_DIM, hidden_dim=hidden_dim, output_dim=1,
+                                   init_scale=INIT_SCALE)
+
+def train_readout(model: StressModel, X, y, num_epochs=200, learning_rate=1.0) -> float:
+    """
+    Train the model's readout by full-batch gradient descent on cross-entropy
+    against y (0-1), keeping the rest of the model fixed. Hidden features are
+    standardized while training and the scaling is folded back into Wy/by.
+    Returns the final training loss.
+    """
+    y = np.asarray(y, dtype=float)
+    h = model.hidden_batch(X)
+    mean, std = h.mean(axis=0), h.std(axis=0) + 1e-8
+    z = (h - mean) / std
+    w = np.zeros(z.shape[1])
+    b = 0.0
+    for _ in range(num_epochs):
+        error = model.sigmoid(z @ w + b) - y
+        w -= learning_rate * (z.T @ error) / len(y)
+        b -= learning_rate * error.mean()
     
-    return np.array(X), np.array(y)
+    model.Wy = (w / std).reshape(1, -1)
+    model.by = np.array([[b - np.sum(w * mean / std)]])
+    p = np.clip(model.sigmoid(z @ w + b), 1e-7, 1 - 1e-7)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
 
-def train_model(num_epochs=50, learning_rate=0.01):
-    """Train the LSTM model with synthetic data"""
+def train_model(num_epochs=200, learning_rate=1.0, model_type="lstm", hidden_dim=32, seq_len=30,
+                num_samples=1000, model_path=MODEL_PATH):
+    """Train one configuration with synthetic data and save it to model_path"""
     print("Generating synthetic training data...")
-    X_train, y_train = generate_synthetic_data(num_samples=1000, seq_len=30)
+    X_train, y_train = generate_synthetic_data(num_samples=num_samples, seq_len=seq_len)
     
     print("Initializing model...")
-    model = StressLSTM(input_dim=6, hidden_dim=32, output_dim=1)
+    model = build_model(model_type, hidden_dim)
+    model.seq_len = seq_len
     
     print(f"Training for {num_epochs} epochs...")
+    loss = train_readout(model, X_train, y_train, num_epochs, learning_rate)
+    print(f"Training complete! Loss {loss:.4f}")
     
-    # Simple training loop (gradient descent would be complex in pure NumPy)
-    # For this demo, we'll use the pre-initialized weights with some adjustments
-    # In production, you'd use PyTorch or TensorFlow
-    
-    # Adjust weights based on data statistics
-    for i in range(min(100, len(X_train))):
-        prediction = model.forward(X_train[i])
-        # Simple weight adjustment (not true backprop, but good enough for demo)
-        
-    print("Training complete!")
-    
-    # Save model
-    model_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(model_dir, "stress_model.json")
     model.save_state_dict(model_path)
     print(f"Model saved to {model_path}")
     
     return model
 
+def grid_configs(grid: Dict = SWEEP_GRID) -> List[Dict]:
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+def random_configs(count: int, grid: Dict = SWEEP_GRID, seed: int = 0) -> List[Dict]:
+    """Random draws from the grid's choices; learning rates log-uniform over the grid's range"""
+    rng = np.random.default_rng(seed)
+    low, high = np.log(min(grid['learning_rate'])), np.log(max(grid['learning_rate']))
+    return [{
+        'model_type': str(rng.choice(grid['model_type'])),
+        'hidden_dim': int(rng.choice(grid['hidden_dim'])),
+        'seq_len': int(rng.choice(grid['seq_len'])),
+        'learning_rate': round(float(np.exp(rng.uniform(low, high))), 4)
+    } for _ in range(count)]
+
+_dataset = None
+
+def _init_worker(dataset_dir: str):
+    """Map the shared dataset once per worker process"""
+    global _dataset
+    _dataset = (np.load(os.path.join(dataset_dir, "X.npy"), mmap_mode="r"),
+                np.load(os.path.join(dataset_dir, "y.npy"), mmap_mode="r"))
+
+def run_trial(trial: Dict) -> Dict:
+    """Train and evaluate one configuration on the shared dataset, saving the model to trial['path']"""
+    from app.ml.calibrate import accuracy_metrics
+    X, y = _dataset
+    split = int(len(y) * (1 - VALIDATION_FRACTION))
+    seq_len = trial['seq_len']
+    
+    np.random.seed(trial['seed'])
+    model = build_model(trial['model_type'], trial['hidden_dim'])
+    model.seq_len = seq_len
+    started = time.perf_counter()
+    # The most recent seq_len frames of each stored sequence
+    loss = train_readout(model, X[:split, -seq_len:], y[:split], trial['num_epochs'], trial['learning_rate'])
+    result = {key: value for key, value in trial.items() if key != 'path'}
+    result['file'] = os.path.basename(trial['path'])
+    result['train_loss'] = round(loss, 5)
+    result['train_seconds'] = round(time.perf_counter() - started, 3)
+    result.update(accuracy_metrics(model.forward_batch(X[split:, -seq_len:]), y[split:]))
+    model.save_state_dict(trial['path'])
+    return result
+
+def sweep(configs: List[Dict], workers: Optional[int] = None, num_samples: int = 4000, num_epochs: int = 200,
+          max_mae: float = 5.0, output_dir: str = SWEEP_DIR, export_path: Optional[str] = MODEL_PATH,
+          seed: int = 0, latency_runs: int = 100, progress: Callable[[Dict], None] = None) -> Dict:
+    """
+    Train the configurations in parallel, write the leaderboard and export the
+    fastest model within max_mae; workers=0 trains in-process. Returns the leaderboard.
+    """
+    from app.ml.calibrate import frame_latency_ms
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(output_dir, "trial_*.json")):
+        os.remove(stale)
+    
+    trials = [dict(config, trial=i, seed=seed + i, num_epochs=num_epochs,
+                   path=os.path.join(output_dir, f"trial_{i:03d}.json"))
+              for i, config in enumerate(configs)]
+    results = []
+    started = time.time()
+    with tempfile.TemporaryDirectory() as dataset_dir:
+        np.random.seed(seed)
+        X, y = generate_synthetic_data(num_samples, max(t['seq_len'] for t in trials))
+        np.save(os.path.join(dataset_dir, "X.npy"), X.astype(np.float32))
+        np.save(os.path.join(dataset_dir, "y.npy"), y)
+        del X, y
+        
+        if workers > 0:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(dataset_dir,)) as executor:
+                for future in as_completed([executor.submit(run_trial, trial) for trial in trials]):
+                    results.append(future.result())
+                    if progress:
+                        progress(results[-1])
+        else:
+            _init_worker(dataset_dir)
+            for trial in trials:
+                results.append(run_trial(trial))
+                if progress:
+                    progress(results[-1])
+    
+    # Timed sequentially once training is over, so trials don't compete for cores
+    for result in results:
+        model = load_model_file(os.path.join(output_dir, result['file']))
+        result['frame_latency_ms'] = round(frame_latency_ms(model, result['seq_len'], latency_runs), 4)
+        result['meets_floor'] = result['mae'] <= max_mae
+    results.sort(key=lambda result: result['mae'])
+    eligible = [result for result in results if result['meets_floor']]
+    chosen = min(eligible, key=lambda result: result['frame_latency_ms']) if eligible else None
+    
+    leaderboard = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'elapsed': round(time.time() - started, 1),
+        'num_samples': num_samples,
+        'validation_fraction': VALIDATION_FRACTION,
+        'max_mae': max_mae,
+        'chosen': chosen['trial'] if chosen else None,
+        'exported_to': export_path if chosen and export_path else None,
+        'trials': results
+    }
+    with open(os.path.join(output_dir, "leaderboard.json"), 'w') as f:
+        json.dump(leaderboard, f, indent=2)
+    if chosen and export_path:
+        shutil.copyfile(os.path.join(output_dir, chosen['file']), export_path)
+    return leaderboard
+
+def _print_trial(result: Dict):
+    print(f"trial {result['trial']:>3} {result['model_type']:<5} h={result['hidden_dim']:<3} "
+          f"seq={result['seq_len']:<3} lr={result['learning_rate']:<7} MAE {result['mae']:.2f}")
+
+def print_leaderboard(leaderboard: Dict, top: int = 10):
+    print(f"{'trial':>5} {'model':<6} {'hidden':>6} {'seq':>4} {'lr':>7} {'MAE':>6} {'level':>6} {'ms/frame':>9}")
+    for result in leaderboard['trials'][:top]:
+        print(f"{result['trial']:>5} {result['model_type']:<6} {result['hidden_dim']:>6} {result['seq_len']:>4} "
+              f"{result['learning_rate']:>7} {result['mae']:>6.2f} {result['level_accuracy']:>6.3f} "
+              f"{result['frame_latency_ms']:>9.4f}")
+
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train a stress model, or sweep hyperparameters")
+    parser.add_argument("--sweep", action="store_true", help="Run a hyperparameter sweep instead of one training run")
+    parser.add_argument("--random", type=int, default=0, help="Sweep N random configurations instead of the full grid")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = train in-process)")
+    parser.add_argument("--samples", type=int, default=None, help="Synthetic sequences to generate")
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--learning-rate", type=float, default=1.0)
+    parser.add_argument("--model-type", choices=list(MODEL_TYPES), default="lstm")
+    parser.add_argument("--hidden-dim", type=int, default=32)
+    parser.add_argument("--seq-len", type=int, default=30)
+    parser.add_argument("--max-mae", type=float, default=5.0, help="Accuracy floor for the exported model")
+    parser.add_argument("--output-dir", default=SWEEP_DIR, help="Where trial models and leaderboard.json go")
+    parser.add_argument("--export", default=MODEL_PATH, help="Where the chosen model is copied")
+    parser.add_argument("--no-export", action="store_true", help="Only write the leaderboard")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    if not args.sweep:
+        np.random.seed(args.seed)
+        train_model(args.epochs, args.learning_rate, args.model_type, args.hidden_dim, args.seq_len,
+                    args.samples or 1000, args.export)
+    else:
+        configs = random_configs(args.random, seed=args.seed) if args.random else grid_configs()
+        print(f"Sweeping {len(configs)} configurations...")
+        leaderboard = sweep(configs, args.workers, args.samples or 4000, args.epochs, args.max_mae,
+                            args.output_dir, None if args.no_export else args.export, args.seed,
+                            progress=_print_trial)
+        print_leaderboard(leaderboard)
+        print(f"Leaderboard written to {os.path.join(args.output_dir, 'leaderboard.json')}")
+        if leaderboard['exported_to']:
+            print(f"Trial {leaderboard['chosen']} exported to {leaderboard['exported_to']}; "
+                  "re-run app.ml.calibrate to refresh its calibration report entry")
+        elif leaderboard['chosen'] is None:
+            print(f"No trial reached MAE {args.max_mae}; nothing exported")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
+import json
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -18,16 +19,18 @@ class User(Base):
     
     sessions = relationship("GameSession", back_populates="user")
     reports = relationship("StressReport", back_populates="user")
+    stats = relationship("UserStressStats", back_populates="user", uselist=False)
 
 class GameSession(Base):
     __tablename__ = "game_sessions"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     started_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime)
     games_played = Column(Integer, default=0)
     baseline_stress = Column(Float)  # Initial stress level
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # HTTP cache validator
     
     user = relationship("User", back_populates="sessions")
     game_data = relationship("GameData", back_populates="session")
@@ -37,7 +40,7 @@ class GameData(Base):
     __tablename__ = "game_data"
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("game_sessions.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("game_sessions.id"), nullable=False, index=True)
     game_name = Column(String, nullable=False)
     game_number = Column(Integer)  # 1-4 in the session
     score = Column(Float)
@@ -51,8 +54,26 @@ class GameData(Base):
     
     session = relationship("GameSession", back_populates="game_data")
 
+class RecommendationCatalogEntry(Base):
+    __tablename__ = "recommendation_catalog"
+    __table_args__ = (
+        Index("ix_recommendation_catalog_key", "version", "category", "stress_tier", "profile", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    version = Column(Integer, nullable=False)
+    category = Column(String, nullable=False)  # activities, workouts, meditation, food_control, medical_checkup
+    stress_tier = Column(String, nullable=False)  # low, elevated, high
+    profile = Column(String, nullable=False)
+    items = Column(Text, nullable=False)  # JSON array of recommendation strings
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class StressReport(Base):
     __tablename__ = "stress_reports"
+    __table_args__ = (
+        # One report per session; regeneration updates it in place
+        Index("ix_stress_reports_session_id", "session_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -60,13 +81,166 @@ class StressReport(Base):
     overall_stress = Column(Float)
     stress_level = Column(String)  # Low, Medium, High
     stress_trend = Column(String)  # Increasing, Stable, Decreasing
-    recommendations = Column(Text)  # JSON with detailed recommendations
-    activities = Column(Text)
-    workouts = Column(Text)
-    meditation = Column(Text)
-    food_control = Column(Text)
-    medical_checkup = Column(Text)
+    input_fingerprint = Column(String)  # Hash of the session inputs the report was computed from
+    # Recommendations reference catalog entries; the text columns only hold
+    # data for reports generated before the catalog existed.
+    activities_id = Column(Integer, ForeignKey("recommendation_catalog.id"))
+    workouts_id = Column(Integer, ForeignKey("recommendation_catalog.id"))
+    meditation_id = Column(Integer, ForeignKey("recommendation_catalog.id"))
+    food_control_id = Column(Integer, ForeignKey("recommendation_catalog.id"))
+    medical_checkup_id = Column(Integer, ForeignKey("recommendation_catalog.id"))
+    legacy_recommendations = Column("recommendations", Text)
+    legacy_activities = Column("activities", Text)
+    legacy_workouts = Column("workouts", Text)
+    legacy_meditation = Column("meditation", Text)
+    legacy_food_control = Column("food_control", Text)
+    legacy_medical_checkup = Column("medical_checkup", Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # HTTP cache validator
     
     user = relationship("User", back_populates="reports")
     session = relationship("GameSession", back_populates="report")
+    activities_entry = relationship("RecommendationCatalogEntry", foreign_keys=[activities_id])
+    workouts_entry = relationship("RecommendationCatalogEntry", foreign_keys=[workouts_id])
+    meditation_entry = relationship("RecommendationCatalogEntry", foreign_keys=[meditation_id])
+    food_control_entry = relationship("RecommendationCatalogEntry", foreign_keys=[food_control_id])
+    medical_checkup_entry = relationship("RecommendationCatalogEntry", foreign_keys=[medical_checkup_id])
+    
+    def _catalog_items(self, category: str) -> str:
+        """JSON text for a category, resolved through the in-memory catalog when possible"""
+        from app.services.recommendation_catalog import recommendation_catalog
+        
+        entry_id = getattr(self, f"{category}_id")
+        if entry_id is None:
+            return getattr(self, f"legacy_{category}")
+        items = recommendation_catalog.items_json(entry_id)
+        if items is None:
+            items = getattr(self, f"{category}_entry").items
+            recommendation_catalog.remember(entry_id, items)
+        return items
+    
+    @property
+    def activities(self) -> str:
+        return self._catalog_items("activities")
+    
+    @property
+    def workouts(self) -> str:
+        return self._catalog_items("workouts")
+    
+    @property
+    def meditation(self) -> str:
+        return self._catalog_items("meditation")
+    
+    @property
+    def food_control(self) -> str:
+        return self._catalog_items("food_control")
+    
+    @property
+    def medical_checkup(self) -> str:
+        return self._catalog_items("medical_checkup")
+    
+    @property
+    def recommendations(self) -> str:
+        """Full recommendation JSON in the shape generate_recommendations returns"""
+        if self.legacy_recommendations is not None:
+            return self.legacy_recommendations
+        return json.dumps({
+            'overall_stress': self.overall_stress,
+            'stress_level': self.stress_level,
+            'stress_trend': self.stress_trend,
+            'activities': self.activities,
+            'workouts': self.workouts,
+            'meditation': self.meditation,
+            'food_control': self.food_control,
+            'medical_checkup': self.medical_checkup
+        })
+
+class UserStressStats(Base):
+    __tablename__ = "user_stress_stats"
+    
+    # One row per user, updated incrementally as games and reports are saved
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    games_count = Column(Integer, default=0)
+    ewma_stress = Column(Float)  # Long-run exponentially weighted mean of game stress
+    ewma_recent = Column(Float)  # Faster-moving mean, compared with ewma_stress for the trend
+    trend = Column(String)  # Increasing, Stable, Decreasing
+    reports_count = Column(Integer, default=0)
+    low_count = Column(Integer, default=0)
+    medium_count = Column(Integer, default=0)
+    high_count = Column(Integer, default=0)
+    current_streak = Column(Integer, default=0)  # Consecutive days with at least one game
+    longest_streak = Column(Integer, default=0)
+    last_played_on = Column(Date)
+    best_session_id = Column(Integer)
+    best_session_stress = Column(Float)
+    worst_session_id = Column(Integer)
+    worst_session_stress = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    user = relationship("User", back_populates="stats")
+
+class StressRollup(Base):
+    __tablename__ = "stress_rollups"
+    __table_args__ = (
+        Index("ix_stress_rollups_key", "dimension", "cohort", "game_name", "day", unique=True),
+    )
+    
+    # Aggregated game stress per (cohort, game, day); maintained by analytics_service
+    id = Column(Integer, primary_key=True, index=True)
+    dimension = Column(String, nullable=False)  # work_type or working_hours
+    cohort = Column(String, nullable=False)  # e.g. "Software" or "8-10h"
+    game_name = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    games_count = Column(Integer, default=0)
+    stress_sum = Column(Float, default=0.0)
+    stress_sq_sum = Column(Float, default=0.0)
+    stress_min = Column(Float)
+    stress_max = Column(Float)
+    score_sum = Column(Float, default=0.0)
+    duration_sum = Column(Float, default=0.0)
+    # Game count per 10-point avg_stress bucket (0-10, 10-20, ..., 90-100)
+    bucket_0 = Column(Integer, default=0)
+    bucket_1 = Column(Integer, default=0)
+    bucket_2 = Column(Integer, default=0)
+    bucket_3 = Column(Integer, default=0)
+    bucket_4 = Column(Integer, default=0)
+    bucket_5 = Column(Integer, default=0)
+    bucket_6 = Column(Integer, default=0)
+    bucket_7 = Column(Integer, default=0)
+    bucket_8 = Column(Integer, default=0)
+    bucket_9 = Column(Integer, default=0)
+
+class GameStressHistogram(Base):
+    __tablename__ = "game_stress_histograms"
+    __table_args__ = (
+        Index("ix_game_stress_histograms_node", "game_name", "node", unique=True),
+    )
+    
+    # One Fenwick tree node of a game's avg_stress histogram; maintained by percentile_service
+    id = Column(Integer, primary_key=True, index=True)
+    game_name = Column(String, nullable=False)
+    node = Column(Integer, nullable=False)  # 1-based Fenwick index
+    count = Column(Integer, default=0)
+
+class FeatureSketch(Base):
+    __tablename__ = "feature_sketches"
+    __table_args__ = (
+        Index("ix_feature_sketches_key", "worker", "period_start", "feature", unique=True),
+        Index("ix_feature_sketches_period", "period_start"),
+    )
+    
+    # One worker's sketch of one model input feature over one period; written by feature_monitor
+    id = Column(Integer, primary_key=True, index=True)
+    worker = Column(String, nullable=False)  # host:pid:start time
+    period_start = Column(DateTime, nullable=False)
+    feature = Column(String, nullable=False)  # e.g. "brow_tension"
+    count = Column(Integer, default=0)  # finite values seen
+    mean = Column(Float, default=0.0)
+    m2 = Column(Float, default=0.0)  # sum of squared deviations from the mean (Welford)
+    min_value = Column(Float)
+    max_value = Column(Float)
+    below_range = Column(Integer, default=0)
+    above_range = Column(Integer, default=0)
+    invalid = Column(Integer, default=0)  # NaN or infinite
+    bins = Column(Text)  # JSON counts of in-range values per equal-width bin
+    updated_at = Column(DateTime, default=datetime.utcnow)
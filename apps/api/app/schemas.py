@@ -1,6 +1,8 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime
+import json
+import math
 
 class UserCreate(BaseModel):
     email: EmailStr
@@ -11,6 +13,13 @@ class UserCreate(BaseModel):
     mobile_usage: Optional[float] = None
     health_info: Optional[str] = None
 
+class UserUpdate(BaseModel):
+    name: Optional[str] = None
+    work_type: Optional[str] = None
+    working_hours: Optional[float] = None
+    mobile_usage: Optional[float] = None
+    health_info: Optional[str] = None
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -45,6 +54,72 @@ class GameDataCreate(BaseModel):
     avg_stress: float
     max_stress: float
     min_stress: float
+    
+    @field_validator("stress_scores")
+    @classmethod
+    def stress_scores_is_array(cls, value: str) -> str:
+        # Stored as-is and spliced into responses unparsed, so it must be a JSON array of numbers
+        try:
+            scores = json.loads(value)
+        except ValueError:
+            raise ValueError("stress_scores must be a JSON array")
+        if not isinstance(scores, list) or not all(
+            s is None or (isinstance(s, (int, float)) and not isinstance(s, bool) and math.isfinite(s)) for s in scores
+        ):
+            raise ValueError("stress_scores must be a JSON array of finite numbers")
+        return value
+
+class SessionInfo(BaseModel):
+    id: int
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    games_played: Optional[int]
+    baseline_stress: Optional[float]
+
+class GameSummary(BaseModel):
+    game_name: Optional[str]
+    game_number: Optional[int]
+    score: Optional[float]
+    duration: Optional[float]
+    avg_stress: Optional[float]
+    max_stress: Optional[float]
+    min_stress: Optional[float]
+    stress_percentile: Optional[float] = None
+
+class GameDetail(GameSummary):
+    stress_scores: List[Optional[float]] = []
+
+class SessionDataResponse(BaseModel):
+    session: SessionInfo
+    games: List[GameDetail]
+
+class SessionDetailsResponse(BaseModel):
+    id: int
+    user_id: int
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    games_played: Optional[int]
+    baseline_stress: Optional[float]
+    games: List[GameSummary]
+
+class SessionHistoryItem(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    games_count: Optional[int]
+    avg_stress: float
+
+class ReportSummary(BaseModel):
+    id: int
+    session_id: int
+    overall_stress: Optional[float]
+    stress_level: Optional[str]
+    created_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
+
+class UserReportsResponse(BaseModel):
+    reports: List[ReportSummary]
 
 class StressReportResponse(BaseModel):
     id: int
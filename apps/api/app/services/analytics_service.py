@@ -0,0 +1,124 @@
+import math
+from datetime import datetime, date
+from typing import Dict, List, Optional
+from sqlalchemy import case, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import models
+
+DIMENSIONS = ("work_type", "working_hours")
+HISTOGRAM_BUCKETS = 10
+UNKNOWN_COHORT = "unknown"
+# Upper bound (exclusive) and label of each working-hours cohort
+WORKING_HOURS_COHORTS = [(6, "<6h"), (8, "6-8h"), (10, "8-10h"), (12, "10-12h"), (float("inf"), "12h+")]
+
+BUCKET_COLUMNS = [f"bucket_{i}" for i in range(HISTOGRAM_BUCKETS)]
+
+def working_hours_cohort(working_hours: Optional[float]) -> str:
+    if working_hours is None:
+        return UNKNOWN_COHORT
+    for upper, label in WORKING_HOURS_COHORTS:
+        if working_hours < upper:
+            return label
+    return UNKNOWN_COHORT
+
+def cohorts_for(work_type: Optional[str], working_hours: Optional[float]) -> Dict[str, str]:
+    """The cohort a user falls in for each dimension"""
+    return {
+        "work_type": work_type or UNKNOWN_COHORT,
+        "working_hours": working_hours_cohort(working_hours)
+    }
+
+def stress_bucket(avg_stress: float) -> int:
+    return min(HISTOGRAM_BUCKETS - 1, max(0, int(avg_stress // 10)))
+
+class AnalyticsService:
+    """Maintains and queries the per-(cohort, game, day) stress rollups"""
+    
+    def record_game(self, db: Session, user: models.User, game_name: str, avg_stress: Optional[float],
+                    score: Optional[float], duration: Optional[float], played_at: datetime):
+        """Add a newly saved game to its cohorts' rollups (caller commits)"""
+        if avg_stress is None:
+            return
+        for dimension, cohort in cohorts_for(user.work_type, user.working_hours).items():
+            self._increment(db, dimension, cohort, game_name, played_at.date(),
+                            avg_stress, score or 0.0, duration or 0.0)
+    
+    def _increment(self, db: Session, dimension: str, cohort: str, game_name: str, day: date,
+                   avg_stress: float, score: float, duration: float):
+        R = models.StressRollup
+        bucket = BUCKET_COLUMNS[stress_bucket(avg_stress)]
+        # A single UPDATE so concurrent saves add up instead of overwriting each other
+        statement = update(R).where(
+            R.dimension == dimension, R.cohort == cohort, R.game_name == game_name, R.day == day
+        ).values({
+            R.games_count: R.games_count + 1,
+            R.stress_sum: R.stress_sum + avg_stress,
+            R.stress_sq_sum: R.stress_sq_sum + avg_stress * avg_stress,
+            R.stress_min: case((R.stress_min.is_(None), avg_stress), (R.stress_min > avg_stress, avg_stress),
+                               else_=R.stress_min),
+            R.stress_max: case((R.stress_max.is_(None), avg_stress), (R.stress_max < avg_stress, avg_stress),
+                               else_=R.stress_max),
+            R.score_sum: R.score_sum + score,
+            R.duration_sum: R.duration_sum + duration,
+            getattr(R, bucket): getattr(R, bucket) + 1
+        }).execution_options(synchronize_session=False)
+        if db.execute(statement).rowcount:
+            return
+        try:
+            with db.begin_nested():
+                db.add(R(
+                    dimension=dimension, cohort=cohort, game_name=game_name, day=day,
+                    games_count=1, stress_sum=avg_stress, stress_sq_sum=avg_stress * avg_stress,
+                    stress_min=avg_stress, stress_max=avg_stress, score_sum=score, duration_sum=duration,
+                    **{column: int(column == bucket) for column in BUCKET_COLUMNS}
+                ))
+        except IntegrityError:
+            # Another request created the row first
+            db.execute(statement)
+    
+    def summarize(self, db: Session, dimension: str, group_by: str, cohort: Optional[str] = None,
+                  game_name: Optional[str] = None, start_date: Optional[date] = None,
+                  end_date: Optional[date] = None) -> List[Dict]:
+        """Aggregate the rollups by cohort, game_name or day"""
+        R = models.StressRollup
+        group_column = {"cohort": R.cohort, "game_name": R.game_name, "day": R.day}[group_by]
+        query = db.query(
+            group_column,
+            func.sum(R.games_count),
+            func.sum(R.stress_sum),
+            func.sum(R.stress_sq_sum),
+            func.min(R.stress_min),
+            func.max(R.stress_max),
+            func.sum(R.score_sum),
+            func.sum(R.duration_sum),
+            *[func.sum(getattr(R, column)) for column in BUCKET_COLUMNS]
+        ).filter(R.dimension == dimension)
+        if cohort is not None:
+            query = query.filter(R.cohort == cohort)
+        if game_name is not None:
+            query = query.filter(R.game_name == game_name)
+        if start_date is not None:
+            query = query.filter(R.day >= start_date)
+        if end_date is not None:
+            query = query.filter(R.day <= end_date)
+        
+        groups = []
+        for key, count, stress_sum, sq_sum, low, high, score_sum, duration_sum, *buckets in \
+                query.group_by(group_column).order_by(group_column):
+            mean = stress_sum / count if count else None
+            groups.append({
+                group_by: key,
+                "games_count": count,
+                "avg_stress": mean,
+                "stddev_stress": math.sqrt(max(0.0, sq_sum / count - mean * mean)) if count else None,
+                "min_stress": low,
+                "max_stress": high,
+                "avg_score": score_sum / count if count else None,
+                "avg_duration": duration_sum / count if count else None,
+                "histogram": buckets
+            })
+        return groups
+
+# Global instance
+analytics_service = AnalyticsService()
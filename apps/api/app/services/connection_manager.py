@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+from typing import Optional
+from app.core.security import decode_access_token
+from app.core.metrics import ws_frames, ws_rejections, ws_active_connections
+
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "200"))
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "3"))
+# Clients without a token are keyed by address, which a whole NAT or proxy may share
+WS_MAX_CONNECTIONS_PER_IP = int(os.getenv("WS_MAX_CONNECTIONS_PER_IP", "50"))
+WS_FRAME_RATE = float(os.getenv("WS_FRAME_RATE", "30"))  # sustained frames per second
+WS_FRAME_BURST = float(os.getenv("WS_FRAME_BURST", "60"))
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "16"))
+# Frames dropped within one window before the connection is closed
+WS_MAX_DROPS_PER_WINDOW = int(os.getenv("WS_MAX_DROPS_PER_WINDOW", "300"))
+WS_DROP_WINDOW_SECONDS = 10.0
+
+# WebSocket close codes
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class ConnectionBudget:
+    """Per-connection rate limit and bounded inbound queue"""
+    
+    def __init__(self, client_key: str):
+        self.client_key = client_key
+        self.bucket = TokenBucket(WS_FRAME_RATE, WS_FRAME_BURST)
+        self.queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.dropped = 0
+        self.close_code = None
+        self.close_reason = None
+        self._window_started = time.monotonic()
+        self._window_drops = 0
+    
+    def offer(self, frame) -> bool:
+        """Queue a frame if the budget allows; returns False once the client should be closed"""
+        if not self.bucket.allow():
+            ws_frames.labels("rate_limited").inc()
+            return self._drop("frame rate limit exceeded")
+        if self.queue.full():
+            # Keep the freshest frames: the oldest queued one is the least useful
+            self.queue.get_nowait()
+            ws_frames.labels("queue_overflow").inc()
+            self._drop("inbound queue full")
+        ws_frames.labels("accepted").inc()
+        self.queue.put_nowait(frame)
+        return self.close_code is None
+    
+    def _drop(self, reason: str) -> bool:
+        self.dropped += 1
+        now = time.monotonic()
+        if now - self._window_started > WS_DROP_WINDOW_SECONDS:
+            self._window_started = now
+            self._window_drops = 0
+        self._window_drops += 1
+        if self._window_drops > WS_MAX_DROPS_PER_WINDOW:
+            ws_rejections.labels(str(CLOSE_POLICY_VIOLATION)).inc()
+            self.close_code = CLOSE_POLICY_VIOLATION
+            self.close_reason = reason
+            return False
+        return True
+
+
+class ConnectionManager:
+    """Admission control for /ws/analysis, per worker process"""
+    
+    def __init__(self, max_connections: int = WS_MAX_CONNECTIONS,
+                 max_per_user: int = WS_MAX_CONNECTIONS_PER_USER,
+                 max_per_ip: int = WS_MAX_CONNECTIONS_PER_IP):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.max_per_ip = max_per_ip
+        self.active = 0
+        self._per_client = {}
+    
+    def client_key(self, host: Optional[str], token: Optional[str] = None) -> str:
+        """
+        Identify the caller by verified token, else remote address.
+        The ?user_id= query parameter is unauthenticated, so it is never used here.
+        """
+        if token:
+            payload = decode_access_token(token)
+            if payload and payload.get("user_id") is not None:
+                return f"user:{payload['user_id']}"
+        return f"ip:{host or 'unknown'}"
+    
+    def _limit(self, client_key: str) -> int:
+        return self.max_per_ip if client_key.startswith("ip:") else self.max_per_user
+    
+    def admit(self, client_key: str) -> Optional[ConnectionBudget]:
+        """Reserve a slot for the client; None if a limit is reached"""
+        if self.active >= self.max_connections or self._per_client.get(client_key, 0) >= self._limit(client_key):
+            ws_rejections.labels(str(CLOSE_TRY_AGAIN_LATER)).inc()
+            return None
+        self.active += 1
+        self._per_client[client_key] = self._per_client.get(client_key, 0) + 1
+        return ConnectionBudget(client_key)
+    
+    def rejection_reason(self, client_key: str) -> str:
+        if self.active >= self.max_connections:
+            return "server at connection capacity"
+        if client_key.startswith("ip:"):
+            return "too many connections from this address"
+        return "too many connections for this user"
+    
+    def release(self, budget: ConnectionBudget):
+        self.active -= 1
+        remaining = self._per_client.get(budget.client_key, 1) - 1
+        if remaining > 0:
+            self._per_client[budget.client_key] = remaining
+        else:
+            self._per_client.pop(budget.client_key, None)
+
+# Global instance
+connection_manager = ConnectionManager()
+ws_active_connections.set_function(lambda: connection_manager.active)
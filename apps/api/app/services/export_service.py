@@ -0,0 +1,131 @@
+import os
+import io
+import csv
+import json
+import zlib
+from typing import Callable, Dict, Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from app.core.database import SessionLocal
+from app.core import payloads
+from app import models
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# One row per game (NDJSON) or per frame score (CSV)
+GAME_FIELDS = [
+    'user_id', 'session_id', 'session_started_at', 'session_completed_at', 'baseline_stress',
+    'game_id', 'game_name', 'game_number', 'score', 'duration',
+    'avg_stress', 'max_stress', 'min_stress', 'completed_at'
+]
+CSV_FIELDS = GAME_FIELDS + ['frame', 'stress_score']
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class ExportService:
+    """Streams session/game/frame data for research exports"""
+    
+    def game_query(self) -> Select:
+        """Every exported column, for endpoints to add their filters to"""
+        return select(
+            models.GameSession.user_id,
+            models.GameSession.id.label('session_id'),
+            models.GameSession.started_at.label('session_started_at'),
+            models.GameSession.completed_at.label('session_completed_at'),
+            models.GameSession.baseline_stress,
+            models.GameData.id.label('game_id'),
+            models.GameData.game_name,
+            models.GameData.game_number,
+            models.GameData.score,
+            models.GameData.duration,
+            models.GameData.avg_stress,
+            models.GameData.max_stress,
+            models.GameData.min_stress,
+            models.GameData.completed_at,
+            models.GameData.stress_scores
+        ).join(models.GameSession, models.GameSession.id == models.GameData.session_id)
+    
+    def iter_pages(self, query: Select, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[list]:
+        """
+        Yield the query's rows a page at a time in game id order. Each page is a
+        short streamed read (a server-side cursor where the driver supports it)
+        that finishes before the page is handed on, so a slow client never keeps
+        a read open against writers. Opens its own session, since streaming
+        outlives the request's.
+        """
+        db = SessionLocal()
+        try:
+            last_game_id = 0
+            while True:
+                result = db.execute(
+                    query.where(models.GameData.id > last_game_id)
+                    .order_by(models.GameData.id)
+                    .limit(page_size)
+                    .execution_options(stream_results=True, yield_per=page_size)
+                )
+                page = result.all()
+                db.rollback()
+                if not page:
+                    return
+                last_game_id = page[-1].game_id
+                yield page
+        finally:
+            db.close()
+    
+    def _game_record(self, row) -> Dict:
+        record = {field: getattr(row, field) for field in GAME_FIELDS}
+        for field in ('session_started_at', 'session_completed_at', 'completed_at'):
+            record[field] = _isoformat(record[field])
+        return record
+    
+    def _scores(self, row) -> list:
+        return payloads.load_scores(row.stress_scores)
+    
+    def ndjson(self, pages: Iterator[list]) -> Iterator[bytes]:
+        """One JSON object per game, with its per-frame scores"""
+        for page in pages:
+            lines = []
+            for row in page:
+                record = self._game_record(row)
+                record['stress_scores'] = self._scores(row)
+                lines.append(json.dumps(record))
+            yield ("\n".join(lines) + "\n").encode()
+    
+    def csv(self, pages: Iterator[list]) -> Iterator[bytes]:
+        """One CSV row per frame score; games without scores get a single row"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_FIELDS)
+        for page in pages:
+            for row in page:
+                values = list(self._game_record(row).values())
+                scores = self._scores(row)
+                if not scores:
+                    writer.writerow(values + [None, None])
+                for frame, score in enumerate(scores):
+                    writer.writerow(values + [frame, score])
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    def gzip(self, chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+        """Compress a byte stream incrementally into a .gz file"""
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    def stream(self, query: Select, fmt: str, compress: bool = False) -> Iterator[bytes]:
+        encode: Callable = self.ndjson if fmt == 'ndjson' else self.csv
+        chunks = encode(self.iter_pages(query))
+        return self.gzip(chunks) if compress else chunks
+
+# Global instance
+export_service = ExportService()
@@ -0,0 +1,377 @@
+"""
+Streaming sketches of the model's input features, for drift monitoring.
+
+Every frame's extracted features (see app.ml.model.extract_features) are
+appended to a buffer. Every FOLD_EVERY frames the buffer is folded, in one
+vectorized pass, into this worker's sketch of each feature:
+- count, mean and M2 (Welford/Chan)
+- min and max
+- an equal-width histogram over the expected 0-1 range, used for quantiles
+- counters of values below or above that range, and of NaN/infinite values
+Every sketch field merges exactly across workers.
+
+A background thread writes this worker's sketch for the current period to
+FeatureSketch rows every DRIFT_FLUSH_SECONDS; each worker owns its rows, so
+flushes never contend. drift_report() merges every worker's rows in a time
+window and compares them with the same sketch of generate_synthetic_data,
+the data the model is trained on. It alerts when a feature leaves its range
+or its distribution shifts (population stability index).
+"""
+import os
+import json
+import time
+import socket
+import threading
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.metrics import input_drift_alerts
+from app.ml.train import FEATURE_NAMES, generate_synthetic_data
+from app import models
+
+DRIFT_FLUSH_SECONDS = float(os.getenv("DRIFT_FLUSH_SECONDS", "60"))
+DRIFT_PERIOD_MINUTES = int(os.getenv("DRIFT_PERIOD_MINUTES", "60"))
+DRIFT_RETENTION_HOURS = int(os.getenv("DRIFT_RETENTION_HOURS", "168"))
+# Window the flush thread checks for alerts
+DRIFT_WINDOW_HOURS = int(os.getenv("DRIFT_WINDOW_HOURS", "1"))
+# Alert thresholds; PSI above 0.25 is the usual "significant shift"
+DRIFT_PSI_THRESHOLD = float(os.getenv("DRIFT_PSI_THRESHOLD", "0.25"))
+DRIFT_OUT_OF_RANGE_RATE = float(os.getenv("DRIFT_OUT_OF_RANGE_RATE", "0.01"))
+DRIFT_MIN_FRAMES = int(os.getenv("DRIFT_MIN_FRAMES", "500"))
+
+FEATURE_RANGE = (0.0, 1.0)
+SKETCH_BINS = 50
+# PSI is computed over groups of this many sketch bins, plus the out-of-range counts
+PSI_BIN_GROUP = 5
+FOLD_EVERY = 256
+QUANTILES = (0.05, 0.5, 0.95)
+REFERENCE_SAMPLES = 2000
+
+class FeatureSketches:
+    """Mergeable sketches of every input feature, as parallel arrays"""
+    
+    def __init__(self, features: int = len(FEATURE_NAMES), bins: int = SKETCH_BINS):
+        self.count = np.zeros(features)
+        self.mean = np.zeros(features)
+        self.m2 = np.zeros(features)
+        self.min = np.full(features, np.inf)
+        self.max = np.full(features, -np.inf)
+        self.below = np.zeros(features)
+        self.above = np.zeros(features)
+        self.invalid = np.zeros(features)
+        self.bins = np.zeros((features, bins))
+    
+    def add(self, rows) -> "FeatureSketches":
+        """Fold a (frames, features) array of values in"""
+        rows = np.asarray(rows, dtype=float)
+        if not len(rows):
+            return self
+        finite = np.isfinite(rows)
+        values = np.where(finite, rows, 0.0)
+        count = finite.sum(axis=0)
+        mean = values.sum(axis=0) / np.maximum(count, 1)
+        m2 = (np.where(finite, rows - mean, 0.0) ** 2).sum(axis=0)
+        
+        low, high = FEATURE_RANGE
+        below = finite & (values < low)
+        above = finite & (values > high)
+        in_range = finite & ~below & ~above
+        bin_count = self.bins.shape[1]
+        index = np.minimum(((np.clip(values, low, high) - low) / (high - low) * bin_count).astype(int), bin_count - 1)
+        flat = (np.arange(rows.shape[1]) * bin_count + index)[in_range]
+        bins = np.bincount(flat, minlength=self.bins.size).reshape(self.bins.shape)
+        
+        self._merge(slice(None), count, mean, m2,
+                    np.where(finite, rows, np.inf).min(axis=0), np.where(finite, rows, -np.inf).max(axis=0),
+                    below.sum(axis=0), above.sum(axis=0), (~finite).sum(axis=0), bins)
+        return self
+    
+    def _merge(self, index, count, mean, m2, minimum, maximum, below, above, invalid, bins):
+        # Chan et al.'s pairwise update of the mean and M2
+        total = self.count[index] + count
+        delta = mean - self.mean[index]
+        weight = count / np.maximum(total, 1)
+        self.m2[index] = self.m2[index] + m2 + delta ** 2 * self.count[index] * weight
+        self.mean[index] = self.mean[index] + delta * weight
+        self.count[index] = total
+        self.min[index] = np.fmin(self.min[index], minimum)
+        self.max[index] = np.fmax(self.max[index], maximum)
+        self.below[index] += below
+        self.above[index] += above
+        self.invalid[index] += invalid
+        self.bins[index] += bins
+    
+    def merge_row(self, row: models.FeatureSketch):
+        """Merge a stored sketch of one feature in"""
+        if row.feature not in FEATURE_NAMES:
+            return
+        self._merge(FEATURE_NAMES.index(row.feature), row.count or 0, row.mean or 0.0, row.m2 or 0.0,
+                    np.inf if row.min_value is None else row.min_value,
+                    -np.inf if row.max_value is None else row.max_value,
+                    row.below_range or 0, row.above_range or 0, row.invalid or 0,
+                    np.asarray(json.loads(row.bins) if row.bins else 0, dtype=float))
+    
+    def copy(self) -> "FeatureSketches":
+        other = FeatureSketches(len(self.count), self.bins.shape[1])
+        for name, value in vars(self).items():
+            setattr(other, name, value.copy())
+        return other
+    
+    def frames(self, i: int) -> int:
+        return int(self.count[i] + self.invalid[i])
+    
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2 / np.maximum(self.count - 1, 1))
+    
+    def quantile(self, i: int, q: float) -> Optional[float]:
+        """Estimate from the histogram, interpolating within a bin; out-of-range values sit at the ends"""
+        counts = np.concatenate([[self.below[i]], self.bins[i], [self.above[i]]])
+        total = counts.sum()
+        if not total:
+            return None
+        low, high = FEATURE_RANGE
+        width = (high - low) / self.bins.shape[1]
+        cumulative = np.cumsum(counts)
+        k = int(np.searchsorted(cumulative, q * total))
+        if k == 0:
+            return round(float(self.min[i]), 4) if self.below[i] else low
+        if k == len(counts) - 1:
+            return round(float(self.max[i]), 4)
+        before = cumulative[k - 1]
+        fraction = (q * total - before) / counts[k] if counts[k] else 0.0
+        return round(float(low + (k - 1 + fraction) * width), 4)
+    
+    def psi_counts(self, i: int) -> np.ndarray:
+        grouped = self.bins[i].reshape(-1, PSI_BIN_GROUP).sum(axis=1)
+        return np.concatenate([[self.below[i] + self.invalid[i]], grouped, [self.above[i]]])
+
+def _as_row(features) -> List[float]:
+    """One frame's features as floats; anything non-numeric becomes NaN and counts as invalid"""
+    row = [float(value) if isinstance(value, (int, float)) else float("nan") for value in list(features)[:len(FEATURE_NAMES)]]
+    return row + [float("nan")] * (len(FEATURE_NAMES) - len(row))
+
+def population_stability_index(live: np.ndarray, reference: np.ndarray, epsilon: float = 1e-4) -> float:
+    p = np.maximum(live / max(live.sum(), 1), epsilon)
+    q = np.maximum(reference / max(reference.sum(), 1), epsilon)
+    return float(np.sum((p - q) * np.log(p / q)))
+
+def period_start(moment: datetime) -> datetime:
+    period = DRIFT_PERIOD_MINUTES * 60
+    seconds = (moment - datetime(1970, 1, 1)).total_seconds()
+    return datetime(1970, 1, 1) + timedelta(seconds=seconds // period * period)
+
+class FeatureMonitor:
+    """Per-worker input feature sketches, flushed to the database in the background"""
+    
+    def __init__(self, flush_interval: float = DRIFT_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{int(time.time())}"
+        self.alerts = []
+        self._pending = []
+        self._sketch = FeatureSketches()
+        self._period = period_start(datetime.utcnow())
+        # Sketches of periods that ended before they were flushed
+        self._finished = []
+        self._dirty = False
+        self._reference = None
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+    
+    def observe(self, features: List[float]):
+        """
+        Record one frame's features; cheap enough to call for every frame.
+        Never raises, so a malformed frame can't break inference.
+        """
+        try:
+            row = _as_row(features)
+        except TypeError:
+            row = [float("nan")] * len(FEATURE_NAMES)
+        try:
+            with self._lock:
+                self._pending.append(row)
+                if len(self._pending) >= FOLD_EVERY:
+                    self._fold()
+                if self._thread is None and not self._closed:
+                    self._thread = threading.Thread(target=self._run, name="feature-monitor-flush", daemon=True)
+                    self._thread.start()
+        except Exception as e:
+            print(f"Feature monitor dropped a frame: {e}")
+    
+    def _fold(self):
+        """Fold buffered frames into the current period's sketch; caller holds _lock"""
+        now = period_start(datetime.utcnow())
+        if now != self._period:
+            if self._dirty:
+                self._finished.append((self._period, self._sketch))
+            self._sketch = FeatureSketches()
+            self._period = now
+        if self._pending:
+            # Cleared first, so a batch that fails to fold is dropped rather than retried forever
+            pending, self._pending = self._pending, []
+            self._sketch.add(pending)
+            self._dirty = True
+    
+    def flush(self):
+        """Write this worker's sketches to the database now"""
+        with self._flush_lock:
+            with self._lock:
+                self._fold()
+                if not self._dirty and not self._finished:
+                    return
+                batch = self._finished + [(self._period, self._sketch.copy())]
+                self._finished = []
+                self._dirty = False
+            db = SessionLocal()
+            try:
+                for period, sketch in batch:
+                    self._write(db, period, sketch)
+                if time.time() - self._last_prune > 3600:
+                    cutoff = datetime.utcnow() - timedelta(hours=DRIFT_RETENTION_HOURS)
+                    db.query(models.FeatureSketch).filter(models.FeatureSketch.period_start < cutoff).delete()
+                    self._last_prune = time.time()
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Feature sketch flush failed, will retry: {e}")
+                with self._lock:
+                    # Ended periods are retried as they were; the current one is rewritten anyway
+                    self._finished = batch[:-1] + self._finished
+                    self._dirty = True
+            finally:
+                db.close()
+    
+    def _write(self, db: Session, period: datetime, sketch: FeatureSketches):
+        rows = {row.feature: row for row in db.query(models.FeatureSketch).filter(
+            models.FeatureSketch.worker == self.worker,
+            models.FeatureSketch.period_start == period
+        )}
+        for i, feature in enumerate(FEATURE_NAMES):
+            row = rows.get(feature)
+            if row is None:
+                row = models.FeatureSketch(worker=self.worker, period_start=period, feature=feature)
+                db.add(row)
+            row.count = int(sketch.count[i])
+            row.mean = float(sketch.mean[i])
+            row.m2 = float(sketch.m2[i])
+            row.min_value = float(sketch.min[i]) if np.isfinite(sketch.min[i]) else None
+            row.max_value = float(sketch.max[i]) if np.isfinite(sketch.max[i]) else None
+            row.below_range = int(sketch.below[i])
+            row.above_range = int(sketch.above[i])
+            row.invalid = int(sketch.invalid[i])
+            row.bins = json.dumps(sketch.bins[i].astype(int).tolist())
+            row.updated_at = datetime.utcnow()
+    
+    def reference(self) -> FeatureSketches:
+        """Sketch of the synthetic training data, generated once with a fixed seed"""
+        if self._reference is None:
+            state = np.random.get_state()
+            try:
+                np.random.seed(0)
+                X, _ = generate_synthetic_data(num_samples=REFERENCE_SAMPLES)
+            finally:
+                np.random.set_state(state)
+            self._reference = FeatureSketches().add(X.reshape(-1, X.shape[-1]))
+        return self._reference
+    
+    def live(self, db: Session, hours: int = DRIFT_WINDOW_HOURS):
+        """Every worker's sketches merged over the periods overlapping the last `hours`"""
+        since = period_start(datetime.utcnow() - timedelta(hours=hours))
+        rows = db.query(models.FeatureSketch).filter(models.FeatureSketch.period_start >= since).all()
+        sketch = FeatureSketches()
+        for row in rows:
+            sketch.merge_row(row)
+        return sketch, since, len({row.worker for row in rows})
+    
+    def drift_report(self, db: Session, hours: int = DRIFT_WINDOW_HOURS) -> Dict:
+        live, since, workers = self.live(db, hours)
+        reference = self.reference()
+        live_std, reference_std = live.std(), reference.std()
+        features, alerts = [], []
+        for i, name in enumerate(FEATURE_NAMES):
+            frames = live.frames(i)
+            out_of_range = live.below[i] + live.above[i] + live.invalid[i]
+            entry = {
+                'feature': name,
+                'frames': frames,
+                'mean': round(float(live.mean[i]), 4) if live.count[i] else None,
+                'std': round(float(live_std[i]), 4) if live.count[i] else None,
+                'min': float(live.min[i]) if np.isfinite(live.min[i]) else None,
+                'max': float(live.max[i]) if np.isfinite(live.max[i]) else None,
+                'quantiles': {f"p{int(q * 100):02d}": live.quantile(i, q) for q in QUANTILES},
+                'below_range': int(live.below[i]),
+                'above_range': int(live.above[i]),
+                'invalid': int(live.invalid[i]),
+                'out_of_range_rate': round(float(out_of_range / frames), 4) if frames else None,
+                'psi': round(population_stability_index(live.psi_counts(i), reference.psi_counts(i)), 4) if frames else None,
+                'mean_shift': round(float((live.mean[i] - reference.mean[i]) / reference_std[i]), 2) if live.count[i] else None,
+                'reference': {
+                    'mean': round(float(reference.mean[i]), 4),
+                    'std': round(float(reference_std[i]), 4),
+                    'quantiles': {f"p{int(q * 100):02d}": reference.quantile(i, q) for q in QUANTILES}
+                }
+            }
+            features.append(entry)
+            if frames < DRIFT_MIN_FRAMES:
+                continue
+            if entry['out_of_range_rate'] > DRIFT_OUT_OF_RANGE_RATE:
+                alerts.append({
+                    'feature': name, 'kind': 'out_of_range', 'value': entry['out_of_range_rate'],
+                    'threshold': DRIFT_OUT_OF_RANGE_RATE,
+                    'message': f"{name}: {entry['out_of_range_rate']:.1%} of frames outside "
+                               f"{FEATURE_RANGE[0]}-{FEATURE_RANGE[1]} (min {entry['min']}, max {entry['max']})"
+                })
+            if entry['psi'] > DRIFT_PSI_THRESHOLD:
+                alerts.append({
+                    'feature': name, 'kind': 'distribution_shift', 'value': entry['psi'],
+                    'threshold': DRIFT_PSI_THRESHOLD,
+                    'message': f"{name}: PSI {entry['psi']:.2f} against the training data "
+                               f"(mean {entry['mean']}, expected {entry['reference']['mean']})"
+                })
+        return {
+            'window_start': since,
+            'workers': workers,
+            'frames': max((entry['frames'] for entry in features), default=0),
+            'features': features,
+            'alerts': alerts
+        }
+    
+    def check(self):
+        """Refresh the alert list from the merged window, logging alerts that are new"""
+        db = SessionLocal()
+        try:
+            alerts = self.drift_report(db)['alerts']
+        finally:
+            db.close()
+        known = {(alert['feature'], alert['kind']) for alert in self.alerts}
+        for alert in alerts:
+            if (alert['feature'], alert['kind']) not in known:
+                print(f"Input drift alert: {alert['message']}")
+        self.alerts = alerts
+    
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            if self._closed:
+                break
+            try:
+                self.flush()
+                self.check()
+            except Exception as e:
+                print(f"Feature monitor check failed: {e}")
+    
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+# Global instance
+feature_monitor = FeatureMonitor()
+input_drift_alerts.set_function(lambda: len(feature_monitor.alerts))
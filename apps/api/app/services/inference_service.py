@@ -1,54 +1,149 @@
 import os
+import time
+import threading
 import numpy as np
-from typing import List, Dict
-from app.ml.model import StressLSTM, extract_features
+from typing import List, Dict, Optional
+from app.ml.model import extract_features, load_model_file
+from app.ml.calibrate import frame_latency_ms, load_report, model_path
+from app.core.metrics import inference_duration
+from app.core.timing import record_phase
+from app.services.session_state import session_store, encode_window, decode_window
+from app.services.feature_monitor import feature_monitor
+
+# When to load the model: "eager" blocks startup until it's loaded, "background"
+# loads it in a thread while /health reports not-ready, "lazy" waits for the first frame
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "eager")
+# Which model to serve: a name from app/ml/calibration_report.json ("gru16",
+# "ema_linear", ...) or "default" for stress_model.json. Without one, a latency
+# budget picks the most accurate calibrated model whose per-frame forward pass,
+# timed on this host at load, fits in it; with neither, stress_model.json is served.
+INFERENCE_MODEL = os.getenv("INFERENCE_MODEL", "")
+INFERENCE_LATENCY_BUDGET_MS = float(os.getenv("INFERENCE_LATENCY_BUDGET_MS", "0"))
+
+def heuristic_scores(features: np.ndarray) -> np.ndarray:
+    """Vectorized InferenceService._heuristic_prediction over rows of features"""
+    blink_rate, eye_openness, jaw_clench, brow_tension, jitter, game_score = np.asarray(features, dtype=float).T
+    stress = (
+        jaw_clench * 30 +
+        (1.0 - eye_openness) * 25 +
+        brow_tension * 20 +
+        blink_rate * 15 +
+        jitter * 10 +
+        (1.0 - game_score) * 10
+    )
+    return np.clip(stress, 0, 100)
 
 class InferenceService:
     """Service for real-time stress inference"""
     
     def __init__(self):
         self.model = None
+        self.model_name = None
         self.use_model = False
-        self.sequence_buffer = []
+        self.ready = False
         self.seq_len = 30
-        self.load_model()
+        self._load_lock = threading.Lock()
+    
+    def ensure_loaded(self, wait: bool = True) -> bool:
+        """
+        Load the model once. With wait=False, return False instead of blocking
+        while another thread is loading it.
+        """
+        if self.ready:
+            return True
+        if not self._load_lock.acquire(blocking=wait):
+            return False
+        try:
+            if not self.ready:
+                self.load_model()
+                self.ready = True
+        finally:
+            self._load_lock.release()
+        return True
+    
+    def warm_up_in_background(self) -> threading.Thread:
+        """Start loading the model without blocking startup"""
+        thread = threading.Thread(target=self.ensure_loaded, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
     
     def load_model(self):
-        """Load the trained LSTM model"""
+        """Load the configured model, or the one chosen for the latency budget"""
         try:
-            self.model = StressLSTM(input_dim=6, hidden_dim=32, output_dim=1)
-            model_dir = os.path.join(os.path.dirname(__file__), '..', 'ml')
-            model_path = os.path.join(model_dir, 'stress_model.json')
+            if INFERENCE_MODEL:
+                name = INFERENCE_MODEL
+            elif INFERENCE_LATENCY_BUDGET_MS > 0:
+                name = self._model_within_budget(INFERENCE_LATENCY_BUDGET_MS)
+                if name is None:
+                    print(f"No model fits a {INFERENCE_LATENCY_BUDGET_MS} ms budget, using heuristic fallback")
+                    self.use_model = False
+                    return
+            else:
+                name = "default"
+            path = model_path(name)
             
-            if os.path.exists(model_path):
-                print(f"Loading model from {model_path}")
-                self.model.load_state_dict(model_path)
+            if os.path.exists(path):
+                print(f"Loading model {name} from {path}")
+                self.model = load_model_file(path)
+                self.model_name = name
+                self.seq_len = self.model.seq_len or self.seq_len
                 self.use_model = True
                 print("Model loaded successfully!")
             else:
-                print(f"Model file not found at {model_path}, using heuristic fallback")
+                print(f"Model file not found at {path}, using heuristic fallback")
                 self.use_model = False
         except Exception as e:
             print(f"Error loading model: {e}")
             self.use_model = False
     
-    def predict(self, face_data: Dict) -> Dict:
+    def _model_within_budget(self, budget_ms: float) -> Optional[str]:
+        """
+        The most accurate calibrated model whose per-frame latency on this host
+        fits the budget. Report latencies come from the calibration host, so
+        candidates are re-timed here, best first, until one fits.
+        """
+        report = load_report()
+        if report is None:
+            print("No calibration report (run python -m app.ml.calibrate), serving the default model")
+            return "default"
+        for row in report['models']:
+            path = model_path(row['name'])
+            if not os.path.exists(path):
+                continue
+            model = load_model_file(path)
+            latency = frame_latency_ms(model, model.seq_len or self.seq_len, runs=50)
+            print(f"Model {row['name']}: MAE {row['mae']}, {latency:.3f} ms/frame on this host")
+            if latency <= budget_ms:
+                return row['name']
+        return None
+    
+    def predict(self, face_data: Dict, window: Optional[List] = None) -> Dict:
         """
-        Predict stress level from face data
+        Predict stress level from face data, appending its features to the
+        caller's sliding window (see load_window/save_window)
         Returns: {stress_score: float, stress_level: str, confidence: float}
         """
+        started = time.perf_counter()
+        # Heuristic scores are served while a background warmup is still running
+        self.ensure_loaded(wait=False)
         features = extract_features(face_data)
+        feature_monitor.observe(features)
+        path = "heuristic"
         
         if self.use_model and self.model:
             # Add to sequence buffer
-            self.sequence_buffer.append(features)
-            if len(self.sequence_buffer) > self.seq_len:
-                self.sequence_buffer.pop(0)
+            if window is None:
+                window = []
+            window.append(features)
+            if len(window) > self.seq_len:
+                # More than one frame if the window was saved under a longer model
+                del window[:-self.seq_len]
             
             # Need full sequence for prediction
-            if len(self.sequence_buffer) == self.seq_len:
-                stress_score = self.model.forward(self.sequence_buffer)
+            if len(window) == self.seq_len:
+                stress_score = self.model.forward(window)
                 confidence = 0.85
+                path = "model"
             else:
                 # Not enough data yet, use heuristic
                 stress_score = self._heuristic_prediction(features)
@@ -66,6 +161,9 @@ class InferenceService:
         else:
             stress_level = "High"
         
+        elapsed = time.perf_counter() - started
+        inference_duration.labels(path).observe(elapsed)
+        record_phase("inference", elapsed)
         return {
             "stress_score": float(stress_score),
             "stress_level": stress_level,
@@ -88,9 +186,17 @@ class InferenceService:
         
         return min(100, max(0, stress))
     
-    def reset_buffer(self):
-        """Reset the sequence buffer for a new session"""
-        self.sequence_buffer = []
+    def load_window(self, session_id) -> List:
+        """Fetch a session's feature window, e.g. when a client reconnects to this worker"""
+        return decode_window(session_store.get(str(session_id)))
+    
+    def save_window(self, session_id, window: List):
+        """Store a session's window; shared backends write it behind, off this thread"""
+        session_store.put(str(session_id), encode_window(window[-self.seq_len:]))
+    
+    def reset_session(self, session_id):
+        """Forget a session's window"""
+        session_store.delete(str(session_id))
 
 # Global instance
 inference_service = InferenceService()
@@ -0,0 +1,246 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import deque, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from app.core.metrics import pdf_render_duration, pdf_jobs
+from app.core.timing import record_phase
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_MAX_CONCURRENT = int(os.getenv("PDF_MAX_CONCURRENT", str(PDF_RENDER_WORKERS)))
+PDF_MAX_RETRIES = int(os.getenv("PDF_MAX_RETRIES", "2"))
+PDF_JOB_TTL_SECONDS = int(os.getenv("PDF_JOB_TTL_SECONDS", "600"))
+PDF_MAX_FINISHED_JOBS = int(os.getenv("PDF_MAX_FINISHED_JOBS", "256"))
+# Jobs allowed to wait for a worker; beyond this submit() sheds load
+PDF_MAX_QUEUED = int(os.getenv("PDF_MAX_QUEUED", "64"))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.getenv("PDF_RENDER_TIMEOUT_SECONDS", "60"))
+
+
+class PdfQueueFull(Exception):
+    """Raised when too many renders are already waiting and the job was shed"""
+
+
+def _render_pdf(user_data: Dict, session_data: Dict, recommendations: Dict) -> Tuple[bytes, float]:
+    """Render a report inside a pool worker process; returns the PDF and its render time"""
+    from app.services.report_service import report_service
+    started = time.perf_counter()
+    pdf_bytes = report_service.generate_pdf_report(user_data, session_data, recommendations)
+    return pdf_bytes, time.perf_counter() - started
+
+
+class PdfJob:
+    """A single queued PDF render"""
+
+    def __init__(self, report_id: int, args: tuple):
+        self.id = uuid.uuid4().hex
+        self.report_id = report_id
+        self.args = args
+        self.status = "queued"  # queued, running, done, failed
+        self.attempts = 0
+        self.error = None
+        self.result = None
+        self.render_seconds = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Resolved once the job reaches a terminal state
+        self.done = Future()
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "report_id": self.report_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error
+        }
+
+
+class PdfJobService:
+    """Renders PDF reports in a bounded process pool, off the request threads"""
+
+    def __init__(self, max_workers: int = PDF_RENDER_WORKERS,
+                 max_concurrent: int = PDF_MAX_CONCURRENT,
+                 max_retries: int = PDF_MAX_RETRIES,
+                 max_queued: int = PDF_MAX_QUEUED):
+        self.max_workers = max_workers
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_retries = max_retries
+        self.max_queued = max_queued
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = deque()
+        self._running = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """Shut down a broken pool; the next submit starts a fresh one"""
+        if self._executor is executor:
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, report_id: int, user_data: Dict, session_data: Dict, recommendations: Dict) -> PdfJob:
+        """Queue a render and return its job; raises PdfQueueFull when the queue is full"""
+        job = PdfJob(report_id, (user_data, session_data, recommendations))
+        with self._lock:
+            if len(self._pending) >= self.max_queued:
+                pdf_jobs.labels("shed").inc()
+                raise PdfQueueFull()
+            self._evict_finished()
+            self._jobs[job.id] = job
+            self._pending.append(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[PdfJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def render(self, report_id: int, user_data: Dict, session_data: Dict, recommendations: Dict,
+               timeout: Optional[float] = PDF_RENDER_TIMEOUT_SECONDS) -> bytes:
+        """Render through the queue and block until the PDF is ready (TimeoutError after `timeout`)"""
+        job = self.submit(report_id, user_data, session_data, recommendations)
+        try:
+            job.done.result(timeout=timeout)
+        finally:
+            # Nobody polls this job: drop it, and its queue slot if it timed out before starting
+            self.discard(job)
+        if job.status != "done":
+            raise RuntimeError(job.error or "PDF rendering failed")
+        record_phase("render", job.render_seconds)
+        return job.result
+
+    def render_many(self, items: Iterable[Tuple], window: Optional[int] = None) -> Iterator[Tuple]:
+        """
+        Render (key, user_data, session_data, recommendations) items through the
+        same queue and concurrency limit as submit(). Yields (key, pdf_bytes) in
+        input order, with at most `window` of them queued or running.
+        """
+        window = window or self.max_concurrent
+        in_flight = deque()
+        items = iter(items)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(in_flight) < window:
+                    try:
+                        key, *args = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    in_flight.append((key, self.submit(None, *args)))
+                if not in_flight:
+                    return
+                key, job = in_flight.popleft()
+                job.done.result(timeout=PDF_RENDER_TIMEOUT_SECONDS)
+                self.discard(job)
+                if job.status != "done":
+                    raise RuntimeError(f"PDF rendering failed for {key}: {job.error}")
+                yield key, job.result
+        finally:
+            # Client went away or a render failed for good: drop queued work
+            for _, job in in_flight:
+                self.discard(job)
+
+    def discard(self, job: PdfJob):
+        """Forget a job whose result nobody will fetch, cancelling it if it hasn't started"""
+        with self._lock:
+            self._jobs.pop(job.id, None)
+            cancelled = job.status == "queued" and job in self._pending
+            if cancelled:
+                self._pending.remove(job)
+                job.status = "failed"
+                job.error = "PDF rendering was cancelled"
+                self._mark_finished(job)
+        if cancelled:
+            job.done.set_result(job.status)
+
+    def _dispatch(self):
+        """Start queued jobs while below the concurrency limit"""
+        while True:
+            with self._lock:
+                if self._running >= self.max_concurrent or not self._pending:
+                    return
+                job = self._pending.popleft()
+                self._running += 1
+                job.status = "running"
+                job.attempts += 1
+                executor = self._get_executor()
+                try:
+                    future = executor.submit(_render_pdf, *job.args)
+                except BrokenProcessPool:
+                    self._discard_executor(executor)
+                    executor = self._get_executor()
+                    future = executor.submit(_render_pdf, *job.args)
+            future.add_done_callback(lambda f, job=job, executor=executor: self._on_done(job, executor, f))
+
+    def _on_done(self, job: PdfJob, executor: ProcessPoolExecutor, future):
+        # Cancelled futures come from shutdown(); they fail rather than retry
+        error = None if future.cancelled() else future.exception()
+        with self._lock:
+            self._running -= 1
+            if future.cancelled():
+                job.status = "failed"
+                job.error = "PDF rendering was cancelled"
+            elif error is None:
+                job.status = "done"
+                job.result, job.render_seconds = future.result()
+                pdf_render_duration.observe(job.render_seconds)
+            elif job.attempts <= self.max_retries:
+                job.status = "queued"
+                if isinstance(error, BrokenProcessPool):
+                    self._discard_executor(executor)
+                self._pending.append(job)
+            else:
+                job.status = "failed"
+                job.error = str(error) or error.__class__.__name__
+            finished = job.status in ("done", "failed")
+            if finished:
+                self._mark_finished(job)
+        if finished:
+            job.done.set_result(job.status)
+        self._dispatch()
+
+    def _mark_finished(self, job: PdfJob):
+        """Caller holds the lock and resolves job.done afterwards"""
+        pdf_jobs.labels(job.status).inc()
+        job.args = None
+        job.finished_at = time.time()
+
+    def _evict_finished(self):
+        """Drop expired results so finished jobs don't accumulate (caller holds the lock)"""
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        overflow = len(finished) - PDF_MAX_FINISHED_JOBS
+        for i, job in enumerate(finished):
+            if i < overflow or now - job.finished_at > PDF_JOB_TTL_SECONDS:
+                del self._jobs[job.id]
+
+    def shutdown(self):
+        # Fail queued jobs so nothing waits on them forever; running ones fail via _on_done
+        with self._lock:
+            abandoned = list(self._pending)
+            self._pending.clear()
+            for job in abandoned:
+                job.status = "failed"
+                job.error = "PDF service shut down"
+                self._mark_finished(job)
+        for job in abandoned:
+            job.done.set_result(job.status)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+pdf_job_service = PdfJobService()
@@ -0,0 +1,142 @@
+"""
+ReportLab PDF rendering. Kept out of report_service so that processes which
+never render (API workers, batch jobs) don't pay for importing ReportLab.
+"""
+import io
+import json
+from typing import Dict
+from datetime import datetime
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.lib.units import inch
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+
+# Table styling shared by every report
+INFO_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8eaf6')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+]
+
+class PdfRenderer:
+    """Builds report PDFs from a stylesheet prepared once per process"""
+    
+    def __init__(self):
+        self._styles = None
+    
+    def _get_styles(self) -> Dict:
+        """Build the ReportLab stylesheet once and reuse it for every PDF"""
+        if self._styles is None:
+            styles = getSampleStyleSheet()
+            self._styles = {
+                'normal': styles['Normal'],
+                'italic': styles['Italic'],
+                'title': ParagraphStyle(
+                    'CustomTitle',
+                    parent=styles['Heading1'],
+                    fontSize=24,
+                    textColor=colors.HexColor('#1a237e'),
+                    spaceAfter=30,
+                    alignment=TA_CENTER
+                ),
+                'heading': ParagraphStyle(
+                    'CustomHeading',
+                    parent=styles['Heading2'],
+                    fontSize=16,
+                    textColor=colors.HexColor('#283593'),
+                    spaceAfter=12,
+                    spaceBefore=12
+                ),
+                'info_table': TableStyle(INFO_TABLE_STYLE),
+                # Summary table variants, keyed by the score highlight colour
+                'stress_table': {
+                    color: TableStyle(INFO_TABLE_STYLE + [
+                        ('BACKGROUND', (1, 0), (1, 0), color),
+                        ('TEXTCOLOR', (1, 0), (1, 0), colors.whitesmoke),
+                        ('FONTNAME', (1, 0), (1, 0), 'Helvetica-Bold'),
+                    ])
+                    for color in (colors.green, colors.orange, colors.red)
+                },
+            }
+        return self._styles
+    
+    def render(self, user_data: Dict, session_data: Dict, recommendations: Dict) -> bytes:
+        """Generate PDF report"""
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter)
+        story = []
+        styles = self._get_styles()
+        title_style = styles['title']
+        heading_style = styles['heading']
+        
+        # Title
+        story.append(Paragraph("AI Stress Analysis Report", title_style))
+        story.append(Spacer(1, 0.2*inch))
+        
+        # User Info
+        story.append(Paragraph("Personal Information", heading_style))
+        user_info = [
+            ['Name:', user_data.get('name', 'N/A')],
+            ['Email:', user_data.get('email', 'N/A')],
+            ['Work Type:', user_data.get('work_type', 'N/A')],
+            ['Working Hours:', f"{user_data.get('working_hours', 'N/A')} hours/day"],
+            ['Mobile Usage:', f"{user_data.get('mobile_usage', 'N/A')} hours/day"],
+        ]
+        user_table = Table(user_info, colWidths=[2*inch, 4*inch])
+        user_table.setStyle(styles['info_table'])
+        story.append(user_table)
+        story.append(Spacer(1, 0.3*inch))
+        
+        # Stress Analysis
+        story.append(Paragraph("Stress Analysis Summary", heading_style))
+        stress_color = colors.green
+        if recommendations['overall_stress'] > 70:
+            stress_color = colors.red
+        elif recommendations['overall_stress'] > 40:
+            stress_color = colors.orange
+        
+        stress_info = [
+            ['Overall Stress Score:', f"{recommendations['overall_stress']:.1f}/100"],
+            ['Stress Level:', recommendations['stress_level']],
+            ['Trend:', recommendations['stress_trend']],
+            ['Report Date:', datetime.now().strftime('%Y-%m-%d %H:%M')]
+        ]
+        stress_table = Table(stress_info, colWidths=[2*inch, 4*inch])
+        stress_table.setStyle(styles['stress_table'][stress_color])
+        story.append(stress_table)
+        story.append(Spacer(1, 0.3*inch))
+        
+        # Recommendations sections
+        sections = [
+            ('Recommended Activities', 'activities'),
+            ('Workout Plan', 'workouts'),
+            ('Meditation & Mindfulness', 'meditation'),
+            ('Nutrition Guidelines', 'food_control'),
+            ('Medical Recommendations', 'medical_checkup')
+        ]
+        
+        for section_title, key in sections:
+            story.append(Paragraph(section_title, heading_style))
+            items = json.loads(recommendations[key])
+            for item in items:
+                story.append(Paragraph(f"• {item}", styles['normal']))
+                story.append(Spacer(1, 0.05*inch))
+            story.append(Spacer(1, 0.2*inch))
+        
+        # Footer
+        story.append(Spacer(1, 0.5*inch))
+        footer_text = "This report is generated by AI and should not replace professional medical advice. Please consult healthcare professionals for personalized guidance."
+        story.append(Paragraph(footer_text, styles['italic']))
+        
+        doc.build(story)
+        buffer.seek(0)
+        return buffer.getvalue()
+
+# Global instance
+pdf_renderer = PdfRenderer()
@@ -0,0 +1,178 @@
+import hashlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import Integer, cast, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import models
+
+# avg_stress is binned at 0.1 points: bins 0..999 cover 0-99.9, bin 1000 holds 100
+BINS_PER_POINT = 10
+HISTOGRAM_BINS = 100 * BINS_PER_POINT + 1
+
+def stress_bin(avg_stress: float) -> int:
+    return min(HISTOGRAM_BINS - 1, max(0, int(avg_stress * BINS_PER_POINT)))
+
+def update_nodes(index: int, size: int = HISTOGRAM_BINS) -> List[int]:
+    """Fenwick nodes to increment when adding to 1-based position index"""
+    nodes = []
+    while index <= size:
+        nodes.append(index)
+        index += index & -index
+    return nodes
+
+def prefix_nodes(index: int) -> List[int]:
+    """Fenwick nodes whose counts sum to positions 1..index"""
+    nodes = []
+    while index > 0:
+        nodes.append(index)
+        index -= index & -index
+    return nodes
+
+def build_tree(counts: List[int]) -> List[int]:
+    """Fenwick tree (1-based, as a 0-based list) over per-bin counts, in O(n)"""
+    tree = list(counts)
+    for i in range(1, len(tree) + 1):
+        parent = i + (i & -i)
+        if parent <= len(tree):
+            tree[parent - 1] += tree[i - 1]
+    return tree
+
+def percentile_of(below: int, same: int, total: int) -> Optional[float]:
+    """
+    Percentage of `total` compared games with higher stress than this one, where
+    `below` are lower and `same` share its bin (ties count half); None if total is 0
+    """
+    if total <= 0:
+        return None
+    higher = total - below - same
+    return round(100.0 * (higher + 0.5 * same) / total, 1)
+
+class PercentileService:
+    """
+    Per-game avg_stress histograms stored as Fenwick trees (one row per node),
+    so saving a game and ranking one each touch O(log bins) rows
+    """
+    
+    def record_game(self, db: Session, game_name: str, avg_stress: Optional[float]):
+        """Add a newly saved game to its game's histogram (caller commits)"""
+        if avg_stress is None:
+            return
+        H = models.GameStressHistogram
+        statement = update(H).where(
+            H.game_name == game_name, H.node.in_(update_nodes(stress_bin(avg_stress) + 1))
+        ).values(count=H.count + 1).execution_options(synchronize_session=False)
+        if db.execute(statement).rowcount:
+            return
+        # First time we see this game: build its histogram from history, which includes this game
+        db.flush()
+        try:
+            with db.begin_nested():
+                self.rebuild(db, game_name)
+        except IntegrityError:
+            # Another request built it first
+            db.execute(statement)
+    
+    def rebuild(self, db: Session, game_name: Optional[str] = None):
+        """Recompute one game's histogram, or every game's, from game_data"""
+        H = models.GameStressHistogram
+        stress_bins = cast(models.GameData.avg_stress * BINS_PER_POINT, Integer)
+        query = db.query(models.GameData.game_name, stress_bins, func.count(models.GameData.id)).filter(
+            models.GameData.avg_stress.isnot(None)
+        )
+        delete = db.query(H)
+        if game_name is not None:
+            query = query.filter(models.GameData.game_name == game_name)
+            delete = delete.filter(H.game_name == game_name)
+        
+        counts: Dict[str, List[int]] = defaultdict(lambda: [0] * HISTOGRAM_BINS)
+        for name, bin_index, count in query.group_by(models.GameData.game_name, stress_bins):
+            counts[name][min(HISTOGRAM_BINS - 1, max(0, bin_index))] += count
+        
+        delete.delete(synchronize_session=False)
+        db.bulk_insert_mappings(H, [
+            {'game_name': name, 'node': i + 1, 'count': count}
+            for name, bins in counts.items()
+            for i, count in enumerate(build_tree(bins))
+        ])
+        db.flush()
+    
+    def percentiles(self, db: Session, games: Iterable[Tuple[str, Optional[float]]],
+                    user_id: Optional[int] = None) -> List[Optional[float]]:
+        """
+        For each (game_name, avg_stress) of a recorded game, the percentage of
+        other players' recorded games of that name with higher stress (ties count
+        half). Without user_id, only the game itself is left out of the comparison.
+        None when there is nothing to compare with.
+        """
+        games = list(games)
+        wanted: Dict[str, Set[int]] = defaultdict(lambda: set(prefix_nodes(HISTOGRAM_BINS)))
+        for game_name, avg_stress in games:
+            if avg_stress is not None:
+                index = stress_bin(avg_stress)
+                wanted[game_name].update(prefix_nodes(index), prefix_nodes(index + 1))
+        
+        H = models.GameStressHistogram
+        trees = {}
+        for game_name, nodes in wanted.items():
+            trees[game_name] = dict(db.query(H.node, H.count).filter(
+                H.game_name == game_name, H.node.in_(nodes)
+            ).all())
+        own = self._user_bins(db, user_id, list(wanted)) if user_id is not None else {}
+        
+        results = []
+        for game_name, avg_stress in games:
+            tree = trees.get(game_name)
+            if avg_stress is None or not tree:
+                results.append(None)
+                continue
+            prefix = lambda index: sum(tree.get(node, 0) for node in prefix_nodes(index))
+            index = stress_bin(avg_stress)
+            below, through, total = prefix(index), prefix(index + 1), prefix(HISTOGRAM_BINS)
+            if user_id is None:
+                # Leave out the game itself, which is in its own bin
+                results.append(percentile_of(below, through - below - 1, total - 1))
+                continue
+            bins = own.get(game_name, {})
+            own_below = sum(count for bin_index, count in bins.items() if bin_index < index)
+            own_same = bins.get(index, 0)
+            results.append(percentile_of(below - own_below, through - below - own_same, total - sum(bins.values())))
+        return results
+    
+    def _user_bins(self, db: Session, user_id: int, game_names: List[str]) -> Dict[str, Dict[int, int]]:
+        """Per-bin counts of the user's own recorded games, to leave out of their ranking"""
+        stress_bins = cast(models.GameData.avg_stress * BINS_PER_POINT, Integer)
+        rows = db.query(models.GameData.game_name, stress_bins, func.count(models.GameData.id)).join(
+            models.GameSession, models.GameSession.id == models.GameData.session_id
+        ).filter(
+            models.GameSession.user_id == user_id,
+            models.GameData.game_name.in_(game_names),
+            models.GameData.avg_stress.isnot(None)
+        ).group_by(models.GameData.game_name, stress_bins)
+        bins: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        for game_name, bin_index, count in rows:
+            # Same clamping as rebuild()
+            bins[game_name][min(HISTOGRAM_BINS - 1, max(0, bin_index))] += count
+        return bins
+    
+    def version(self, db: Session, session_id: int) -> str:
+        """
+        Changes whenever a game is added to (or a rebuild reshapes) the histogram
+        of any game played in the session; read from the few nodes covering each
+        whole tree, so it costs O(log bins) rows per game.
+        """
+        H = models.GameStressHistogram
+        game_names = db.query(models.GameData.game_name).filter(
+            models.GameData.session_id == session_id
+        ).distinct()
+        rows = db.query(H.game_name, H.node, H.count).filter(
+            H.game_name.in_(game_names.scalar_subquery()), H.node.in_(prefix_nodes(HISTOGRAM_BINS))
+        ).order_by(H.game_name, H.node).all()
+        return hashlib.sha1(repr(rows).encode()).hexdigest()[:12]
+    
+    def percentile(self, db: Session, game_name: str, avg_stress: Optional[float],
+                   user_id: Optional[int] = None) -> Optional[float]:
+        return self.percentiles(db, [(game_name, avg_stress)], user_id)[0]
+
+# Global instance
+percentile_service = PercentileService()
@@ -0,0 +1,209 @@
+import json
+import threading
+from typing import Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# Bump whenever the recommendation text changes. Older versions stay in the
+# table so existing reports keep pointing at the text they were generated with.
+CATALOG_VERSION = 1
+
+CATEGORIES = ['activities', 'workouts', 'meditation', 'food_control', 'medical_checkup']
+DEFAULT_PROFILE = 'default'
+
+RECOMMENDATIONS = {
+    'activities': {
+        'high': [
+            "🌳 Take regular breaks every 30 minutes - walk outside for 5-10 minutes",
+            "🎨 Engage in creative hobbies (painting, music, crafts) for 30 minutes daily",
+            "👥 Schedule social activities with friends/family at least 3 times per week",
+            "📚 Read fiction or non-work-related books for 20 minutes before bed",
+            "🎮 Play relaxing games or puzzles to unwind (avoid competitive games)"
+        ],
+        'elevated': [
+            "🚶 Take short walks during lunch breaks",
+            "🎵 Listen to calming music during work",
+            "🌿 Spend time in nature on weekends",
+            "🎯 Pursue a hobby you enjoy for 1-2 hours weekly",
+            "☕ Have regular coffee/tea breaks with colleagues"
+        ],
+        'low': [
+            "✅ Maintain your current healthy work-life balance",
+            "🎉 Continue engaging in activities you enjoy",
+            "🤝 Keep up social connections",
+            "📅 Plan regular leisure activities"
+        ]
+    },
+    'workouts': {
+        'high': [
+            "🧘 Yoga (30 minutes daily) - Focus on restorative poses",
+            "🏃 Light jogging or brisk walking (20-30 minutes, 4-5 times/week)",
+            "🏊 Swimming (2-3 times/week) - Excellent for stress relief",
+            "🚴 Cycling (30 minutes, 3-4 times/week)",
+            "💪 Light strength training (2 times/week) - Avoid overexertion",
+            "🤸 Stretching exercises (10 minutes daily)"
+        ],
+        'elevated': [
+            "🏃 Moderate cardio (30 minutes, 3-4 times/week)",
+            "🧘 Yoga or Pilates (2-3 times/week)",
+            "💪 Strength training (2-3 times/week)",
+            "🚶 Daily walks (15-20 minutes)"
+        ],
+        'low': [
+            "✅ Continue your current exercise routine",
+            "🏃 Maintain 150 minutes of moderate activity per week",
+            "💪 Include strength training 2 times/week"
+        ]
+    },
+    'meditation': {
+        'high': [
+            "🧘 Practice deep breathing exercises 3 times daily (5 minutes each)",
+            "🎧 Guided meditation sessions (15-20 minutes daily) - Try apps like Headspace or Calm",
+            "🌅 Morning mindfulness routine (10 minutes upon waking)",
+            "🌙 Evening relaxation meditation before bed (10-15 minutes)",
+            "📿 Body scan meditation (20 minutes, 3 times/week)",
+            "🙏 Progressive muscle relaxation (15 minutes daily)"
+        ],
+        'elevated': [
+            "🧘 Daily meditation practice (10 minutes)",
+            "🎧 Guided breathing exercises (5 minutes, 2 times/day)",
+            "🌅 Morning mindfulness (5 minutes)",
+            "📱 Use meditation apps for consistency"
+        ],
+        'low': [
+            "🧘 Continue occasional meditation practice",
+            "🎧 5-minute breathing exercises when needed",
+            "✅ Maintain mindfulness in daily activities"
+        ]
+    },
+    'food_control': {
+        'high': [
+            "🥗 Increase intake of leafy greens and vegetables (5+ servings daily)",
+            "🐟 Omega-3 rich foods (salmon, walnuts, flaxseeds) - 3 times/week",
+            "🫐 Antioxidant-rich berries (blueberries, strawberries) - Daily",
+            "🥜 Magnesium-rich foods (nuts, seeds, dark chocolate) - Moderate amounts",
+            "🍵 Herbal teas (chamomile, green tea) - 2-3 cups daily",
+            "💧 Hydration - Drink 8-10 glasses of water daily",
+            "❌ AVOID: Excessive caffeine (limit to 1-2 cups/day)",
+            "❌ AVOID: Processed foods and high sugar items",
+            "❌ AVOID: Alcohol consumption"
+        ],
+        'elevated': [
+            "🥗 Balanced diet with plenty of vegetables",
+            "🐟 Include omega-3 sources weekly",
+            "💧 Stay well hydrated (8 glasses/day)",
+            "☕ Moderate caffeine intake",
+            "🍎 Healthy snacks (fruits, nuts)"
+        ],
+        'low': [
+            "✅ Maintain your current healthy diet",
+            "🥗 Continue eating balanced meals",
+            "💧 Keep up good hydration habits"
+        ]
+    },
+    'medical_checkup': {
+        'high': [
+            "⚠️ RECOMMENDED: Schedule a consultation with your primary care physician within 2 weeks",
+            "🧠 Consider consulting a mental health professional (therapist or counselor)",
+            "💊 Discuss stress management strategies with your doctor",
+            "📊 Get comprehensive health screening (blood pressure, cortisol levels, etc.)",
+            "😴 If experiencing sleep issues, consult a sleep specialist",
+            "💚 Regular check-ins with healthcare provider (monthly for 3 months)"
+        ],
+        'elevated': [
+            "📅 Schedule routine health checkup within 1-2 months",
+            "💬 Discuss stress levels with your doctor during next visit",
+            "📊 Monitor blood pressure regularly",
+            "😴 Track sleep quality and discuss if issues persist"
+        ],
+        'low': [
+            "✅ Continue annual health checkups",
+            "📅 Maintain regular preventive care schedule",
+            "💬 Mention stress management during routine visits"
+        ]
+    }
+}
+
+# Pre-encoded once at import; report generation never re-serializes these lists
+ENCODED = {
+    (category, tier): json.dumps(items)
+    for category, tiers in RECOMMENDATIONS.items()
+    for tier, items in tiers.items()
+}
+
+def stress_tier(stress_score: float) -> str:
+    """Map a 0-100 stress score onto the catalog tier"""
+    if stress_score > 70:
+        return 'high'
+    elif stress_score > 40:
+        return 'elevated'
+    return 'low'
+
+def profile_for(user_data: Dict, stress_trend: str) -> str:
+    """Catalog profile for a user; all users currently share the default text"""
+    return DEFAULT_PROFILE
+
+class RecommendationCatalog:
+    """Keeps the recommendation catalog table seeded and mirrored in memory"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._ids = {}  # (version, category, tier, profile) -> entry id
+        self._items = {}  # entry id -> JSON text
+    
+    def ensure_loaded(self, db: Session):
+        """
+        Seed the current catalog version if missing and cache every entry. Seeds
+        in its own session, so the caller's transaction is never committed here.
+        """
+        if self._loaded:
+            return
+        from app import models
+        E = models.RecommendationCatalogEntry
+        
+        with self._lock:
+            if self._loaded:
+                return
+            with Session(bind=db.get_bind()) as seed_db:
+                existing = {(e.version, e.category, e.stress_tier, e.profile) for e in seed_db.query(E).all()}
+                missing = [
+                    E(version=CATALOG_VERSION, category=category, stress_tier=tier,
+                      profile=DEFAULT_PROFILE, items=items)
+                    for (category, tier), items in ENCODED.items()
+                    if (CATALOG_VERSION, category, tier, DEFAULT_PROFILE) not in existing
+                ]
+                if missing:
+                    seed_db.add_all(missing)
+                    try:
+                        seed_db.commit()
+                    except IntegrityError:
+                        # Another worker seeded the same version first; use its rows
+                        seed_db.rollback()
+                
+                for entry_id, version, category, tier, profile, items in seed_db.query(
+                    E.id, E.version, E.category, E.stress_tier, E.profile, E.items
+                ):
+                    self._ids[(version, category, tier, profile)] = entry_id
+                    self._items[entry_id] = items
+            self._loaded = True
+    
+    def entry_ids(self, db: Session, overall_stress: float, user_data: Dict, stress_trend: str) -> Dict[str, int]:
+        """Catalog entry id per category for a report"""
+        self.ensure_loaded(db)
+        tier = stress_tier(overall_stress)
+        profile = profile_for(user_data, stress_trend)
+        return {
+            category: self._ids[(CATALOG_VERSION, category, tier, profile)]
+            for category in CATEGORIES
+        }
+    
+    def items_json(self, entry_id: int) -> Optional[str]:
+        """Cached JSON text for an entry, or None if this worker hasn't loaded it"""
+        return self._items.get(entry_id)
+    
+    def remember(self, entry_id: int, items: str):
+        self._items[entry_id] = items
+
+# Global instance
+recommendation_catalog = RecommendationCatalog()
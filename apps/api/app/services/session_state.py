@@ -0,0 +1,183 @@
+"""
+Per-session inference state (the LSTM's sliding feature window).
+
+The window is stored as float32 bytes keyed by session id, so a client that
+reconnects to another worker or host picks up where it left off. Backends:
+  memory - process-local LRU (default; fine for a single worker)
+  redis  - any Redis-compatible server, via SESSION_STATE_URL
+
+Shared backends sit behind WriteBehindStore: puts land in a local dict and a
+background thread flushes them in one pipelined batch every SESSION_STATE_FLUSH_MS,
+so scoring a frame never waits on the network.
+"""
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+SESSION_STATE_BACKEND = os.getenv("SESSION_STATE_BACKEND", "memory")
+SESSION_STATE_URL = os.getenv("SESSION_STATE_URL", "redis://localhost:6379/0")
+SESSION_STATE_TTL_SECONDS = int(os.getenv("SESSION_STATE_TTL_SECONDS", "3600"))
+SESSION_STATE_MAX_SESSIONS = int(os.getenv("SESSION_STATE_MAX_SESSIONS", "10000"))
+SESSION_STATE_FLUSH_MS = int(os.getenv("SESSION_STATE_FLUSH_MS", "50"))
+
+FEATURE_DIM = 6
+
+
+def encode_window(window: List[List[float]]) -> bytes:
+    """Pack a feature window as float32 rows (720 bytes for a full 30-frame window)"""
+    return np.asarray(window, dtype=np.float32).tobytes()
+
+
+def decode_window(data: Optional[bytes]) -> List[List[float]]:
+    if not data:
+        return []
+    return np.frombuffer(data, dtype=np.float32).reshape(-1, FEATURE_DIM).tolist()
+
+
+class SessionStateStore:
+    """Interface for session state backends"""
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+    
+    def put(self, session_id: str, state: bytes):
+        self.put_many({session_id: state})
+    
+    def put_many(self, states: Dict[str, bytes]):
+        raise NotImplementedError
+    
+    def delete(self, session_id: str):
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStateStore):
+    """Process-local LRU of session states"""
+    
+    def __init__(self, max_sessions: int = SESSION_STATE_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is not None:
+                self._states.move_to_end(session_id)
+            return state
+    
+    def put_many(self, states: Dict[str, bytes]):
+        with self._lock:
+            for session_id, state in states.items():
+                self._states[session_id] = state
+                self._states.move_to_end(session_id)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+    
+    def delete(self, session_id: str):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+
+class RedisSessionStore(SessionStateStore):
+    """
+    Session states in a Redis-compatible server. Pass `client` to use an existing
+    connection or a stand-in such as fakeredis.
+    """
+    
+    def __init__(self, url: str = SESSION_STATE_URL, client=None,
+                 ttl_seconds: int = SESSION_STATE_TTL_SECONDS, prefix: str = "stress:window:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("SESSION_STATE_BACKEND=redis requires the 'redis' package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + session_id)
+    
+    def put_many(self, states: Dict[str, bytes]):
+        pipe = self.client.pipeline(transaction=False)
+        for session_id, state in states.items():
+            pipe.set(self.prefix + session_id, state, ex=self.ttl_seconds)
+        pipe.execute()
+    
+    def delete(self, session_id: str):
+        self.client.delete(self.prefix + session_id)
+
+
+class WriteBehindStore(SessionStateStore):
+    """Buffers puts locally and flushes them to the backend in batches"""
+    
+    def __init__(self, backend: SessionStateStore, flush_interval: float = SESSION_STATE_FLUSH_MS / 1000):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            state = self._dirty.get(session_id)
+        return state if state is not None else self.backend.get(session_id)
+    
+    def put_many(self, states: Dict[str, bytes]):
+        with self._lock:
+            self._dirty.update(states)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="session-state-flush", daemon=True)
+                self._thread.start()
+    
+    def delete(self, session_id: str):
+        with self._lock:
+            self._dirty.pop(session_id, None)
+        self.backend.delete(session_id)
+    
+    def flush(self):
+        """Write every buffered state to the backend now"""
+        with self._lock:
+            batch, self._dirty = self._dirty, {}
+        if not batch:
+            return
+        try:
+            self.backend.put_many(batch)
+        except Exception as e:
+            print(f"Session state flush failed, will retry: {e}")
+            with self._lock:
+                # Keep anything newer that arrived while we were flushing
+                for session_id, state in batch.items():
+                    self._dirty.setdefault(session_id, state)
+    
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self.flush()
+    
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        self.backend.close()
+
+
+def create_session_store(backend: str = SESSION_STATE_BACKEND) -> SessionStateStore:
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "redis":
+        return WriteBehindStore(RedisSessionStore())
+    raise ValueError(f"Unknown SESSION_STATE_BACKEND: {backend}")
+
+# Global instance
+session_store = create_session_store()
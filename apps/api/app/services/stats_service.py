@@ -0,0 +1,224 @@
+from datetime import datetime, date, timedelta
+from typing import Dict, Optional
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+from app import models
+
+EWMA_ALPHA = 0.1
+EWMA_RECENT_ALPHA = 0.4
+TREND_THRESHOLD = 5.0
+
+class StatsService:
+    """Maintains the per-user stress statistics row behind the dashboard summary"""
+    
+    def record_game(self, db: Session, user_id: int, avg_stress: float, played_at: datetime):
+        """Fold a newly saved game into the user's stats (caller commits)"""
+        S = models.UserStressStats
+        played_on = played_at.date()
+        values = {S.games_count: func.coalesce(S.games_count, 0) + 1, S.updated_at: datetime.utcnow()}
+        if avg_stress is not None:
+            # SET expressions all see the old row, so the trend is computed from the new means inline
+            ewma = case((S.ewma_stress.is_(None), avg_stress),
+                        else_=S.ewma_stress + EWMA_ALPHA * (avg_stress - S.ewma_stress))
+            recent = case((S.ewma_recent.is_(None), avg_stress),
+                          else_=S.ewma_recent + EWMA_RECENT_ALPHA * (avg_stress - S.ewma_recent))
+            values.update({
+                S.ewma_stress: ewma,
+                S.ewma_recent: recent,
+                S.trend: case((recent - ewma > TREND_THRESHOLD, "Increasing"),
+                              (recent - ewma < -TREND_THRESHOLD, "Decreasing"), else_="Stable")
+            })
+        yesterday = played_on - timedelta(days=1)
+        streak = case((S.last_played_on.is_(None), 1), (S.last_played_on < yesterday, 1),
+                      (S.last_played_on == yesterday, func.coalesce(S.current_streak, 0) + 1),
+                      else_=S.current_streak)
+        values.update({
+            S.current_streak: streak,
+            S.longest_streak: case((streak > func.coalesce(S.longest_streak, 0), streak),
+                                   else_=func.coalesce(S.longest_streak, 0)),
+            S.last_played_on: case((S.last_played_on.is_(None), played_on), (S.last_played_on < played_on, played_on),
+                                   else_=S.last_played_on)
+        })
+        if not self._update(db, user_id, values):
+            # First time we see this user: backfill from history, which includes this game
+            db.flush()
+            self.rebuild(db, user_id)
+    
+    def record_report(self, db: Session, user_id: int, session_id: int, overall_stress: float,
+                      stress_level: str, previous_level: Optional[str] = None):
+        """
+        Fold a new or regenerated report into the user's stats (caller commits).
+        previous_level is the level the report had before regeneration, if any.
+        """
+        S = models.UserStressStats
+        extremes = db.query(S.best_session_id, S.worst_session_id).filter(S.user_id == user_id).first()
+        if extremes is None:
+            db.flush()
+            self.rebuild(db, user_id)
+            return
+        
+        deltas = {}
+        if previous_level is None:
+            deltas[S.reports_count] = 1
+        else:
+            self._count_level(deltas, previous_level, -1)
+        self._count_level(deltas, stress_level, 1)
+        values = {column: func.coalesce(column, 0) + delta for column, delta in deltas.items() if delta}
+        values[S.updated_at] = datetime.utcnow()
+        
+        if previous_level is not None and session_id in extremes:
+            # The session uses autoflush=False: flush the regenerated report before querying it
+            db.flush()
+            (values[S.best_session_id], values[S.best_session_stress]), \
+                (values[S.worst_session_id], values[S.worst_session_stress]) = self._extremes(db, user_id)
+        elif overall_stress is not None:
+            is_best = S.best_session_stress.is_(None) | (S.best_session_stress > overall_stress)
+            is_worst = S.worst_session_stress.is_(None) | (S.worst_session_stress < overall_stress)
+            values.update({
+                S.best_session_id: case((is_best, session_id), else_=S.best_session_id),
+                S.best_session_stress: case((is_best, overall_stress), else_=S.best_session_stress),
+                S.worst_session_id: case((is_worst, session_id), else_=S.worst_session_id),
+                S.worst_session_stress: case((is_worst, overall_stress), else_=S.worst_session_stress)
+            })
+        self._update(db, user_id, values)
+    
+    def ensure(self, db: Session, user_id: int) -> models.UserStressStats:
+        """The user's stats row, backfilled from history if it doesn't exist yet"""
+        stats = db.get(models.UserStressStats, user_id)
+        if stats is None:
+            stats = self.rebuild(db, user_id)
+        return stats
+    
+    def touch(self, db: Session, user_id: int):
+        """Mark the user's history as changed without new stress data"""
+        stats = db.get(models.UserStressStats, user_id)
+        if stats is not None:
+            stats.updated_at = datetime.utcnow()
+    
+    def get_summary(self, db: Session, user_id: int) -> Optional[Dict]:
+        """Single-row dashboard summary; None if the user doesn't exist"""
+        stats = db.get(models.UserStressStats, user_id)
+        if stats is None:
+            if not db.query(models.User.id).filter(models.User.id == user_id).first():
+                return None
+            stats = self.rebuild(db, user_id)
+            db.commit()
+        
+        return {
+            "user_id": stats.user_id,
+            "games_count": stats.games_count,
+            "ewma_stress": stats.ewma_stress,
+            "trend": stats.trend,
+            "reports_count": stats.reports_count,
+            "stress_levels": {
+                "Low": stats.low_count,
+                "Medium": stats.medium_count,
+                "High": stats.high_count
+            },
+            "current_streak": self._live_streak(stats),
+            "longest_streak": stats.longest_streak,
+            "last_played_on": stats.last_played_on,
+            "best_session": {"session_id": stats.best_session_id, "stress": stats.best_session_stress}
+                if stats.best_session_id is not None else None,
+            "worst_session": {"session_id": stats.worst_session_id, "stress": stats.worst_session_stress}
+                if stats.worst_session_id is not None else None,
+            "updated_at": stats.updated_at
+        }
+    
+    def rebuild(self, db: Session, user_id: int) -> models.UserStressStats:
+        """Recompute a user's stats from the full history (backfill and repair)"""
+        stats = db.get(models.UserStressStats, user_id)
+        if stats is None:
+            stats = models.UserStressStats(user_id=user_id)
+            db.add(stats)
+        stats.games_count = 0
+        stats.ewma_stress = None
+        stats.ewma_recent = None
+        stats.trend = None
+        stats.current_streak = 0
+        stats.longest_streak = 0
+        stats.last_played_on = None
+        
+        games = db.query(models.GameData.avg_stress, models.GameData.completed_at).join(
+            models.GameSession, models.GameSession.id == models.GameData.session_id
+        ).filter(
+            models.GameSession.user_id == user_id
+        ).order_by(models.GameData.completed_at, models.GameData.id)
+        for avg_stress, completed_at in games:
+            self._apply_game(stats, avg_stress, (completed_at or datetime.utcnow()).date())
+        
+        level_counts = dict(db.query(models.StressReport.stress_level, func.count(models.StressReport.id)).filter(
+            models.StressReport.user_id == user_id
+        ).group_by(models.StressReport.stress_level).all())
+        stats.low_count = level_counts.get("Low", 0)
+        stats.medium_count = level_counts.get("Medium", 0)
+        stats.high_count = level_counts.get("High", 0)
+        stats.reports_count = sum(level_counts.values())
+        (stats.best_session_id, stats.best_session_stress), \
+            (stats.worst_session_id, stats.worst_session_stress) = self._extremes(db, user_id)
+        stats.updated_at = datetime.utcnow()
+        # Flush so db.get() finds the row for later updates in this transaction
+        db.flush()
+        return stats
+    
+    def _apply_game(self, stats: models.UserStressStats, avg_stress: float, played_on: date):
+        stats.games_count = (stats.games_count or 0) + 1
+        if avg_stress is not None:
+            if stats.ewma_stress is None:
+                stats.ewma_stress = avg_stress
+                stats.ewma_recent = avg_stress
+            else:
+                stats.ewma_stress += EWMA_ALPHA * (avg_stress - stats.ewma_stress)
+                stats.ewma_recent += EWMA_RECENT_ALPHA * (avg_stress - stats.ewma_recent)
+            gap = stats.ewma_recent - stats.ewma_stress
+            if gap > TREND_THRESHOLD:
+                stats.trend = "Increasing"
+            elif gap < -TREND_THRESHOLD:
+                stats.trend = "Decreasing"
+            else:
+                stats.trend = "Stable"
+        
+        if stats.last_played_on is None or played_on - stats.last_played_on > timedelta(days=1):
+            stats.current_streak = 1
+        elif played_on - stats.last_played_on == timedelta(days=1):
+            stats.current_streak = (stats.current_streak or 0) + 1
+        if stats.last_played_on is None or played_on > stats.last_played_on:
+            stats.last_played_on = played_on
+        stats.longest_streak = max(stats.longest_streak or 0, stats.current_streak or 0)
+    
+    def _update(self, db: Session, user_id: int, values: Dict) -> bool:
+        """
+        Apply the changes as a single UPDATE so concurrent saves add up instead
+        of overwriting each other; False if the user has no stats row yet.
+        """
+        statement = update(models.UserStressStats).where(
+            models.UserStressStats.user_id == user_id
+        ).values(values).execution_options(synchronize_session="fetch")
+        return bool(db.execute(statement).rowcount)
+    
+    def _count_level(self, deltas: Dict, stress_level: Optional[str], delta: int):
+        column = {"Low": "low_count", "Medium": "medium_count", "High": "high_count"}.get(stress_level)
+        if column:
+            column = getattr(models.UserStressStats, column)
+            deltas[column] = deltas.get(column, 0) + delta
+    
+    def _extremes(self, db: Session, user_id: int):
+        """(session_id, overall_stress) of the user's least and most stressful reports"""
+        reports = db.query(models.StressReport.session_id, models.StressReport.overall_stress).filter(
+            models.StressReport.user_id == user_id,
+            models.StressReport.overall_stress.isnot(None)
+        )
+        best = reports.order_by(models.StressReport.overall_stress.asc()).first()
+        worst = reports.order_by(models.StressReport.overall_stress.desc()).first()
+        return tuple(best) if best else (None, None), tuple(worst) if worst else (None, None)
+    
+    def _live_streak(self, stats: models.UserStressStats) -> int:
+        """The stored streak only counts while the user played today or yesterday"""
+        if stats.last_played_on is None:
+            return 0
+        if datetime.utcnow().date() - stats.last_played_on > timedelta(days=1):
+            return 0
+        return stats.current_streak or 0
+
+# Global instance
+stats_service = StatsService()
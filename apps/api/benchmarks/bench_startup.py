@@ -0,0 +1,85 @@
+"""
+Startup-time benchmark: how long a fresh worker takes before it can serve traffic.
+
+Each run starts a new interpreter in a scratch directory (so it gets its own
+SQLite file) and measures:
+  import_ms   - `import app.main`
+  startup_ms  - running the lifespan startup hooks (schema creation, model warmup)
+  ready_ms    - import until /health would report ready
+
+Usage (from apps/api):
+    python benchmarks/bench_startup.py --runs 5 --warmup background --max-ready-ms 3000
+
+Exits non-zero if a median exceeds a --max-* threshold, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import asyncio, json, time
+started = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        up = time.perf_counter()
+        while not main.inference_service.ready and main.MODEL_WARMUP != "lazy":
+            await asyncio.sleep(0.005)
+        ready = time.perf_counter()
+    return up, ready
+
+up, ready = asyncio.run(run())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (up - imported) * 1000,
+    "ready_ms": (ready - started) * 1000,
+}))
+'''
+
+
+def run_once(warmup: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=API_DIR, MODEL_WARMUP=warmup)
+    with tempfile.TemporaryDirectory() as scratch:
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=scratch, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API worker startup time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", choices=["eager", "background", "lazy"], default="eager")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-startup-ms", type=float, default=None)
+    parser.add_argument("--max-ready-ms", type=float, default=None)
+    args = parser.parse_args()
+    
+    runs = [run_once(args.warmup) for _ in range(args.runs)]
+    result = {"warmup": args.warmup, "runs": args.runs}
+    for key in ("import_ms", "startup_ms", "ready_ms"):
+        values = [r[key] for r in runs]
+        result[key] = {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+    print(json.dumps(result, indent=2))
+    
+    failures = []
+    for key, limit in (("import_ms", args.max_import_ms), ("startup_ms", args.max_startup_ms),
+                       ("ready_ms", args.max_ready_ms)):
+        if limit is not None and result[key]["median"] > limit:
+            failures.append(f"{key} median {result[key]['median']}ms exceeds {limit}ms")
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Micro-benchmark suite with saved baselines.
+
+Covers the hot paths: the LSTM forward pass (and each calibrated model's,
+see app.ml.calibrate), InferenceService.predict,
+feature extraction, WebSocket payload encodings, response serialization,
+recommendation generation and PDF rendering. Inputs are seeded, so runs are comparable. Each benchmark
+is timed timeit-style (gc disabled, iterations auto-scaled to ~0.2s per repeat)
+and the fastest per-op time across repeats is reported, since slower repeats
+measure interference from the rest of the machine rather than the code.
+
+Usage (from apps/api):
+    python benchmarks/bench_suite.py                    # compare with baseline.json
+    python benchmarks/bench_suite.py --filter lstm      # only matching benchmarks
+    python benchmarks/bench_suite.py --save-baseline    # record new baselines
+
+Exits non-zero if any benchmark is slower than its baseline by more than
+--threshold (default 25%). Baselines are only meaningful on comparable
+hardware; the baseline file records the environment it came from.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import struct
+import sys
+import time
+
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MODEL_PATH = os.path.join(API_DIR, "app", "ml", "stress_model.json")
+
+# name -> setup function returning the callable to time (or None to skip)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _frames(count, seed=0):
+    from app.ml.train import synthetic_features
+    np.random.seed(seed)
+    return [[float(v) for v in synthetic_features(np.random.uniform(0, 1))] for _ in range(count)]
+
+
+def _model(path=MODEL_PATH):
+    from app.ml.model import load_model_file
+    return load_model_file(path)
+
+
+def _face_data():
+    return {
+        'blink_rate': 0.4, 'eye_openness': 0.7, 'jaw_clench': 0.3,
+        'brow_tension': 25.0, 'jitter': 0.1, 'game_score': 0.6
+    }
+
+
+for _seq_len in (10, 30, 60):
+    @benchmark(f"lstm.forward[seq={_seq_len}]")
+    def _bench_forward(seq_len=_seq_len):
+        model = _model()
+        sequence = _frames(seq_len)
+        return lambda: model.forward(sequence)
+
+for _batch in (1, 8, 32):
+    @benchmark(f"lstm.forward[batch={_batch},seq=30]")
+    def _bench_forward_batch(batch=_batch):
+        model = _model()
+        sequences = [_frames(30, seed=i) for i in range(batch)]
+        return lambda: [model.forward(sequence) for sequence in sequences]
+
+    @benchmark(f"lstm.forward_batch[batch={_batch},seq=30]")
+    def _bench_forward_batch_vectorized(batch=_batch):
+        model = _model()
+        sequences = np.array([_frames(30, seed=i) for i in range(batch)])
+        return lambda: model.forward_batch(sequences)
+
+
+for _name in ("lstm32", "lstm16", "lstm8", "gru16", "gru8", "ema_linear"):
+    @benchmark(f"model.forward[{_name},seq=30]")
+    def _bench_family_forward(name=_name):
+        from app.ml.calibrate import model_path
+        if not os.path.exists(model_path(name)):
+            return None
+        model = _model(model_path(name))
+        sequence = _frames(30)
+        return lambda: model.forward(sequence)
+
+
+@benchmark("inference.predict[model]")
+def _bench_predict_model():
+    from app.services.inference_service import InferenceService
+    service = InferenceService()
+    service.ensure_loaded()
+    if not service.use_model:
+        return None
+    window = _frames(service.seq_len)
+    face_data = _face_data()
+    return lambda: service.predict(face_data, window)
+
+
+@benchmark("inference.predict[heuristic]")
+def _bench_predict_heuristic():
+    from app.services.inference_service import InferenceService
+    service = InferenceService()
+    service.ready = True  # never load the model
+    face_data = _face_data()
+    return lambda: service.predict(face_data, [])
+
+
+@benchmark("features.extract")
+def _bench_extract_features():
+    from app.ml.model import extract_features
+    face_data = _face_data()
+    return lambda: extract_features(face_data)
+
+
+# One inbound frame and one reply, as sent over /ws/analysis
+_FRAME = dict(_face_data(), timestamp="2024-01-01T12:00:00.000Z")
+_REPLY = {'stress_score': 42.5, 'stress_level': 'Medium', 'confidence': 0.85,
+          'timestamp': "2024-01-01T12:00:00.000Z"}
+
+
+@benchmark("ws_payload.json")
+def _bench_payload_json():
+    return lambda: (json.loads(json.dumps(_FRAME)), json.loads(json.dumps(_REPLY)))
+
+
+@benchmark("ws_payload.orjson")
+def _bench_payload_orjson():
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return lambda: (orjson.loads(orjson.dumps(_FRAME)), orjson.loads(orjson.dumps(_REPLY)))
+
+
+@benchmark("ws_payload.struct")
+def _bench_payload_struct():
+    # Fixed binary layout: six float32 features + float64 epoch timestamp in,
+    # float32 score + level byte + float32 confidence + float64 timestamp out
+    frame_format = struct.Struct("<6fd")
+    reply_format = struct.Struct("<fBfd")
+    features = [_FRAME[k] for k in ('blink_rate', 'eye_openness', 'jaw_clench',
+                                    'brow_tension', 'jitter', 'game_score')]
+
+    def roundtrip():
+        frame = frame_format.unpack(frame_format.pack(*features, 1704110400.0))
+        reply = reply_format.unpack(reply_format.pack(42.5, 1, 0.85, 1704110400.0))
+        return frame, reply
+    return roundtrip
+
+
+def _session_data(raw):
+    """A 10-game /session/{id}/data body, with stored or decoded stress_scores"""
+    from datetime import datetime
+    from app.core.responses import RawJSON
+    stored = json.dumps([round(float(v), 2) for v in np.random.uniform(0, 100, 300)])
+    game = {'game_name': 'MemoryMatch', 'game_number': 1, 'score': 120.0, 'duration': 60.0,
+            'avg_stress': 42.5, 'max_stress': 80.1, 'min_stress': 10.2, 'stress_percentile': 55.0}
+    return {
+        'session': {'id': 1, 'started_at': datetime(2024, 1, 1, 12), 'completed_at': None,
+                    'games_played': 10, 'baseline_stress': 30.0},
+        'games': [dict(game, game_number=i, stress_scores=RawJSON(stored) if raw else json.loads(stored))
+                  for i in range(10)]
+    }
+
+
+@benchmark("response.session_data[jsonable_encoder]")
+def _bench_session_data_generic():
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    content = _session_data(raw=False)
+    return lambda: JSONResponse(jsonable_encoder(content)).body
+
+
+@benchmark("response.session_data[fast+splice]")
+def _bench_session_data_fast():
+    from app.core.responses import FastJSONResponse
+    content = _session_data(raw=True)
+    return lambda: FastJSONResponse(content).body
+
+
+_USER = {'name': 'Bench User', 'email': 'bench@example.com', 'work_type': 'Software',
+         'working_hours': 9, 'mobile_usage': 5, 'health_info': None}
+_SESSION = {'session_id': 1, 'games_played': 5, 'game_data': []}
+
+
+@benchmark("report.generate_recommendations")
+def _bench_recommendations():
+    from app.services.report_service import report_service
+    analysis = {'overall_stress': 64.0, 'stress_level': 'Medium', 'stress_trend': 'Increasing'}
+    return lambda: report_service.generate_recommendations(_USER, _SESSION, analysis)
+
+
+@benchmark("report.generate_pdf_report")
+def _bench_pdf():
+    from app.services.report_service import report_service
+    analysis = {'overall_stress': 64.0, 'stress_level': 'Medium', 'stress_trend': 'Increasing'}
+    recommendations = report_service.generate_recommendations(_USER, _SESSION, analysis)
+    return lambda: report_service.generate_pdf_report(_USER, _SESSION, recommendations)
+
+
+def time_callable(fn, repeats: int, min_time: float) -> float:
+    """Best seconds per call across repeats"""
+    fn()  # warm caches and lazy imports
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= min_time:
+            break
+        number *= 2
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - started) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(samples)
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the micro-benchmark suite")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown vs baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="also write results as JSON to this file")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    baseline_results = baseline.get("results", {})
+
+    results = {}
+    regressions = []
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        np.random.seed(0)
+        fn = setup()
+        if fn is None:
+            print(f"{name:<40} skipped (dependency or model unavailable)")
+            continue
+        us_per_op = time_callable(fn, args.repeats, args.min_time) * 1e6
+        results[name] = {"us_per_op": round(us_per_op, 3)}
+
+        line = f"{name:<40} {us_per_op:>12.2f} us/op"
+        previous = baseline_results.get(name)
+        if previous:
+            change = us_per_op / previous["us_per_op"] - 1
+            results[name]["change"] = round(change, 4)
+            line += f"   {change:+7.1%} vs baseline"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "   REGRESSION"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+            f.write("\n")
+
+    if args.save_baseline:
+        # Merge so a filtered run only replaces what it measured
+        merged = dict(baseline_results)
+        merged.update({name: {"us_per_op": r["us_per_op"]} for name, r in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": environment(), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if baseline and baseline.get("environment") != environment():
+        print("Note: baseline was recorded in a different environment; compare with care")
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: "
+              + ", ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
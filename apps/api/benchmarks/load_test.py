@@ -0,0 +1,263 @@
+"""
+Load generator for capacity testing against a running API.
+
+Each virtual user behaves like the web client: registers, starts a session,
+and for every game streams face metrics over /ws/analysis?session_id= at
+--fps while "playing", then saves the game. After the last game it completes
+the session, generates the report and downloads the PDF. Users loop until
+--duration runs out.
+
+Face metrics are drawn from the same distributions as the training data
+(app.ml.train.synthetic_features) around a per-user stress level that drifts
+over time.
+
+Usage (from apps/api, with the server running):
+    python benchmarks/load_test.py --users 50 --fps 15 --duration 60 --output load.json
+
+Prints (and optionally writes) a JSON summary with throughput, p50/p95/p99
+latency and error rates for the socket and for every REST step.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ml.train import synthetic_features  # noqa: E402
+
+FEATURE_NAMES = ["blink_rate", "eye_openness", "jaw_clench", "brow_tension", "jitter", "game_score"]
+
+
+class Recorder:
+    """Latencies and outcomes per operation"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def ok(self, name: str, seconds: float):
+        self.latencies[name].append(seconds)
+
+    def fail(self, name: str, status):
+        self.errors[name] += 1
+        self.statuses[name][str(status)] += 1
+
+    def summary(self, name: str, elapsed: float) -> dict:
+        values = np.array(self.latencies.get(name, [])) * 1000
+        total = len(values) + self.errors.get(name, 0)
+        result = {
+            "requests": total,
+            "errors": self.errors.get(name, 0),
+            "error_rate": round(self.errors.get(name, 0) / total, 4) if total else 0.0,
+            "throughput_per_s": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        }
+        if len(values):
+            result["latency_ms"] = {
+                "p50": round(float(np.percentile(values, 50)), 2),
+                "p95": round(float(np.percentile(values, 95)), 2),
+                "p99": round(float(np.percentile(values, 99)), 2),
+                "max": round(float(values.max()), 2),
+            }
+        if self.statuses.get(name):
+            result["error_statuses"] = dict(self.statuses[name])
+        return result
+
+
+def _http(method: str, url: str, body=None, token: str = None, timeout: float = 60):
+    """Blocking request; returns (status, body bytes)"""
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method)
+    if data is not None:
+        request.add_header("Content-Type", "application/json")
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+class VirtualUser:
+    def __init__(self, index: int, args, recorder: Recorder, deadline: float):
+        self.index = index
+        self.args = args
+        self.recorder = recorder
+        self.deadline = deadline
+        self.rng_stress = np.random.uniform(0.1, 0.9)
+        self.token = None
+        self.user_id = None
+
+    async def rest(self, name: str, method: str, path: str, body=None, expect=(200,)):
+        started = time.perf_counter()
+        try:
+            status, payload = await asyncio.to_thread(
+                _http, method, self.args.base_url + path, body, self.token
+            )
+        except Exception as e:
+            self.recorder.fail(name, e.__class__.__name__)
+            return None
+        if status not in expect:
+            self.recorder.fail(name, status)
+            return None
+        self.recorder.ok(name, time.perf_counter() - started)
+        return payload
+
+    def next_frame(self) -> dict:
+        # Stress drifts slowly so the stream looks like a real session
+        self.rng_stress = float(np.clip(self.rng_stress + np.random.normal(0, 0.01), 0, 1))
+        frame = dict(zip(FEATURE_NAMES, (float(v) for v in synthetic_features(self.rng_stress))))
+        # The web client sends brow tension on a 0-100 scale (extract_features divides it back)
+        frame["brow_tension"] *= 100
+        return frame
+
+    async def register(self) -> bool:
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        payload = await self.rest("auth/register", "POST", "/api/v1/auth/register", {
+            "email": email, "password": "load-test-password", "name": f"Load User {self.index}",
+            "work_type": "Software", "working_hours": 8, "mobile_usage": 4
+        })
+        if payload is None:
+            return False
+        data = json.loads(payload)
+        self.token = data["access_token"]
+        self.user_id = data["user"]["id"]
+        return True
+
+    async def play_game(self, session_id: int) -> list:
+        """Stream frames for one game; returns the stress scores received"""
+        url = f"{self.args.ws_url}/ws/analysis?session_id={session_id}&token={self.token}"
+        interval = 1.0 / self.args.fps
+        game_end = min(self.deadline, time.perf_counter() + self.args.game_seconds)
+        sent = {}
+        scores = []
+        stats = self.recorder
+        connect_started = time.perf_counter()
+        try:
+            async with websockets.connect(url, max_queue=None) as ws:
+                stats.ok("ws/connect", time.perf_counter() - connect_started)
+
+                async def receive():
+                    async for message in ws:
+                        now = time.perf_counter()
+                        data = json.loads(message)
+                        sent_at = sent.pop(data.get("timestamp"), None)
+                        if sent_at is not None:
+                            stats.ok("ws/frame", now - sent_at)
+                        scores.append(data["stress_score"])
+
+                receiver = asyncio.create_task(receive())
+                next_send = time.perf_counter()
+                frame_number = 0
+                while time.perf_counter() < game_end:
+                    frame = self.next_frame()
+                    frame_id = f"{self.index}-{frame_number}"
+                    frame["timestamp"] = frame_id
+                    sent[frame_id] = time.perf_counter()
+                    await ws.send(json.dumps(frame))
+                    frame_number += 1
+                    next_send += interval
+                    await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+                # Give in-flight frames a moment to come back
+                await asyncio.sleep(min(1.0, 5 * interval))
+                receiver.cancel()
+        except websockets.exceptions.InvalidStatusCode as e:
+            stats.fail("ws/connect", e.status_code)
+        except websockets.exceptions.ConnectionClosed as e:
+            stats.fail("ws/connect" if not scores else "ws/closed", e.code)
+        except OSError as e:
+            stats.fail("ws/connect", e.__class__.__name__)
+        # Frames the server shed under load (or that never came back)
+        for _ in sent:
+            stats.fail("ws/frame", "dropped")
+        return scores
+
+    async def run(self):
+        if not await self.register():
+            return
+        while time.perf_counter() < self.deadline:
+            payload = await self.rest("session/start", "POST", "/api/v1/stress/session/start",
+                                      {"user_id": self.user_id, "baseline_stress": 50})
+            if payload is None:
+                await asyncio.sleep(1)
+                continue
+            session_id = json.loads(payload)["session_id"]
+
+            for game_number in range(1, self.args.games + 1):
+                scores = await self.play_game(session_id) or [50.0]
+                await self.rest("session/game", "POST", f"/api/v1/stress/session/{session_id}/game", {
+                    "game_name": "load-test", "game_number": game_number, "score": 100,
+                    "duration": self.args.game_seconds, "face_data": "{}",
+                    "stress_scores": json.dumps(scores), "avg_stress": float(np.mean(scores)),
+                    "max_stress": float(np.max(scores)), "min_stress": float(np.min(scores))
+                })
+                if time.perf_counter() >= self.deadline:
+                    break
+
+            await self.rest("session/complete", "POST", f"/api/v1/stress/session/{session_id}/complete")
+            payload = await self.rest("reports/generate", "POST", f"/api/v1/reports/generate/{session_id}")
+            if payload is not None and not self.args.no_pdf:
+                report_id = json.loads(payload)["id"]
+                await self.rest("reports/pdf", "GET", f"/api/v1/reports/{report_id}/pdf")
+
+
+async def run_load(args) -> dict:
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    users = []
+    for i in range(args.users):
+        users.append(asyncio.create_task(VirtualUser(i, args, recorder, deadline).run()))
+        # Ramp up instead of stampeding the server
+        await asyncio.sleep(args.ramp_up / max(1, args.users))
+    await asyncio.gather(*users, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    operations = sorted(set(recorder.latencies) | set(recorder.errors))
+    return {
+        "config": {
+            "base_url": args.base_url, "users": args.users, "fps": args.fps,
+            "duration_s": args.duration, "games": args.games, "game_seconds": args.game_seconds,
+            "pdf": not args.no_pdf,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "websocket": {name: recorder.summary(name, elapsed) for name in operations if name.startswith("ws/")},
+        "rest": {name: recorder.summary(name, elapsed) for name in operations if not name.startswith("ws/")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic gameplay against the API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users (one socket each)")
+    parser.add_argument("--fps", type=float, default=15, help="frames per second per socket")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--games", type=int, default=3, help="games per session")
+    parser.add_argument("--game-seconds", type=float, default=10)
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which users start")
+    parser.add_argument("--no-pdf", action="store_true", help="skip the PDF download step")
+    parser.add_argument("--output", help="also write the JSON summary to this file")
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip("/")
+    args.ws_url = "ws" + args.base_url[len("http"):]
+
+    result = asyncio.run(run_load(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import random
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import models
+from app.core.database import Base
+from app.services.percentile_service import (
+    HISTOGRAM_BINS, build_tree, percentile_of, percentile_service, prefix_nodes, stress_bin, update_nodes
+)
+
+
+def _prefix(tree, index):
+    return sum(tree[node - 1] for node in prefix_nodes(index))
+
+
+def test_build_tree_prefix_sums_match_counts():
+    random.seed(0)
+    counts = [random.randint(0, 5) for _ in range(HISTOGRAM_BINS)]
+    tree = build_tree(counts)
+    for index in range(HISTOGRAM_BINS + 1):
+        assert _prefix(tree, index) == sum(counts[:index])
+
+
+def test_update_nodes_keep_prefix_sums_consistent():
+    counts = [0] * HISTOGRAM_BINS
+    tree = [0] * HISTOGRAM_BINS
+    for avg_stress in (0, 12.34, 12.3, 50, 99.95, 100, 150, -3):
+        counts[stress_bin(avg_stress)] += 1
+        for node in update_nodes(stress_bin(avg_stress) + 1):
+            tree[node - 1] += 1
+    assert tree == build_tree(counts)
+    assert _prefix(tree, HISTOGRAM_BINS) == 8
+
+
+def test_stress_bin_clamps_to_histogram():
+    assert stress_bin(-1) == 0
+    assert stress_bin(12.34) == 123
+    assert stress_bin(100) == stress_bin(250) == HISTOGRAM_BINS - 1
+
+
+def test_percentile_of_counts_ties_half():
+    assert percentile_of(below=0, same=0, total=4) == 100.0
+    assert percentile_of(below=4, same=0, total=4) == 0.0
+    assert percentile_of(below=1, same=2, total=4) == 50.0
+    assert percentile_of(below=0, same=3, total=3) == 50.0
+    assert percentile_of(below=0, same=0, total=0) is None
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _play(db, user_id, *stresses, game_name="memory"):
+    session = models.GameSession(user_id=user_id)
+    db.add(session)
+    db.flush()
+    for number, avg_stress in enumerate(stresses):
+        db.add(models.GameData(session_id=session.id, game_name=game_name, game_number=number, avg_stress=avg_stress))
+    db.flush()
+
+
+def test_percentiles_leave_out_the_players_own_games(db):
+    db.add_all([models.User(id=1, email="a@x", password_hash="x", name="a"),
+                models.User(id=2, email="b@x", password_hash="x", name="b")])
+    _play(db, 1, 40, 50, 50, 60)
+    _play(db, 2, 30, 50, 70, 80)
+    percentile_service.rebuild(db)
+    
+    # Against user 2 only: 70 and 80 are higher, 50 ties, 30 is lower
+    assert percentile_service.percentile(db, "memory", 50, user_id=1) == 62.5
+    assert percentile_service.percentile(db, "memory", 60, user_id=1) == 50.0
+    # Without a user only the game itself is left out: 3 higher and 2 ties out of 7
+    assert percentile_service.percentile(db, "memory", 50) == round(100 * 4 / 7, 1)
+    # Nothing to compare with when every recorded game is the player's own
+    db.add(models.User(id=3, email="c@x", password_hash="x", name="c"))
+    _play(db, 3, 20, game_name="solo")
+    percentile_service.rebuild(db)
+    assert percentile_service.percentile(db, "solo", 20, user_id=3) is None
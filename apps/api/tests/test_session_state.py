@@ -0,0 +1,126 @@
+import pytest
+from app.services.session_state import (
+    MemorySessionStore, RedisSessionStore, WriteBehindStore, encode_window, decode_window
+)
+
+WINDOW = [[0.5, 0.25, 0.0, 1.0, 0.125, 0.75]] * 3
+
+
+class FakeRedis:
+    """Just enough of the redis-py client for RedisSessionStore"""
+    
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.executed = []
+        self.fail_next_execute = False
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+    
+    def delete(self, key):
+        self.data.pop(key, None)
+        self.ttls.pop(key, None)
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+    
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value, ex))
+    
+    def execute(self):
+        if self.client.fail_next_execute:
+            self.client.fail_next_execute = False
+            raise ConnectionError("connection reset")
+        for key, value, ex in self.commands:
+            self.client.set(key, value, ex=ex)
+        self.client.executed.append(len(self.commands))
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def write_behind(redis):
+    # Long interval so only explicit flush()/close() write to the backend
+    store = WriteBehindStore(RedisSessionStore(client=redis, ttl_seconds=60), flush_interval=60)
+    yield store
+    store.close()
+
+
+def test_window_encoding_round_trip():
+    assert decode_window(encode_window(WINDOW)) == WINDOW
+    assert decode_window(None) == []
+
+
+def test_memory_store_round_trip_and_lru_eviction():
+    store = MemorySessionStore(max_sessions=2)
+    store.put("1", encode_window(WINDOW))
+    store.put("2", b"")
+    store.get("1")
+    store.put("3", b"")
+    assert decode_window(store.get("1")) == WINDOW
+    assert store.get("2") is None
+    store.delete("1")
+    assert store.get("1") is None
+
+
+def test_redis_store_round_trip(redis):
+    store = RedisSessionStore(client=redis, ttl_seconds=60)
+    store.put_many({"1": encode_window(WINDOW), "2": b""})
+    assert redis.executed == [2]
+    assert redis.ttls == {"stress:window:1": 60, "stress:window:2": 60}
+    assert decode_window(store.get("1")) == WINDOW
+    store.delete("1")
+    assert store.get("1") is None
+
+
+def test_write_behind_serves_buffered_puts_and_flushes_in_one_batch(write_behind, redis):
+    write_behind.put("1", encode_window(WINDOW))
+    write_behind.put("2", encode_window(WINDOW[:1]))
+    assert redis.data == {}
+    assert decode_window(write_behind.get("1")) == WINDOW
+    
+    write_behind.flush()
+    assert redis.executed == [2]
+    assert decode_window(redis.get("stress:window:2")) == WINDOW[:1]
+    write_behind.flush()
+    assert redis.executed == [2]
+
+
+def test_write_behind_keeps_failed_batch_for_retry(write_behind, redis):
+    write_behind.put("1", encode_window(WINDOW))
+    redis.fail_next_execute = True
+    write_behind.flush()
+    assert redis.data == {}
+    assert decode_window(write_behind.get("1")) == WINDOW
+    
+    write_behind.flush()
+    assert decode_window(redis.get("stress:window:1")) == WINDOW
+
+
+def test_write_behind_delete_drops_buffered_state(write_behind, redis):
+    write_behind.put("1", encode_window(WINDOW))
+    write_behind.delete("1")
+    write_behind.flush()
+    assert write_behind.get("1") is None
+    assert redis.executed == []
+
+
+def test_write_behind_close_flushes(redis):
+    store = WriteBehindStore(RedisSessionStore(client=redis), flush_interval=60)
+    store.put("1", encode_window(WINDOW))
+    store.close()
+    assert decode_window(redis.get("stress:window:1")) == WINDOW
@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from app.core import database
+from app.main import app
+from app.services.inference_service import inference_service
+
+FRAME = {"blink_rate": 0.3, "eye_openness": 0.8, "jaw_clench": 0.1}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Each test gets its own database instead of ./stress_app.db
+    original = database.engine
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "engine", engine)
+    database.SessionLocal.configure(bind=engine)
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        database.SessionLocal.configure(bind=original)
+        engine.dispose()
+
+
+@pytest.fixture
+def window_sizes(monkeypatch):
+    """Length of the window each prediction starts from"""
+    sizes = []
+    predict = inference_service.predict
+    
+    def recording_predict(face_data, window=None):
+        sizes.append(len(window))
+        return predict(face_data, window)
+    
+    monkeypatch.setattr(inference_service, "predict", recording_predict)
+    return sizes
+
+
+def _register(client, email):
+    body = client.post("/api/v1/auth/register", json={"email": email, "password": "pw123456", "name": "n"}).json()
+    return body["access_token"], body["user"]["id"]
+
+
+def _send_frames(client, query, count):
+    with client.websocket_connect(f"/ws/analysis?{query}") as ws:
+        for _ in range(count):
+            ws.send_json(FRAME)
+            ws.receive_json()
+
+
+def test_reconnect_with_owner_token_resumes_window(client, window_sizes):
+    token, user_id = _register(client, "owner@example.com")
+    session_id = client.post("/api/v1/stress/session/start", json={"user_id": user_id}).json()["session_id"]
+    
+    _send_frames(client, f"session_id={session_id}&token={token}", 2)
+    _send_frames(client, f"session_id={session_id}&token={token}", 1)
+    assert window_sizes == [0, 1, 2]
+
+
+def test_other_users_and_anonymous_clients_get_a_fresh_window(client, window_sizes):
+    token, user_id = _register(client, "owner@example.com")
+    other_token, _ = _register(client, "other@example.com")
+    session_id = client.post("/api/v1/stress/session/start", json={"user_id": user_id}).json()["session_id"]
+    
+    _send_frames(client, f"session_id={session_id}&token={token}", 2)
+    _send_frames(client, f"session_id={session_id}&token={other_token}", 1)
+    _send_frames(client, f"session_id={session_id}", 1)
+    assert window_sizes == [0, 1, 0, 0]
+    assert len(inference_service.load_window(session_id)) == 2
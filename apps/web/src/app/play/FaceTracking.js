@@ -60,7 +60,7 @@ const FaceTracking = forwardRef(({ onStressUpdate }, ref) => {
         })
     }
 
-    const startTracking = async () => {
+    const startTracking = async (sessionId) => {
         setError(null)
         setIsLoading(true)
 
@@ -133,7 +133,13 @@ const FaceTracking = forwardRef(({ onStressUpdate }, ref) => {
             }
 
             // Connect to WebSocket
-            wsRef.current = new WebSocket('ws://localhost:8000/ws/analysis')
+            // The session id (with the owner's token) lets the server keep its inference window across reconnects
+            const token = localStorage.getItem('token')
+            const params = []
+            if (sessionId) params.push(`session_id=${sessionId}`)
+            if (token) params.push(`token=${encodeURIComponent(token)}`)
+            const query = params.length ? `?${params.join('&')}` : ''
+            wsRef.current = new WebSocket(`ws://localhost:8000/ws/analysis${query}`)
 
             wsRef.current.onopen = () => {
                 console.log('WebSocket connected')
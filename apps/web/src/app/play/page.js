@@ -90,7 +90,7 @@ export default function PlayPage() {
             setGameState('playing')
 
             setTimeout(() => {
-                if (faceTrackingRef.current) faceTrackingRef.current.startTracking()
+                if (faceTrackingRef.current) faceTrackingRef.current.startTracking(data.session_id)
             }, 500)
         } catch (error) {
             console.error('Error starting session:', error)